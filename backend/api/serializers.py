@@ -3,6 +3,7 @@ from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from articles.models import Article, Category, Tag, Image, Like, Comment, Bookmark
 from social_media.models import SocialMediaPost, SocialMediaPlatform
+from similarity.models import StorySource
 
 
 # User Serializers
@@ -123,6 +124,17 @@ class ArticleListSerializer(serializers.ModelSerializer):
         return f"{minutes} min read" if minutes > 0 else "1 min read"
 
 
+class StorySourceSerializer(serializers.ModelSerializer):
+    """One outlet's copy of a story"""
+    url = serializers.CharField(source='scraped_article.url', read_only=True)
+    outlet = serializers.CharField(source='scraped_article.source.name', read_only=True)
+    article_slug = serializers.CharField(source='article.slug', read_only=True, default=None)
+    
+    class Meta:
+        model = StorySource
+        fields = ['url', 'outlet', 'article_slug', 'similarity', 'added_at']
+
+
 class CommentSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     display_name = serializers.SerializerMethodField()
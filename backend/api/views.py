@@ -1,3 +1,4 @@
+import os
 from django.shortcuts import render
 from django.db import models
 from django.http import HttpResponse
@@ -17,6 +18,9 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 from articles.models import Article, Category, Tag, ArticleView, Like, Comment, Bookmark
 from social_media.models import SocialMediaPost
+from similarity.models import RelatedArticle, StorySource
+from jobs.models import Job
+from jobs.serializers import JobListSerializer
 from .serializers import (
     UserSerializer,
     ArticleListSerializer,
@@ -27,11 +31,19 @@ from .serializers import (
     CommentSerializer,
     BookmarkSerializer,
     SocialMediaPostSerializer,
+    StorySourceSerializer,
 )
 from .filters import ArticleFilter
 from .pagination import ArticlePagination, OverlappingPagination
 
 
+# Related articles cached per article (as many as similarity.related stores);
+# requests slice this list by their limit
+RELATED_ARTICLES_LIMIT = int(os.getenv("RELATED_ARTICLES_K", "10"))
+
+SEMANTIC_SEARCH_LIMIT = int(os.getenv("SEMANTIC_SEARCH_LIMIT", "10"))
+
+
 # Custom Token Serializer that accepts both email and username
 class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
     username_field = 'email'
@@ -109,6 +121,7 @@ class ArticleViewSet(viewsets.ReadOnlyModelViewSet):
     Top Stories: GET /api/articles/top-stories/
     Most Read: GET /api/articles/most-read/
     Trending: GET /api/articles/trending/
+    Coverage: GET /api/articles/coverage/?article_id=1
     By Category: GET /api/articles/?category=politics
     Search: GET /api/articles/?search=keyword
     """
@@ -331,15 +344,75 @@ class ArticleViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Get similar articles - simple approach based on category and tags
-        # You can enhance this with your FAISS similarity checker
+        cache_key = RelatedArticle.cache_key(article.id)
+        cached_data = cache.get(cache_key)
+        
+        if cached_data is not None:
+            return Response(cached_data[:limit])
+        
+        # Semantic neighbours precomputed by similarity.related
         similar_articles = Article.objects.filter(
             status='published',
-            category=article.category
-        ).exclude(id=article.id).order_by('-created_at')[:limit]
+            related_from__article=article
+        ).select_related('category', 'original_from').prefetch_related(
+            'tags', 'images'
+        ).order_by('related_from__rank')[:RELATED_ARTICLES_LIMIT]
+        
+        if not similar_articles:
+            # Not computed yet (e.g. just published): newest articles in the same category
+            similar_articles = Article.objects.filter(
+                status='published',
+                category=article.category
+            ).exclude(id=article.id).select_related('category', 'original_from').prefetch_related(
+                'tags', 'images'
+            ).order_by('-created_at')[:RELATED_ARTICLES_LIMIT]
         
         serializer = ArticleListSerializer(similar_articles, many=True, context={'request': request})
-        return Response(serializer.data)
+        data = serializer.data
+        
+        cache.set(cache_key, data, 60 * 60)  # Cache 1 hour, cleared when recomputed
+        return Response(data[:limit])
+    
+    @action(detail=False, methods=['get'])
+    def coverage(self, request):
+        """Get every outlet that covered an article's story"""
+        article_id = request.query_params.get('article_id')
+        
+        if not article_id:
+            return Response(
+                {'error': 'article_id parameter is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            article = Article.objects.get(id=article_id, status='published')
+        except Article.DoesNotExist:
+            return Response(
+                {'error': 'Article not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        cache_key = StorySource.cache_key(article.id)
+        cached_data = cache.get(cache_key)
+        
+        if cached_data is not None:
+            return Response(cached_data)
+        
+        # Story assigned online by similarity.stories when the article was saved
+        story_id = StorySource.objects.filter(article=article).values_list('cluster_id', flat=True).first()
+        sources = list(
+            StorySource.objects.filter(cluster_id=story_id).select_related('scraped_article__source', 'article')
+        ) if story_id else []
+        
+        data = {
+            'story_id': story_id,
+            'source_count': len(sources),
+            'outlet_count': len({source.scraped_article.source_id for source in sources}),
+            'sources': StorySourceSerializer(sources, many=True, context={'request': request}).data,
+        }
+        
+        cache.set(cache_key, data, 60 * 60)  # Cache 1 hour, cleared when the story grows
+        return Response(data)
     
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def like(self, request, slug=None):
@@ -493,13 +566,14 @@ class SearchViewSet(viewsets.ViewSet):
     Search API
     
     Search: GET /api/search/?q=keyword&type=articles
+    Semantic: GET /api/search/?q=remote+data+jobs&type=semantic
     """
     permission_classes = [AllowAny]
     
     def list(self, request):
         """Unified search endpoint"""
         query = request.query_params.get('q', '')
-        search_type = request.query_params.get('type', 'articles')  # articles, categories, tags, all
+        search_type = request.query_params.get('type', 'articles')  # articles, categories, tags, all, semantic
         
         if not query:
             return Response(
@@ -507,6 +581,9 @@ class SearchViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        if search_type == 'semantic':
+            return Response(self._semantic_search(request, query))
+        
         results = {}
         
         if search_type in ['articles', 'all']:
@@ -535,6 +612,37 @@ class SearchViewSet(viewsets.ViewSet):
             ).data
         
         return Response(results)
+    
+    def _semantic_search(self, request, query):
+        """Published articles and open jobs ranked by embedding similarity to the query"""
+        # Imported here so other endpoints don't load FAISS in every web worker
+        from similarity.checker import semantic_search
+        
+        # Over-fetch: the indexes also hold drafts and expired jobs
+        matches = semantic_search(query, k=SEMANTIC_SEARCH_LIMIT * 3)
+        
+        articles = Article.objects.filter(status='published').select_related(
+            'category', 'original_from'
+        ).prefetch_related('tags', 'images').in_bulk([item_id for item_id, _ in matches['article']])
+        
+        today = timezone.now().date()
+        jobs = Job.objects.filter(status='published').filter(
+            models.Q(deadline__isnull=True) | models.Q(deadline__gte=today)
+        ).select_related('category').in_bulk([item_id for item_id, _ in matches['job']])
+        
+        return {
+            'articles': self._ranked(matches['article'], articles, ArticleListSerializer, request),
+            'jobs': self._ranked(matches['job'], jobs, JobListSerializer, request),
+        }
+    
+    def _ranked(self, matches, objects, serializer_class, request):
+        """Serialize hydrated matches in relevance order, with their similarity score"""
+        ranked = [(objects[item_id], score) for item_id, score in matches if item_id in objects]
+        ranked = ranked[:SEMANTIC_SEARCH_LIMIT]
+        data = serializer_class([obj for obj, _ in ranked], many=True, context={'request': request}).data
+        for item, (_, score) in zip(data, ranked):
+            item['score'] = round(score, 4)
+        return data
 
 
 # Social Media Posts Views
@@ -4,6 +4,7 @@ Celery configuration for asynchronous task processing
 import os
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_init
 
 # Set default Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
@@ -31,8 +32,47 @@ app.conf.beat_schedule = {
         'task': 'articles.tasks.cleanup_old_view_records',
         'schedule': crontab(hour=2, minute=0),  # Daily at 2 AM
     },
+    'compact-faiss-indexes': {
+        'task': 'similarity.tasks.compact_faiss_indexes',
+        'schedule': crontab(minute='*/30'),  # Every 30 minutes
+    },
+    'drop-expired-faiss-shards': {
+        'task': 'similarity.tasks.drop_expired_faiss_shards',
+        'schedule': crontab(hour=3, minute=0),  # Daily at 3 AM
+    },
+    'evict-closed-jobs': {
+        'task': 'similarity.tasks.evict_closed_jobs',
+        'schedule': crontab(hour=0, minute=5),  # Daily at 12:05 AM, after deadlines pass
+    },
+    'compact-story-index': {
+        'task': 'similarity.tasks.compact_story_index',
+        'schedule': crontab(minute='*/5'),  # Every 5 minutes
+    },
+    'evict-closed-stories': {
+        'task': 'similarity.tasks.evict_closed_stories',
+        'schedule': crontab(hour=0, minute=15),  # Daily at 12:15 AM
+    },
+    'refresh-related-articles': {
+        'task': 'similarity.tasks.refresh_related_articles',
+        'schedule': crontab(hour=4, minute=0),  # Daily at 4 AM
+    },
+    'update-related-articles': {
+        'task': 'similarity.tasks.update_related_articles',
+        'schedule': crontab(minute='*/15'),  # Every 15 minutes
+    },
 }
 
+@worker_init.connect
+def prewarm_similarity_encoder(**kwargs):
+    """
+    Load the sentence encoder in the parent worker process when SIMILARITY_PREWARM is set,
+    so prefork children share the weights copy-on-write instead of each loading their own
+    """
+    if os.getenv('SIMILARITY_PREWARM', 'false').lower() in ('1', 'true', 'yes'):
+        from similarity.checker import prewarm
+        prewarm(warmup=False, freeze=True)
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
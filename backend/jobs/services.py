@@ -16,13 +16,14 @@ django.setup()
 
 
 from scraper.services import get_latest_job_urls, scrape_job
+from scraper.http_client import format_latency_histogram
 from jobs.models import Job, Category, Log
 from scraper.models import ScrapedJob
 from core.template import get_failed_service_template
 from core.utils import EmailService
 from django.utils import timezone
 from social_media.services import SocialMediaService
-from similarity.checker import check_duplicate, encode_job
+from similarity.checker import check_duplicates_or_fallback, add_job_to_index
 
 
 KNOWN_CATEGORIES = ["job", "internship", "bootcamp", "graduate program", "scholarship", "grant"]
@@ -49,6 +50,18 @@ try:
     print(f"Log ID: {log.log_id}")
     print(f"{'='*70}\n")
 
+    def record_failure(url, e):
+        print(f"  [!] Error processing job {url}: {str(e)}")
+        if not log.error_message:
+            log.error_message = f"First error at {url}: {str(e)}"
+
+        else:
+            log.error_message += f"\n{url}: {str(e)}"
+
+        log.save()
+
+    # Scrape every new URL first so the sweep is deduplicated in one pass
+    scraped = []
     for index, url in enumerate(jobs, 1):
         print(f"Processing Job {index}/{len(jobs)}: {url}")
         try:
@@ -67,18 +80,40 @@ try:
                 failed_count += 1
                 continue
 
-            # Check for duplicates
-            duplicate_result = check_duplicate(
-                job_text=scraped_data.get('role', '') + " " + scraped_data.get('description', ''),
-                model_type='job'
-            )
-            
-            if duplicate_result['is_duplicate']:
+            scraped.append((url, scraped_data))
+
+        except Exception as e:
+            failed_count += 1
+            record_failure(url, e)
+
+    # Check for duplicates against existing jobs and within this sweep
+    # Never raises, so a failed check cannot discard the scraped jobs
+    duplicate_results = check_duplicates_or_fallback(
+        [
+            {'role': scraped_data.get('role', ''), 'description': scraped_data.get('description', '')}
+            for _, scraped_data in scraped
+        ],
+        model_type='job'
+    ) if scraped else []
+
+    # Jobs saved in this run, by batch position, for duplicates within the batch
+    saved_jobs = {}
+
+    for position, ((url, scraped_data), duplicate_result) in enumerate(zip(scraped, duplicate_results)):
+        try:
+            similar_job = duplicate_result['similar_job']
+            original_position = duplicate_result['batch_duplicate_of']
+            if original_position is not None:
+                similar_job = saved_jobs.get(original_position)
+                if similar_job is None:
+                    # The original from this run failed to save; publish this copy in its place
+                    print(f"  [*] Original of {url} from this run was not saved, saving it instead")
+
+            if duplicate_result['is_duplicate'] and similar_job is not None:
                 print(f"  [*] Duplicate job detected, skipping: {url}")
                 print(f"  [*] Similarity: {duplicate_result['similarity_score']:.2%} to '{duplicate_result.get('similar_job_role', 'Unknown')}'")
 
                 # Increment publication_count for the similar job
-                similar_job = duplicate_result['similar_job']
                 if hasattr(similar_job, 'publication_count'):
                     similar_job.publication_count += 1
                     similar_job.save(update_fields=['publication_count'])
@@ -110,23 +145,20 @@ try:
                 apply_link=scraped_data.get('apply_link', ''),
                 deadline=scraped_data.get('deadline', None)
             )
+            saved_jobs[position] = new_job
+            if original_position is not None:
+                # Later copies of the same original are credited to this one
+                saved_jobs.setdefault(original_position, new_job)
 
-            # Encode job for similarity checking
-            encode_job(new_job)
+            # Encode and index job for similarity checking
+            add_job_to_index(new_job)
 
             successful_count += 1
             print(f"  [+] Job saved: {new_job.role} | Category: {category.name}")
 
         except Exception as e:
             failed_count += 1
-            print(f"  [!] Error processing job {url}: {str(e)}")
-            if not log.error_message:
-                log.error_message = f"First error at {url}: {str(e)}"
-
-            else:
-                log.error_message += f"\n{url}: {str(e)}"
-
-            log.save()
+            record_failure(url, e)
 
 
         # break # Remove this break statement to process all jobs
@@ -160,6 +192,7 @@ try:
     print(f"Skipped: {skipped_count + duplicate_count}")
     print(f"Status: {log.status}")
     print(f"Duration: {log.time_taken}")
+    print(f"Page fetch latency:\n{format_latency_histogram()}")
     print(f"{'='*70}\n")
 
 except Exception as e:
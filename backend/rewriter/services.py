@@ -12,6 +12,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()
 
 from scraper.services import get_latest_news_urls, scrape_article
+from scraper.http_client import format_latency_histogram
 from articles.models import Article, Category, Tag, Image
 from scraper.models import ScrapedArticle
 from rewriter.models import Log
@@ -19,13 +20,18 @@ from core.template import get_failed_service_template
 from core.utils import EmailService
 from django.utils import timezone
 from social_media.services import SocialMediaService
-from similarity.checker import check_duplicate
+from similarity.checker import check_duplicates_or_fallback, add_article_to_index
+from similarity.lexical import PublishedFingerprints, find_near_duplicate, simhash, source_text, store_fingerprint
+from similarity.stories import add_article_to_story, add_duplicate_to_story
 
 load_dotenv()
 
 
 AUTO_POST = False
 
+# URLs rewritten before their duplicate check and save; bounds the rewrites a crash can lose
+REWRITER_CHUNK_SIZE = int(os.getenv("REWRITER_CHUNK_SIZE", "10"))
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 MODEL = os.getenv("OPENAI_MODEL")
 
@@ -128,9 +134,17 @@ def process_article(container):
     
     return result
 
-def check_if_duplicate(result):
-    result = check_duplicate({'content': result.get("content", "")}, lookback_days=3)
-    return result
+def check_if_duplicates(results):
+    # Same text the articles are embedded with later, so both steps share one encoder pass.
+    # Never raises: the sweep's URLs are already marked as seen, so a failed check must not discard the rewrites
+    return check_duplicates_or_fallback([
+        {
+            'title': result.get("title", ""),
+            'excerpt': result.get("excerpt", ""),
+            'content': result.get("content", ""),
+        }
+        for result in results
+    ], lookback_days=3)
 
 
 if __name__ == "__main__":
@@ -160,113 +174,206 @@ if __name__ == "__main__":
         print(f"Log ID: {log.log_id}")
         print(f"{'='*70}\n")
         
-        for index, url in enumerate(urls, 1):
-            print(f"\n[{index}/{len(urls)}] Processing: {url}")
-            
-            try:
-                # Check if article already exists
-                if Article.objects.filter(original_from__url=url).exists():
-                    print(f"Article already processed!")
-                    skipped_count += 1
-                    continue
-                
-                container = scrape_article(url)
-                if not container:
-                    print(f"Failed to scrape article!")
-                    failed_count += 1
-                    continue
-
+        def record_failure(url, e):
+            print(f"✗ Failed to process article: {str(e)}")
+            if not log.error_message:
+                log.error_message = f"First error at {url}: {str(e)}"
+            else:
+                log.error_message += f"\n{url}: {str(e)}"
+            log.save()
+        
+        # Rewrite the sweep in chunks of REWRITER_CHUNK_SIZE URLs; each chunk is deduplicated
+        # in one pass and saved before the next is rewritten, so a crash loses at most one chunk.
+        # Copies held back for an original whose save failed are queued again at the end
+        published_fingerprints = PublishedFingerprints()
+        queue = list(urls)
+        rewrite_anyway = set()
+        chunk_start = 0
+        while chunk_start < len(queue):
+            chunk = queue[chunk_start:chunk_start + REWRITER_CHUNK_SIZE]
+            processed = []
+            lexical_duplicates = []
+            held_duplicates = []
+            fingerprints = {}
+            # Article each page of the chunk ended up in: its own, or the one it duplicates
+            published_as = {}
+            for index, url in enumerate(chunk, chunk_start + 1):
+                print(f"\n[{index}/{len(queue)}] Processing: {url}")
                 
-                # Process with AI
-                result = process_article(container)
-
-                duplicate_check = check_if_duplicate(result)
-
-                if duplicate_check['is_duplicate']:
-                    print(f"DUPLICATE DETECTED!")
-                    print(f"Similarity: {duplicate_check['similarity_score']:.2%}")
-                    print(f"Similar to: {duplicate_check['similar_article_title']}")
+                try:
+                    # Check if article already exists
+                    if Article.objects.filter(original_from__url=url).exists():
+                        print(f"Article already processed!")
+                        skipped_count += 1
+                        continue
+                    
+                    container = scrape_article(url)
+                    if not container:
+                        print(f"Failed to scrape article!")
+                        failed_count += 1
+                        continue
+
+                    # Cheap near-duplicate check on the source text before paying for a rewrite
+                    fingerprint = simhash(source_text(container))
+                    lexical_match, distance = published_fingerprints.find(fingerprint)
+                    if lexical_match is not None:
+                        print(f"LEXICAL DUPLICATE of {lexical_match.url} ({distance} bits differ), skipping rewrite")
+                        lexical_duplicates.append((url, lexical_match))
+                        duplicate_count += 1
+                        continue
+                    
+                    # Copies of a page rewritten earlier in this chunk wait for it to be saved
+                    if url not in rewrite_anyway:
+                        original_url, distance = find_near_duplicate(fingerprint, fingerprints)
+                        if original_url is not None:
+                            print(f"LEXICAL DUPLICATE of {original_url} ({distance} bits differ), holding until it is saved")
+                            held_duplicates.append((url, original_url))
+                            continue
                     
-                    # Increment publication_count for the similar article
+                    # Process with AI
+                    result = process_article(container)
+                    processed.append((url, result))
+                    fingerprints[url] = fingerprint
+                    
+                except Exception as e:
+                    failed_count += 1
+                    record_failure(url, e)
+            
+            duplicate_checks = check_if_duplicates([result for _, result in processed]) if processed else []
+            
+            # Articles saved in this run, by batch position, for duplicates within the batch
+            saved_articles = {}
+            
+            for position, ((url, result), duplicate_check) in enumerate(zip(processed, duplicate_checks)):
+                try:
                     similar_article = duplicate_check['similar_article']
+                    original_position = duplicate_check['batch_duplicate_of']
+                    if original_position is not None:
+                        similar_article = saved_articles.get(original_position)
+                        if similar_article is None:
+                            # The original from this run failed to save; publish this copy in its place
+                            print(f"\nOriginal of {url} from this run was not saved, publishing it instead")
                     
-                    # Check if publication_count field exists
-                    if hasattr(similar_article, 'publication_count'):
-                        similar_article.publication_count += 1
-                        similar_article.save(update_fields=['publication_count'])
-                        print(f"Incremented publication_count to {similar_article.publication_count}")
-                    else:
-                        print(f"Warning: Article model doesn't have 'publication_count' field")
+                    if duplicate_check['is_duplicate'] and similar_article is not None:
+                        print(f"\nDUPLICATE DETECTED: {url}")
+                        print(f"Similarity: {duplicate_check['similarity_score']:.2%}")
+                        print(f"Similar to: {duplicate_check['similar_article_title']}")
+                        
+                        # Increment publication_count for the similar article
+                        # Check if publication_count field exists
+                        if hasattr(similar_article, 'publication_count'):
+                            similar_article.publication_count += 1
+                            similar_article.save(update_fields=['publication_count'])
+                            print(f"Incremented publication_count to {similar_article.publication_count}")
+                        else:
+                            print(f"Warning: Article model doesn't have 'publication_count' field")
+                        
+                        # Create ScrapedArticle entry to mark as processed
+                        scraped_duplicate, _ = ScrapedArticle.objects.get_or_create(url=url)
+                        
+                        # Keep the outlet as another source of the story
+                        add_duplicate_to_story(scraped_duplicate, similar_article, text=result)
+                        published_as[url] = similar_article
+                        
+                        duplicate_count += 1
+                        continue
                     
-                    # Create ScrapedArticle entry to mark as processed
-                    ScrapedArticle.objects.get_or_create(url=url)
+                    # Track tokens
+                    if '_token_usage' in result:
+                        total_tokens += result['_token_usage']['total_tokens']
                     
-                    duplicate_count += 1
-                    continue
-                
-                # Track tokens
-                if '_token_usage' in result:
-                    total_tokens += result['_token_usage']['total_tokens']
-                
-                # Get or create category
-                category_name = result.get("category", "News")
-                category_name = category_name if category_name.lower() in ["politics", "business", "technology", "health", "education", "entertainment", "sports", "international", "opinion"] else "News"
-                category, created = Category.objects.get_or_create(name=category_name)
-                if created:
-                    new_categories += 1
-                
-                # Get or create ScrapedArticle instance
-                scraped_article, _ = ScrapedArticle.objects.get_or_create(url=url)
-                
-                # Create article
-                article = Article.objects.create(
-                    title=result.get("title", ""),
-                    excerpt=result.get("excerpt", ""),
-                    content=result.get("content", ""),
-                    category=category,
-                    reading_time_seconds=int(result.get("approximate_reading_time", 0)),
-                    original_from=scraped_article
-                )
-                
-                # Add tags
-                tag_names = result.get("tags", [])
-                for tag_name in tag_names:
-                    tag, created = Tag.objects.get_or_create(name=tag_name)
+                    # Get or create category
+                    category_name = result.get("category", "News")
+                    category_name = category_name if category_name.lower() in ["politics", "business", "technology", "health", "education", "entertainment", "sports", "international", "opinion"] else "News"
+                    category, created = Category.objects.get_or_create(name=category_name)
                     if created:
-                        new_tags += 1
-                    article.tags.add(tag)
-                
-                # Save images
-                image_urls = result.get("images", [])
-                for img_index, img_dict in enumerate(image_urls):
-                    Image.objects.create(
-                        article=article,
-                        url=img_dict.get("url", ""),
-                        alt_text=img_dict.get("alt_text", ""),
-                        order=img_index
+                        new_categories += 1
+                    
+                    # Get or create ScrapedArticle instance
+                    scraped_article, _ = ScrapedArticle.objects.get_or_create(url=url)
+                    
+                    # Create article
+                    article = Article.objects.create(
+                        title=result.get("title", ""),
+                        excerpt=result.get("excerpt", ""),
+                        content=result.get("content", ""),
+                        category=category,
+                        reading_time_seconds=int(result.get("approximate_reading_time", 0)),
+                        original_from=scraped_article
                     )
-                    total_images += 1
-                
-                successful_count += 1
-                print(f"✓ Saved: {article.title}")
-                print(f"  Category: {category.name} | Tags: {len(tag_names)} | Images: {len(image_urls)}")
+                    saved_articles[position] = article
+                    if original_position is not None:
+                        # Later copies of the same original are credited to this one
+                        saved_articles.setdefault(original_position, article)
+                    published_as[url] = article
+                    store_fingerprint(scraped_article, fingerprints[url])
+                    published_fingerprints.add(scraped_article.id, fingerprints[url])
+                    
+                    # Add tags
+                    tag_names = result.get("tags", [])
+                    for tag_name in tag_names:
+                        tag, created = Tag.objects.get_or_create(name=tag_name)
+                        if created:
+                            new_tags += 1
+                        article.tags.add(tag)
+                    
+                    # Save images
+                    image_urls = result.get("images", [])
+                    for img_index, img_dict in enumerate(image_urls):
+                        Image.objects.create(
+                            article=article,
+                            url=img_dict.get("url", ""),
+                            alt_text=img_dict.get("alt_text", ""),
+                            order=img_index
+                        )
+                        total_images += 1
+                    
+                    # Index for duplicate detection on later runs
+                    add_article_to_index(article)
+                    add_article_to_story(article)
+                    
+                    successful_count += 1
+                    print(f"✓ Saved: {article.title}")
+                    print(f"  Category: {category.name} | Tags: {len(tag_names)} | Images: {len(image_urls)}")
 
-                # Auto-post to social media
-                SocialMediaService.create_social_posts(article, auto_post=AUTO_POST)
-                
-            except Exception as e:
-                failed_count += 1
-                print(f"✗ Failed to process article: {str(e)}")
-                if not log.error_message:
-                    log.error_message = f"First error at {url}: {str(e)}"
-                else:
-                    log.error_message += f"\n{url}: {str(e)}"
-                log.save()
+                    # Auto-post to social media
+                    SocialMediaService.create_social_posts(article, auto_post=AUTO_POST)
+                    
+                except Exception as e:
+                    failed_count += 1
+                    record_failure(url, e)
 
+                
+                
+                # break  # Remove or comment this line to process all articles
             
+            # Credit lexical duplicates to the published articles they copy
+            for url, scraped_article in lexical_duplicates:
+                similar_article = Article.objects.filter(original_from=scraped_article).first()
+                if similar_article is not None:
+                    similar_article.publication_count += 1
+                    similar_article.save(update_fields=['publication_count'])
+                    scraped_duplicate = ScrapedArticle.objects.filter(url=url).first()
+                    if scraped_duplicate is not None:
+                        add_duplicate_to_story(scraped_duplicate, similar_article)
+            
+            # Attach held copies to their original, or rewrite them if it was not saved
+            for url, original_url in held_duplicates:
+                similar_article = published_as.get(original_url)
+                if similar_article is None:
+                    print(f"Original {original_url} was not saved, queueing {url} for rewrite")
+                    queue.append(url)
+                    rewrite_anyway.add(url)
+                    continue
+                
+                similar_article.publication_count += 1
+                similar_article.save(update_fields=['publication_count'])
+                scraped_duplicate, _ = ScrapedArticle.objects.get_or_create(url=url)
+                add_duplicate_to_story(scraped_duplicate, similar_article)
+                duplicate_count += 1
+            
+            chunk_start += REWRITER_CHUNK_SIZE
             
-            # break  # Remove or comment this line to process all articles
-        
         # Update log with final stats
         log.end_time = timezone.now()
         log.total_urls_processed = len(urls)
@@ -303,6 +410,7 @@ if __name__ == "__main__":
         print(f"Skipped: {skipped_count}")
         print(f"Duplicates: {duplicate_count}")
         print(f"Time taken: {log.time_taken}s")
+        print(f"Page fetch latency:\n{format_latency_histogram()}")
         print(f"{'='*70}\n")
 
     except Exception as e:
@@ -4,7 +4,7 @@ from .models import NewsSource, ScrapedArticle, JobSource, ScrapedJob
 # Register your models here.
 @admin.register(NewsSource)
 class NewsSourceAdmin(admin.ModelAdmin):
-    list_display = ('name', 'base_url', 'feed_url', 'is_active')
+    list_display = ('name', 'base_url', 'feed_url', 'is_active', 'last_polled_at', 'avg_new_items_per_poll')
     search_fields = ('name', 'base_url')
     list_filter = ('is_active',)
 
@@ -18,7 +18,7 @@ class ScrapedArticleAdmin(admin.ModelAdmin):
 
 @admin.register(JobSource)
 class JobSourceAdmin(admin.ModelAdmin):
-    list_display = ('name', 'base_url', 'is_active')
+    list_display = ('name', 'base_url', 'is_active', 'last_polled_at', 'avg_new_items_per_poll')
     search_fields = ('name', 'base_url')
     list_filter = ('is_active',)
 
@@ -0,0 +1,132 @@
+"""
+Per-site extraction rules.
+
+Each news outlet's article body is located with a CSS selector in
+ARTICLE_SELECTORS, so supporting a new outlet is a one-line entry here. Pages
+are parsed with lxml (libxml2), several times faster than BeautifulSoup's
+html.parser; BeautifulSoup runs the same selector as a fallback when lxml is
+not installed, cannot parse a page or finds nothing. Either way only the small
+article container is prettified, so the rewriter and the SimHash prefilter get
+the same HTML as before.
+
+Job sites need more than a container, so JOB_EXTRACTORS maps them to an
+extraction function that takes a BeautifulSoup html.parser tree, as the
+extractors were written against.
+
+Compare the two parsers per site with scraper/extraction_benchmark.py, on the
+saved pages in scraper/fixtures/pages/<site>/.
+"""
+import re
+from functools import lru_cache
+from importlib import import_module
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml.cssselect import CSSSelector
+except ImportError:
+    lxml = None
+
+
+# Domain (without www.) -> CSS selector of the article body
+ARTICLE_SELECTORS = {
+    'arise.tv': 'article',
+    'bellanaija.com': 'div#mvp-article-cont',
+    'dailytrust.com': 'div.article-container',
+    'guardian.ng': 'section.main-content article',
+    'lindaikejisblog.com': 'div.col-md-12',
+    'premiumtimesng.com': 'div.jeg_content',
+    'ynaija.com': 'article.blog-item',
+}
+
+# Domain (without www.) -> dotted path of a function(soup) returning the job's data
+JOB_EXTRACTORS = {
+    'jobs.smartyacad.com': 'scraper.job_scrapers.discover_hub.scrape_data',
+}
+
+def site_of(url):
+    """Registry key of a page URL: its lowercased domain without www."""
+    match = re.match(r"https?://([^/]+)", url)
+    base_domain = match.group(1) if match else url
+    return base_domain.replace("https://", "").replace('www.', "").lower()
+
+
+@lru_cache(maxsize=None)
+def _compiled(selector):
+    return CSSSelector(selector)
+
+
+def extract_with_lxml(content, selector):
+    """
+    First element matching a CSS selector, parsed with lxml.
+
+    Returns:
+        str: The element's HTML, or None if nothing matches
+    """
+    document = None
+    if isinstance(content, bytes):
+        try:
+            document = lxml.html.fromstring(content.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            # Not UTF-8, or an XML encoding declaration (only allowed in bytes):
+            # leave decoding to libxml2
+            pass
+    if document is None:
+        document = lxml.html.fromstring(content)
+    matches = _compiled(selector)(document)
+    if not matches:
+        return None
+    return lxml.html.tostring(matches[0], encoding='unicode', with_tail=False)
+
+
+def extract_with_soup(content, selector):
+    """
+    First element matching a CSS selector, parsed with BeautifulSoup's html.parser.
+
+    Returns:
+        str: The element's prettified HTML, or None if nothing matches
+    """
+    container = BeautifulSoup(content, 'html.parser').select_one(selector)
+    return container.prettify() if container else None
+
+
+def extract_article(content, site):
+    """
+    Article body of a page from a registered site.
+
+    Args:
+        content: Page HTML (bytes or str)
+        site: Registry key, see site_of()
+
+    Returns:
+        str: Prettified HTML of the article container, or None if the page has none
+
+    Raises:
+        KeyError: If the site has no rule in ARTICLE_SELECTORS
+    """
+    selector = ARTICLE_SELECTORS[site]
+    if lxml is not None:
+        try:
+            container = extract_with_lxml(content, selector)
+            if container:
+                return BeautifulSoup(container, 'html.parser').prettify()
+        except Exception as e:
+            print(f"lxml could not extract {site}, falling back to BeautifulSoup: {str(e)}")
+    return extract_with_soup(content, selector)
+
+
+def make_soup(content):
+    """BeautifulSoup tree of a job page, as the JOB_EXTRACTORS functions expect it."""
+    return BeautifulSoup(content, 'html.parser')
+
+
+def job_extractor(site):
+    """
+    Extraction function of a registered job site.
+
+    Raises:
+        KeyError: If the site has no entry in JOB_EXTRACTORS
+    """
+    module_name, _, function_name = JOB_EXTRACTORS[site].rpartition('.')
+    return getattr(import_module(module_name), function_name)
@@ -0,0 +1,148 @@
+"""
+Per-site parse-time benchmark for the article extraction rules.
+
+Runs every registered site's selector over saved pages with the lxml fast path
+(including prettifying the container, as extract_article does) and with the
+BeautifulSoup html.parser fallback, and reports the median time per page for
+both, the speedup, and whether the two found the same article text. Pages are
+saved as FIXTURES_DIR/<site>/*.html; the repository ships a few per site, and
+--fetch adds the latest scraped URLs of each site first.
+
+Usage:
+    python scraper/extraction_benchmark.py --fetch 5
+    python scraper/extraction_benchmark.py --repeat 20
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import django
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from bs4 import BeautifulSoup
+
+from scraper import extraction, http_client
+from scraper.models import ScrapedArticle
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "pages")
+
+
+def fetch_fixtures(per_site, fixtures_dir=FIXTURES_DIR):
+    """Save the newest `per_site` scraped pages of every registered site."""
+    for site in extraction.ARTICLE_SELECTORS:
+        urls = ScrapedArticle.objects.filter(url__contains=site).order_by('-scraped_at').values_list('url', flat=True)
+        directory = os.path.join(fixtures_dir, site)
+        os.makedirs(directory, exist_ok=True)
+        saved = 0
+        for url in urls[:per_site * 2]:
+            if saved == per_site:
+                break
+            if extraction.site_of(url) != site:
+                continue
+            try:
+                response = http_client.get(url)
+                response.raise_for_status()
+            except Exception as e:
+                print(f"Skipping {url}: {str(e)}")
+                continue
+            name = re.sub(r"[^\w.-]+", "_", url.rstrip("/").rsplit("/", 1)[-1])[:100] or "index"
+            with open(os.path.join(directory, f"{name}.html"), "wb") as f:
+                f.write(response.content)
+            saved += 1
+        print(f"Saved {saved} pages of {site}")
+
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    """{site: [page bytes]} for every registered site with saved pages."""
+    fixtures = {}
+    for site in extraction.ARTICLE_SELECTORS:
+        directory = os.path.join(fixtures_dir, site)
+        if not os.path.isdir(directory):
+            continue
+        pages = []
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".html"):
+                with open(os.path.join(directory, name), "rb") as f:
+                    pages.append(f.read())
+        if pages:
+            fixtures[site] = pages
+    return fixtures
+
+
+def extract_fast_path(content, selector):
+    """The lxml path of extract_article: lxml lookup, then prettify only the container."""
+    container = extraction.extract_with_lxml(content, selector)
+    return BeautifulSoup(container, "html.parser").prettify() if container else None
+
+
+def median_ms(extract, content, selector, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = extract(content, selector)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings)), result
+
+
+def visible_words(html):
+    return BeautifulSoup(html or "", "html.parser").get_text(" ").split()
+
+
+def run(repeat, fixtures_dir=FIXTURES_DIR):
+    """
+    Time both parsers on every saved page.
+
+    Returns:
+        dict: {site: {'pages', 'lxml_ms', 'soup_ms', 'speedup', 'matching'}}
+    """
+    if extraction.lxml is None:
+        raise SystemExit("lxml is not installed; pip install lxml cssselect")
+
+    fixtures = load_fixtures(fixtures_dir)
+    if not fixtures:
+        raise SystemExit(f"No saved pages in {fixtures_dir}; run with --fetch first")
+
+    results = {}
+    for site, pages in fixtures.items():
+        selector = extraction.ARTICLE_SELECTORS[site]
+        lxml_times, soup_times, matching = [], [], 0
+        for content in pages:
+            lxml_ms, lxml_html = median_ms(extract_fast_path, content, selector, repeat)
+            soup_ms, soup_html = median_ms(extraction.extract_with_soup, content, selector, repeat)
+            lxml_times.append(lxml_ms)
+            soup_times.append(soup_ms)
+            matching += visible_words(lxml_html) == visible_words(soup_html)
+
+        result = {
+            'pages': len(pages),
+            'lxml_ms': float(np.median(lxml_times)),
+            'soup_ms': float(np.median(soup_times)),
+            'matching': matching,
+        }
+        result['speedup'] = result['soup_ms'] / max(result['lxml_ms'], 1e-9)
+        results[site] = result
+        print(f"{site:<22} {len(pages):>3} pages  lxml {result['lxml_ms']:7.2f} ms  "
+              f"html.parser {result['soup_ms']:7.2f} ms  ({result['speedup']:.1f}x)  "
+              f"same text {matching}/{len(pages)}")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fetch", type=int, default=0, metavar="N", help="first save N pages per site")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="directory of saved pages, one subdirectory per site")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per page (median is reported)")
+    args = parser.parse_args()
+
+    if args.fetch:
+        fetch_fixtures(args.fetch, args.fixtures)
+    run(args.repeat, args.fixtures)
@@ -0,0 +1,161 @@
+"""
+Shared HTTP client for scraping article and job pages.
+
+Every host gets its own pooled requests.Session, so consecutive pages from one
+outlet reuse a kept-alive connection instead of paying a new TCP/TLS handshake
+each. Requests have bounded connect/read timeouts, so a hung page fails after
+SCRAPER_READ_TIMEOUT instead of blocking a rewriter run forever, and timeouts,
+connection errors and 5xx responses are retried with jittered exponential
+backoff. The fake_useragent data file is loaded once per process.
+
+Latencies of all requests (including failed attempts) are kept in a per-host
+histogram; see latency_histogram().
+"""
+import bisect
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Seconds to establish a connection, and between bytes of the response
+SCRAPER_CONNECT_TIMEOUT = float(os.getenv("SCRAPER_CONNECT_TIMEOUT", "5"))
+SCRAPER_READ_TIMEOUT = float(os.getenv("SCRAPER_READ_TIMEOUT", "20"))
+
+# Retries after the first attempt, and the backoff before retry n is a random
+# delay of up to SCRAPER_BACKOFF_SECONDS * 2 ** n (capped at MAX_BACKOFF_SECONDS)
+SCRAPER_MAX_RETRIES = int(os.getenv("SCRAPER_MAX_RETRIES", "2"))
+SCRAPER_BACKOFF_SECONDS = float(os.getenv("SCRAPER_BACKOFF_SECONDS", "0.5"))
+MAX_BACKOFF_SECONDS = 8.0
+
+# Kept-alive connections per host
+SCRAPER_POOL_SIZE = int(os.getenv("SCRAPER_POOL_SIZE", "4"))
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Used if fake_useragent cannot load its data
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0 Safari/537.36"
+)
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf"))
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+_user_agent = None
+_user_agent_lock = threading.Lock()
+
+_latencies = defaultdict(lambda: [0] * len(LATENCY_BUCKETS_MS))
+_latencies_lock = threading.Lock()
+
+
+def get_session(host):
+    """Pooled session for a host, created on first use."""
+    session = _sessions.get(host)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SCRAPER_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _sessions[host] = session
+    return session
+
+
+def random_user_agent():
+    """A random browser User-Agent from the process-wide fake_useragent pool."""
+    global _user_agent
+    if _user_agent is None:
+        with _user_agent_lock:
+            if _user_agent is None:
+                try:
+                    from fake_useragent import UserAgent
+                    _user_agent = UserAgent()
+                except Exception as e:
+                    print(f"Could not load user agents, using a fixed one: {str(e)}")
+                    _user_agent = False
+    return _user_agent.random if _user_agent else DEFAULT_USER_AGENT
+
+
+def _record_latency(host, seconds):
+    bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)
+    with _latencies_lock:
+        _latencies[host][bucket] += 1
+
+
+def latency_histogram():
+    """
+    Request latencies recorded by this process.
+
+    Returns:
+        dict: {host: {bucket upper bound in ms: number of requests}}
+    """
+    with _latencies_lock:
+        return {host: dict(zip(LATENCY_BUCKETS_MS, counts)) for host, counts in _latencies.items()}
+
+
+def format_latency_histogram():
+    """Latency histogram as printable lines, one per host."""
+    lines = []
+    for host, buckets in sorted(latency_histogram().items()):
+        counts = "  ".join(
+            f"{'>' + str(LATENCY_BUCKETS_MS[-2]) if bound == float('inf') else '<=' + str(bound)}ms: {count}"
+            for bound, count in buckets.items() if count
+        )
+        lines.append(f"{host} ({sum(buckets.values())} requests)  {counts}")
+    return "\n".join(lines)
+
+
+def get(url, headers=None):
+    """
+    GET a page through the host's pooled session, retrying transient failures.
+
+    Timeouts, connection errors and 5xx responses are retried up to
+    SCRAPER_MAX_RETRIES times with jittered exponential backoff.
+
+    Args:
+        url: Page URL
+        headers: Extra request headers
+
+    Returns:
+        requests.Response: The last response (a 5xx if every attempt failed with one)
+
+    Raises:
+        requests.RequestException: If the last attempt failed without a response
+    """
+    host = urlsplit(url).hostname or url
+    session = get_session(host)
+    request_headers = {
+        "User-Agent": random_user_agent(),
+        "Accept-Language": "en-US,en;q=0.9",
+        **(headers or {}),
+    }
+
+    for attempt in range(SCRAPER_MAX_RETRIES + 1):
+        start = time.perf_counter()
+        try:
+            response = session.get(
+                url, headers=request_headers, timeout=(SCRAPER_CONNECT_TIMEOUT, SCRAPER_READ_TIMEOUT)
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _record_latency(host, time.perf_counter() - start)
+            if attempt == SCRAPER_MAX_RETRIES:
+                raise
+            print(f"Retrying {url} after error: {str(e)}")
+        else:
+            _record_latency(host, time.perf_counter() - start)
+            if response.status_code not in RETRY_STATUSES or attempt == SCRAPER_MAX_RETRIES:
+                return response
+            print(f"Retrying {url} after HTTP {response.status_code}")
+
+        time.sleep(random.uniform(0, min(MAX_BACKOFF_SECONDS, SCRAPER_BACKOFF_SECONDS * 2 ** attempt)))
@@ -7,6 +7,12 @@ class NewsSource(models.Model):
     base_url = models.URLField(unique=True)
     feed_url = models.URLField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # HTTP validators of the last feed response, sent back as If-None-Match/If-Modified-Since
+    etag = models.CharField(max_length=255, blank=True, default='')
+    last_modified = models.CharField(max_length=64, blank=True, default='')
+    # Poll scheduling, see scraper.feed_fetcher.poll_interval
+    last_polled_at = models.DateTimeField(null=True, blank=True)
+    avg_new_items_per_poll = models.FloatField(default=0.0)
 
     def __str__(self):
         return self.name
@@ -17,6 +23,8 @@ class ScrapedArticle(models.Model):
     source = models.ForeignKey(NewsSource, on_delete=models.CASCADE, related_name='articles')
     url = models.URLField(unique=True)
     scraped_at = models.DateTimeField(auto_now_add=True)
+    # 64-bit SimHash of the source text (signed), see similarity.lexical
+    simhash = models.BigIntegerField(null=True, blank=True)
 
     def __str__(self):
         return self.url
@@ -27,6 +35,12 @@ class JobSource(models.Model):
     base_url = models.URLField(unique=True)
     feed_url = models.URLField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # HTTP validators of the last feed response, sent back as If-None-Match/If-Modified-Since
+    etag = models.CharField(max_length=255, blank=True, default='')
+    last_modified = models.CharField(max_length=64, blank=True, default='')
+    # Poll scheduling, see scraper.feed_fetcher.poll_interval
+    last_polled_at = models.DateTimeField(null=True, blank=True)
+    avg_new_items_per_poll = models.FloatField(default=0.0)
 
 
     def __str__(self):
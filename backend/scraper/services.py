@@ -1,9 +1,6 @@
 import feedparser
-import requests
-from bs4 import BeautifulSoup
 import time
 import re
-from fake_useragent import UserAgent
 import os
 import sys
 import django
@@ -17,81 +14,69 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 django.setup()
 
 from scraper.models import ScrapedArticle, NewsSource, JobSource, ScrapedJob
+from scraper import extraction, http_client
+from scraper.feed_fetcher import due_sources, fetch_feeds, record_poll
 from core.utils import EmailService
 from core.template import get_missing_scraper_template, get_failed_scraper_template
 
-def get_latest_articles(feed_url=None, scraped_orm_model=None):
-    # feed_url is a NewsSource instance; use its feed_url attribute (string)
-    feed = feedparser.parse(feed_url.feed_url)
-    links = []
-    for entry in feed.entries:
-        link = entry.link
-        if not scraped_orm_model.objects.filter(url=link).exists():
-            links.append(link)
-    return links
+def get_latest_articles(feed_url=None, feed=None):
+    # feed_url is a NewsSource instance; use its feed_url attribute (string).
+    # feed is the already fetched and parsed feed, if any (see fetch_feeds)
+    if feed is None:
+        feed = feedparser.parse(feed_url.feed_url)
+    # Entry links in feed order, each once
+    return list(dict.fromkeys(entry.link for entry in feed.entries if entry.get("link")))
 
 
-def save_links(feed_url, scraped_orm_model=None):
+def save_links(feed_url, scraped_orm_model=None, feed=None):
+    """
+    Record a feed's unseen entry links in one pass.
+
+    The feed is parsed once, all of its links are checked with a single query
+    and the new ones inserted with a single bulk insert.
+
+    Returns:
+        list: Links inserted by this call
+    """
     website = re.search(r"https?://([^/]+)", feed_url.feed_url)
     print(f"🔄 Checking {website.group(1).lower()} for new content...")
 
-    links = get_latest_articles(feed_url, scraped_orm_model=scraped_orm_model)
-
-    for link in links:
-        if not scraped_orm_model.objects.filter(url=link).exists():
-            scraped_orm_model.objects.update_or_create(
-                url=link,
-                defaults={
-                    "source": feed_url,
-                }
-            )
-            print(f"🆕 New article found: {link}")
-        else:
-            print(f"✔️ Already seen: {link}")
+    links = get_latest_articles(feed_url, feed=feed)
+    seen = set(scraped_orm_model.objects.filter(url__in=links).values_list("url", flat=True))
+    new_links = [link for link in links if link not in seen]
+
+    # ignore_conflicts: a link saved by a concurrent sweep in the meantime is skipped
+    scraped_orm_model.objects.bulk_create(
+        [scraped_orm_model(url=link, source=feed_url) for link in new_links], ignore_conflicts=True
+    )
+    for link in new_links:
+        print(f"🆕 New article found: {link}")
+    print(f"✔️ {len(seen)} already seen")
+    return new_links
 
 def get_latest_news_urls():
-    url_list = NewsSource.objects.filter(is_active=True)
+    # Only sources due for a poll; busy feeds are polled more often than quiet ones
+    url_list = due_sources(NewsSource.objects.filter(is_active=True))
     all_links = []
-    for feed_url in url_list:
-        links = get_latest_articles(feed_url, scraped_orm_model=ScrapedArticle)
-        save_links(feed_url, scraped_orm_model=ScrapedArticle)
+    # All feeds are downloaded concurrently, so one slow host does not hold up the sweep
+    for result in fetch_feeds(url_list):
+        links = []
+        if result.feed is not None:
+            links = save_links(result.source, scraped_orm_model=ScrapedArticle, feed=result.feed)
+        record_poll(result, len(links))
         all_links.extend(links)
     return all_links
 
 
 def scrape_article(url):
-    # Extract base domain and name
-    match = re.match(r"https?://([^/]+)", url)
-    base_domain = match.group(1) if match else url
-    site = base_domain.replace("https://", "").replace('www.',"").lower()
+    site = extraction.site_of(url)
     
     # from core_logic.logics.quillbot.chatgpt import prompt_gemini
-    ua = UserAgent()
-    headers = {
-        "User-Agent": ua.random,
-        "Accept-Language": "en-US,en;q=0.9"
-    }
-
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.content, 'html.parser')
+    response = http_client.get(url)
     container = None
     try:
-        if site == 'arise.tv':
-            container = soup.find("article")
-        elif site == 'bellanaija.com':
-            container = soup.find("div", id="mvp-article-cont")
-        elif site == 'dailytrust.com':
-            container = soup.find("div", class_ = "article-container")
-        elif site == 'guardian.ng':
-            container = soup.find("section", class_="main-content").article
-        elif site == 'lindaikejisblog.com':
-            container = soup.find("div", class_="col-md-12")
-        elif site == 'premiumtimesng.com':
-            container = soup.find('div', class_='jeg_content')
-        elif site == 'ynaija.com':
-            container = soup.find("article", class_="blog-item")
-        # elif site == 'vanguardngr.com':
-        #     container
+        if site in extraction.ARTICLE_SELECTORS:
+            container = extraction.extract_article(response.content, site)
         else:
             message = get_missing_scraper_template(site)
             EmailService.send_email_to_admins(message, subject=f"Scraper Missing: {site}", is_html=True)
@@ -100,44 +85,33 @@ def scrape_article(url):
         message = get_failed_scraper_template(site, e)
         EmailService.send_email_to_admins(message, subject=f"Scraper Failed: {site}", is_html=True)
 
-    if container:
-        return container.prettify()
     return container
 
 
 def get_latest_job_urls():
-    url_list = JobSource.objects.filter(is_active=True)
+    # Only sources due for a poll; busy feeds are polled more often than quiet ones
+    url_list = due_sources(JobSource.objects.filter(is_active=True))
     all_links = []
-    for feed_url in url_list:
-        links = get_latest_articles(feed_url, scraped_orm_model=ScrapedJob)
-        save_links(feed_url, scraped_orm_model=ScrapedJob)
+    # All feeds are downloaded concurrently, so one slow host does not hold up the sweep
+    for result in fetch_feeds(url_list):
+        links = []
+        if result.feed is not None:
+            links = save_links(result.source, scraped_orm_model=ScrapedJob, feed=result.feed)
+        record_poll(result, len(links))
         all_links.extend(links)
     return all_links
 
 
 def scrape_job(url):
-    # Extract base domain and name
-    match = re.match(r"https?://([^/]+)", url)
-    base_domain = match.group(1) if match else url
-    site = base_domain.replace("https://", "").replace('www.',"").lower()
+    site = extraction.site_of(url)
     print(f"Scraping job from site: {site}")
     
     # from core_logic.logics.quillbot.chatgpt import prompt_gemini
-    ua = UserAgent()
-    headers = {
-        "User-Agent": ua.random,
-        "Accept-Language": "en-US,en;q=0.9"
-    }
-
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.content, 'html.parser')
+    response = http_client.get(url)
     data = None
     try:
-        if site == 'jobs.smartyacad.com':
-            from scraper.job_scrapers.discover_hub import scrape_data
-            data = scrape_data(soup)
-            
-        
+        if site in extraction.JOB_EXTRACTORS:
+            data = extraction.job_extractor(site)(extraction.make_soup(response.content))
         else:
             message = get_missing_scraper_template(site)
             EmailService.send_email_to_admins(message, subject=f"Scraper Missing: {site}", is_html=True)
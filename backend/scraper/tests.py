@@ -1,3 +1,315 @@
-from django.test import TestCase
+import asyncio
+import os
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from scraper import extraction, feed_fetcher, http_client
+from scraper.models import NewsSource
+from scraper.extraction_benchmark import FIXTURES_DIR, load_fixtures
+
+
+class ArticleExtractionTests(SimpleTestCase):
+    """Runs the site registry over the saved pages in scraper/fixtures/pages."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.fixtures = load_fixtures(FIXTURES_DIR)
+
+    def test_every_registered_site_has_saved_pages(self):
+        self.assertEqual(sorted(self.fixtures), sorted(extraction.ARTICLE_SELECTORS))
+
+    def test_lxml_path_matches_html_parser_fallback(self):
+        for site, pages in self.fixtures.items():
+            selector = extraction.ARTICLE_SELECTORS[site]
+            for content in pages:
+                with self.subTest(site=site):
+                    container = extraction.extract_article(content, site)
+                    self.assertIsNotNone(container)
+                    self.assertEqual(container, extraction.extract_with_soup(content, selector))
+
+    def test_article_body_is_extracted(self):
+        for site, pages in self.fixtures.items():
+            for content in pages:
+                with self.subTest(site=site):
+                    text = extraction.extract_article(content, site)
+                    self.assertIn("<p>", text)
+                    self.assertNotIn("Related", text)
+                    self.assertNotIn("All rights reserved", text)
+                    self.assertNotIn("Breaking:", text)
+
+    def test_legacy_encoded_page_is_decoded(self):
+        # Saved in windows-1252, declared only by the page's meta charset
+        with open(os.path.join(FIXTURES_DIR, 'lindaikejisblog.com', 'super-falcons-squad-friendlies.html'), 'rb') as f:
+            text = extraction.extract_article(f.read(), 'lindaikejisblog.com')
+        self.assertIn("league’s top scorer", text)
+
+
+RSS = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel><title>Wire</title>
+<item><title>First</title><link>/news/first</link></item>
+<item><title>Second</title><link>https://wire.example/news/second</link></item>
+</channel></rss>"""
+
+
+def news_source(name, feed_url, **fields):
+    return NewsSource(name=name, base_url=f"https://{name}/", feed_url=feed_url, **fields)
+
+
+class FeedFetcherTests(SimpleTestCase):
+
+    async def fetch(self, sources, handler):
+        global_slots = asyncio.Semaphore(feed_fetcher.FEED_FETCH_CONCURRENCY)
+        host_slots = {}
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await asyncio.gather(
+                *(feed_fetcher._fetch_one(client, source, global_slots, host_slots) for source in sources)
+            )
+
+    async def test_changed_feed_is_parsed_with_new_validators(self):
+        source = news_source('wire.example', 'https://wire.example/feed')
+
+        def handler(request):
+            return httpx.Response(200, content=RSS, headers={'ETag': '"v2"', 'Last-Modified': 'Sat, 17 Oct 2026 08:00:00 GMT'})
+
+        [result] = await self.fetch([source], handler)
+
+        self.assertIsNone(result.error)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual([entry.link for entry in result.feed.entries],
+                         ['https://wire.example/news/first', 'https://wire.example/news/second'])
+        self.assertEqual((result.etag, result.last_modified), ('"v2"', 'Sat, 17 Oct 2026 08:00:00 GMT'))
+
+    async def test_unchanged_feed_returns_304_without_parsing(self):
+        source = news_source('wire.example', 'https://wire.example/feed',
+                             etag='"v1"', last_modified='Fri, 16 Oct 2026 08:00:00 GMT')
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(304)
+
+        with mock.patch.object(feed_fetcher.feedparser, 'parse') as parse:
+            [result] = await self.fetch([source], handler)
+
+        self.assertEqual(requests[0].headers['If-None-Match'], '"v1"')
+        self.assertEqual(requests[0].headers['If-Modified-Since'], 'Fri, 16 Oct 2026 08:00:00 GMT')
+        self.assertEqual(result.status_code, 304)
+        self.assertIsNone(result.feed)
+        self.assertIsNone(result.error)
+        # The validators are kept for the next poll
+        self.assertEqual((result.etag, result.last_modified), (source.etag, source.last_modified))
+        parse.assert_not_called()
+
+    async def test_error_status_is_reported(self):
+        [result] = await self.fetch([news_source('wire.example', 'https://wire.example/feed')],
+                                    lambda request: httpx.Response(503))
+        self.assertEqual(result.status_code, 503)
+        self.assertIsNone(result.feed)
+        self.assertIsNotNone(result.error)
+
+    async def test_concurrency_per_host_is_capped(self):
+        in_flight, most_in_flight = {}, {}
+
+        async def handler(request):
+            host = request.url.host
+            in_flight[host] = in_flight.get(host, 0) + 1
+            most_in_flight[host] = max(most_in_flight.get(host, 0), in_flight[host])
+            await asyncio.sleep(0.02)
+            in_flight[host] -= 1
+            return httpx.Response(200, content=RSS)
+
+        sources = [news_source(f'busy{n}', f'https://busy.example/feed/{n}') for n in range(6)]
+        sources += [news_source(f'quiet{n}', f'https://quiet{n}.example/feed') for n in range(3)]
+        with mock.patch.object(feed_fetcher, 'FEED_FETCH_PER_HOST', 2):
+            results = await self.fetch(sources, handler)
+
+        self.assertTrue(all(result.error is None for result in results))
+        self.assertEqual(most_in_flight['busy.example'], 2)
+        self.assertEqual(most_in_flight['quiet0.example'], 1)
+
+    async def test_slow_feed_times_out_without_holding_up_the_others(self):
+        async def handler(request):
+            if request.url.host == 'slow.example':
+                await asyncio.sleep(5)
+            return httpx.Response(200, content=RSS)
+
+        sources = [news_source('slow', 'https://slow.example/feed'), news_source('fast', 'https://fast.example/feed')]
+        with mock.patch.object(feed_fetcher, 'FEED_FETCH_TIMEOUT', 0.1):
+            slow, fast = await self.fetch(sources, handler)
+
+        self.assertIn('timed out', slow.error)
+        self.assertIsNone(slow.feed)
+        self.assertLess(slow.elapsed, 1)
+        self.assertIsNone(fast.error)
+        self.assertEqual(len(fast.feed.entries), 2)
+
+
+class PollScheduleTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def interval_minutes(self, average):
+        return feed_fetcher.poll_interval(news_source('wire.example', '', avg_new_items_per_poll=average)) / timedelta(minutes=1)
+
+    def test_interval_shrinks_as_sources_get_busier(self):
+        minutes = [self.interval_minutes(average) for average in (0.3, 0.5, 1, 2)]
+        self.assertEqual(minutes, sorted(minutes, reverse=True))
+        # A source averaging the target is polled as often as allowed
+        self.assertEqual(self.interval_minutes(feed_fetcher.FEED_POLL_TARGET_ITEMS), feed_fetcher.FEED_POLL_MIN_MINUTES)
+        self.assertAlmostEqual(
+            self.interval_minutes(feed_fetcher.FEED_POLL_TARGET_ITEMS / 2), 2 * feed_fetcher.FEED_POLL_MIN_MINUTES
+        )
+
+    def test_interval_stays_within_bounds(self):
+        self.assertEqual(self.interval_minutes(0), feed_fetcher.FEED_POLL_MAX_MINUTES)
+        self.assertEqual(self.interval_minutes(-1), feed_fetcher.FEED_POLL_MAX_MINUTES)
+        self.assertEqual(self.interval_minutes(0.001), feed_fetcher.FEED_POLL_MAX_MINUTES)
+        self.assertEqual(self.interval_minutes(100), feed_fetcher.FEED_POLL_MIN_MINUTES)
+
+    def test_due_sources(self):
+        now = timezone.now()
+        never = news_source('never', '')
+        recent = news_source('recent', '', avg_new_items_per_poll=0, last_polled_at=now - timedelta(minutes=30))
+        overdue = news_source('overdue', '', avg_new_items_per_poll=3, last_polled_at=now - timedelta(minutes=30))
+
+        self.assertEqual(feed_fetcher.due_sources([never, recent, overdue], now=now), [never, overdue])
+
+    def record(self, source, new_items, **result_fields):
+        fields = dict(feed=None, status_code=200, elapsed=0.1, error=None, etag='"v2"', last_modified='')
+        fields.update(result_fields)
+        with mock.patch.object(source, 'save') as save:
+            feed_fetcher.record_poll(feed_fetcher.FeedResult(source, **fields), new_items, now=self.now)
+        return save
+
+    def test_average_is_an_exponential_moving_average(self):
+        source = news_source('wire.example', '', avg_new_items_per_poll=1.0)
+        self.record(source, 11)
+        self.assertAlmostEqual(source.avg_new_items_per_poll, 0.7 * 1.0 + 0.3 * 11)
+        # An unchanged feed (304) counts as a poll without new items
+        self.record(source, 0, status_code=304)
+        self.assertAlmostEqual(source.avg_new_items_per_poll, 0.7 * (0.7 * 1.0 + 0.3 * 11))
+        self.assertEqual(source.last_polled_at, self.now)
+        self.assertEqual(source.etag, '"v2"')
+
+    def test_quiet_and_busy_streaks_move_the_interval(self):
+        source = news_source('wire.example', '', avg_new_items_per_poll=feed_fetcher.FEED_POLL_TARGET_ITEMS)
+        intervals = []
+        for _ in range(5):
+            self.record(source, 0)
+            intervals.append(feed_fetcher.poll_interval(source))
+        self.assertEqual(intervals, sorted(intervals))
+        self.assertGreater(intervals[-1], timedelta(minutes=feed_fetcher.FEED_POLL_MIN_MINUTES))
+
+        for _ in range(10):
+            self.record(source, 2 * feed_fetcher.FEED_POLL_TARGET_ITEMS)
+        self.assertEqual(feed_fetcher.poll_interval(source), timedelta(minutes=feed_fetcher.FEED_POLL_MIN_MINUTES))
+
+    def test_failed_polls_are_not_recorded(self):
+        source = news_source('wire.example', '', etag='"v1"', avg_new_items_per_poll=2.0)
+        save = self.record(source, 5, error='timed out after 20s')
+        save.assert_not_called()
+        self.assertEqual((source.etag, source.avg_new_items_per_poll, source.last_polled_at), ('"v1"', 2.0, None))
+
+
+class ScriptedAdapter(requests.adapters.BaseAdapter):
+    """Transport adapter that answers with scripted status codes or raises scripted exceptions."""
+
+    def __init__(self, outcomes):
+        super().__init__()
+        self.outcomes = list(outcomes)
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+class HttpClientTests(SimpleTestCase):
+
+    def setUp(self):
+        self.sleeps = []
+        for patcher in (
+            mock.patch.dict(http_client._sessions, clear=True),
+            mock.patch.object(http_client, 'random_user_agent', return_value='test-agent'),
+            # Sleep for the longest backoff allowed, without actually sleeping
+            mock.patch.object(http_client.random, 'uniform', side_effect=lambda low, high: high),
+            mock.patch.object(http_client.time, 'sleep', side_effect=self.sleeps.append),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def script(self, host, *outcomes):
+        adapter = ScriptedAdapter(outcomes)
+        http_client.get_session(host).mount('https://', adapter)
+        return adapter
+
+    def test_server_errors_are_retried_with_backoff(self):
+        adapter = self.script('wire.example', 503, 502, 200)
+        response = http_client.get('https://wire.example/news/1', headers={'Referer': 'https://wire.example/'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(adapter.requests), 3)
+        self.assertEqual(self.sleeps, [http_client.SCRAPER_BACKOFF_SECONDS, 2 * http_client.SCRAPER_BACKOFF_SECONDS])
+        headers = adapter.requests[0].headers
+        self.assertEqual((headers['User-Agent'], headers['Referer']), ('test-agent', 'https://wire.example/'))
+
+    def test_last_server_error_is_returned_after_max_retries(self):
+        adapter = self.script('wire.example', *[500] * (http_client.SCRAPER_MAX_RETRIES + 2))
+        response = http_client.get('https://wire.example/news/1')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(len(adapter.requests), http_client.SCRAPER_MAX_RETRIES + 1)
+
+    def test_client_errors_are_not_retried(self):
+        for status in (400, 403, 404, 429):
+            with self.subTest(status=status):
+                adapter = self.script('wire.example', status, 200)
+                self.assertEqual(http_client.get('https://wire.example/news/1').status_code, status)
+                self.assertEqual(len(adapter.requests), 1)
+        self.assertEqual(self.sleeps, [])
+
+    def test_connection_errors_are_retried_then_raised(self):
+        adapter = self.script('wire.example', requests.ConnectionError('reset'), 200)
+        self.assertEqual(http_client.get('https://wire.example/news/1').status_code, 200)
+        self.assertEqual(len(adapter.requests), 2)
+
+        adapter = self.script('wire.example', *[requests.Timeout('read timed out')] * (http_client.SCRAPER_MAX_RETRIES + 1))
+        with self.assertRaises(requests.Timeout):
+            http_client.get('https://wire.example/news/1')
+        self.assertEqual(len(adapter.requests), http_client.SCRAPER_MAX_RETRIES + 1)
+
+    def test_backoff_is_capped(self):
+        retries = 8
+        self.script('wire.example', *[503] * (retries + 1))
+        with mock.patch.object(http_client, 'SCRAPER_MAX_RETRIES', retries):
+            http_client.get('https://wire.example/news/1')
+
+        self.assertEqual(len(self.sleeps), retries)
+        self.assertEqual(max(self.sleeps), http_client.MAX_BACKOFF_SECONDS)
+        self.assertEqual(self.sleeps, sorted(self.sleeps))
+
+    def test_one_pooled_session_per_host(self):
+        session = http_client.get_session('wire.example')
+        self.assertIs(http_client.get_session('wire.example'), session)
+        self.assertIsNot(http_client.get_session('other.example'), session)
+
+        adapter = session.get_adapter('https://wire.example/')
+        self.assertEqual(adapter._pool_maxsize, http_client.SCRAPER_POOL_SIZE)
+        self.assertIs(session.get_adapter('http://wire.example/'), adapter)
@@ -0,0 +1,59 @@
+"""
+Which embedding model is being served.
+
+Every embedding row is tagged with the model that produced it, and every model
+has its own FAISS index directory, so vectors from different models never mix.
+FAISS_MODEL is the model served until a migration (similarity/model_migration.py)
+switches over by rewriting active_model.json in FAISS_INDEX_DIR. Processes check
+the file on every call and follow a switch without restarting.
+
+Kept free of FAISS/numpy imports so models and web workers can use it cheaply.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+
+
+FAISS_INDEX_DIR = os.getenv("FAISS_INDEX_DIR", os.path.join(settings.BASE_DIR, "faiss_indexes"))
+
+# Model served before any migration has switched over
+FAISS_MODEL = os.getenv("FAISS_MODEL", "all-MiniLM-L6-v2")
+
+ACTIVE_MODEL_PATH = os.path.join(FAISS_INDEX_DIR, "active_model.json")
+
+_active = (None, None)
+_active_lock = threading.Lock()
+
+
+def active_model():
+    """Return the name of the embedding model currently served."""
+    global _active
+    try:
+        key = os.stat(ACTIVE_MODEL_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return FAISS_MODEL
+
+    if _active[0] != key:
+        with _active_lock:
+            with open(ACTIVE_MODEL_PATH) as f:
+                _active = (key, json.load(f)["model"])
+    return _active[1]
+
+
+def set_active_model(model_name):
+    """Atomically switch every process over to another embedding model."""
+    os.makedirs(FAISS_INDEX_DIR, exist_ok=True)
+    tmp_path = f"{ACTIVE_MODEL_PATH}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump({"model": model_name, "switched_at": time.time()}, f)
+    os.replace(tmp_path, ACTIVE_MODEL_PATH)
+
+
+def model_directory(model_name=None):
+    """Index directory of a model (the active one if None)."""
+    slug = re.sub(r"[^\w.-]+", "_", model_name or active_model())
+    return os.path.join(FAISS_INDEX_DIR, slug)
@@ -1,14 +1,37 @@
 from django.contrib import admin
-from .models import ArticleEmbedding, JobEmbedding
+from .models import ArticleEmbedding, JobEmbedding, RelatedArticle, StoryCluster, StorySource
 
 # Register your models here.
 @admin.register(ArticleEmbedding)
 class ArticleEmbeddingAdmin(admin.ModelAdmin):
-    list_display = ('article', 'embedding_vector', 'embedding_created_at')
+    list_display = ('article', 'model_name', 'dimension', 'embedding_created_at')
+    list_filter = ('model_name',)
     search_fields = ('article__title',)
 
 
 @admin.register(JobEmbedding)
 class JobEmbeddingAdmin(admin.ModelAdmin):
-    list_display = ('job', 'embedding_vector', 'embedding_created_at')
-    search_fields = ('job__role',)
\ No newline at end of file
+    list_display = ('job', 'model_name', 'dimension', 'embedding_created_at')
+    list_filter = ('model_name',)
+    search_fields = ('job__role',)
+
+@admin.register(RelatedArticle)
+class RelatedArticleAdmin(admin.ModelAdmin):
+    list_display = ('article', 'rank', 'related', 'score', 'computed_at')
+    search_fields = ('article__title',)
+    raw_id_fields = ('article', 'related')
+
+
+class StorySourceInline(admin.TabularInline):
+    model = StorySource
+    extra = 0
+    raw_id_fields = ('scraped_article', 'article')
+
+
+@admin.register(StoryCluster)
+class StoryClusterAdmin(admin.ModelAdmin):
+    list_display = ('id', 'article', 'size', 'created_at', 'updated_at')
+    search_fields = ('article__title',)
+    raw_id_fields = ('article',)
+    exclude = ('centroid',)
+    inlines = [StorySourceInline]
@@ -0,0 +1,146 @@
+"""
+Recall vs latency benchmark for the FAISS index types.
+
+Builds each index type over synthetic clustered unit vectors (shaped like
+sentence embeddings: many near-duplicate groups) and reports recall@k against
+exact flat search, p50/p99 single-query latency, build time and memory per
+vector. Used to decide when flat search stops being fast enough and which
+approximate index to switch to.
+
+Usage:
+    python similarity/benchmark.py
+    python similarity/benchmark.py --sizes 10000 100000 --types flat hnsw ivf --ef-search 32 64 128
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+import django
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from similarity import index_store
+from similarity.index_store import new_index
+
+
+def synthetic_embeddings(n, dimension, seed=0, clusters=None):
+    """Unit vectors scattered around random topic centres."""
+    rng = np.random.default_rng(seed)
+    clusters = clusters or max(n // 20, 1)
+    centres = rng.standard_normal((clusters, dimension), dtype=np.float32)
+    vectors = np.empty((n, dimension), dtype=np.float32)
+    # Fill in blocks to keep peak memory near the output size at 1M vectors
+    for start in range(0, n, 100000):
+        stop = min(start + 100000, n)
+        vectors[start:stop] = centres[rng.integers(0, clusters, stop - start)]
+        vectors[start:stop] += 0.35 * rng.standard_normal((stop - start, dimension), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def recall_at_k(found, truth):
+    """Fraction of the true top-k IDs found, averaged over queries."""
+    hits = sum(len(np.intersect1d(row, expected)) for row, expected in zip(found, truth))
+    return hits / truth.size
+
+
+def time_queries(index, queries, k):
+    """Per-query latency in milliseconds, one query at a time like check_duplicate does."""
+    latencies = np.empty(len(queries))
+    for row, query in enumerate(queries):
+        start = time.perf_counter()
+        index.search(query[None, :], k)
+        latencies[row] = (time.perf_counter() - start) * 1000
+    return latencies
+
+
+def tune(index, index_type, value):
+    """Set efSearch (HNSW) or nprobe (IVF) on an index."""
+    inner = faiss.downcast_index(index.index)
+    if index_type == "hnsw":
+        inner.hnsw.efSearch = value
+    elif index_type == "ivf":
+        inner.nprobe = min(value, inner.nlist)
+
+
+def run(sizes, dimension, index_types, k, num_queries, ef_search, nprobe):
+    """
+    Benchmark every index type at every corpus size.
+
+    Returns:
+        list: One dict per (size, index type, search setting)
+    """
+    results = []
+    for n in sizes:
+        print(f"\n=== {n} vectors, d={dimension} ===")
+        vectors = synthetic_embeddings(n, dimension)
+        ids = np.arange(n, dtype=np.int64)
+        # Queries are perturbed copies of stored items, like re-published articles
+        rng = np.random.default_rng(1)
+        queries = vectors[rng.choice(n, num_queries, replace=False)].copy()
+        queries += 0.05 * rng.standard_normal(queries.shape, dtype=np.float32)
+        faiss.normalize_L2(queries)
+
+        exact = new_index(dimension)
+        exact.add_with_ids(vectors, ids)
+        _, truth = exact.search(queries, k)
+
+        for index_type in index_types:
+            start = time.perf_counter()
+            index = new_index(dimension, index_type, training_vectors=vectors)
+            index.add_with_ids(vectors, ids)
+            build_seconds = time.perf_counter() - start
+            bytes_per_vector = _bytes_per_vector(index)
+            built_type = index_store.index_type_of(index)
+
+            settings = {"hnsw": ef_search, "ivf": nprobe}.get(built_type, [None])
+            for value in settings:
+                tune(index, built_type, value)
+                _, found = index.search(queries, k)
+                latencies = time_queries(index, queries, k)
+                result = {
+                    "size": n,
+                    "index_type": built_type,
+                    "param": value,
+                    "recall": recall_at_k(found, truth),
+                    "p50_ms": float(np.percentile(latencies, 50)),
+                    "p99_ms": float(np.percentile(latencies, 99)),
+                    "build_s": build_seconds,
+                    "bytes_per_vector": bytes_per_vector,
+                }
+                results.append(result)
+                param = f"{'efSearch' if built_type == 'hnsw' else 'nprobe'}={value}" if value else ""
+                print(f"  {built_type:<5} {param:<13} recall@{k} {result['recall']:.3f}  "
+                      f"p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms  "
+                      f"build {build_seconds:.1f} s  {bytes_per_vector:.0f} B/vector")
+
+            del index
+        del vectors, exact
+
+    return results
+
+
+def _bytes_per_vector(index):
+    # Serialized size is a good proxy for resident memory (vectors + graph/lists + ID map)
+    return faiss.serialize_index(index).size / max(index.ntotal, 1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dimension", type=int, default=384, help="all-MiniLM-L6-v2 embeddings are 384-d")
+    parser.add_argument("--types", nargs="+", default=["flat", "hnsw", "ivf"], choices=index_store.INDEX_TYPES)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    args = parser.parse_args()
+
+    run(args.sizes, args.dimension, args.types, args.k, args.queries, args.ef_search, args.nprobe)
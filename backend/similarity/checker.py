@@ -1,12 +1,14 @@
 import os
 from dotenv import load_dotenv
 import faiss
+import gc
 import numpy as np
-from sentence_transformers import SentenceTransformer
+import threading
 from django.core.cache import cache
+from django.db.models import Q
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import timedelta
-import pickle
 import sys
 import os
 import django
@@ -17,22 +19,309 @@ load_dotenv()
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
-django.setup()
+
+from django.apps import apps
+
+# Only needed when run as a script; importing processes have already set up Django
+if not apps.ready:
+    django.setup()
 
 from articles.models import Article
 from jobs.models import Job
 from similarity.models import ArticleEmbedding, JobEmbedding 
+from similarity.index_store import (
+    FAISS_INDEX_TYPE, get_store, index_type_of, list_stores, new_index, search_stores, shard_name, list_shards,
+    stored_dimension,
+)
+from similarity.quantization import (
+    EMBEDDING_STORAGE, bytes_per_vector, dequantize_embedding, dequantize_embeddings, quantize_embedding, roundtrip,
+)
+from similarity.embedding_cache import embedding_cache, query_embedding_cache, cache_key
+from similarity.active_model import active_model
+from similarity.client import SimilarityServiceError, get_client
 
 
-faiss_model = os.getenv("FAISS_MODEL", "all-MiniLM-L6-v2")
-model = SentenceTransformer(faiss_model)
 similarity_threshold = float(os.getenv("SIMILARITY_THRESHOLD", "0.85"))
 default_lookback_days = int(os.getenv("SIMILARITY_LOOKBACK_DAYS", "3"))
 
+# Encoder runtime: 'torch' (default), 'onnx' or 'openvino'. ONNX needs
+# `pip install sentence-transformers[onnx]`; FAISS_ENCODER_FILE picks a model file
+# inside the model repo, e.g. onnx/model_qint8_avx512_vnni.onnx for int8 weights
+FAISS_ENCODER_BACKEND = os.getenv("FAISS_ENCODER_BACKEND", "torch")
+FAISS_ENCODER_FILE = os.getenv("FAISS_ENCODER_FILE", "")
+
+ENCODER_BACKENDS = ("torch", "onnx", "openvino")
+
+# Search results less similar to the query than this are dropped
+SEMANTIC_SEARCH_MIN_SCORE = float(os.getenv("SEMANTIC_SEARCH_MIN_SCORE", "0.2"))
+
+# Seconds before a request that finds an index missing queues another build of it
+INDEX_BUILD_REQUEUE_SECONDS = 600
+
+# Rows fetched per database round trip when bulk loading embeddings
+EMBEDDING_LOAD_CHUNK_SIZE = int(os.getenv("EMBEDDING_LOAD_CHUNK_SIZE", "5000"))
+
+# Texts per encoder forward pass, and items per backfill chunk (one bulk write each)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_BACKFILL_CHUNK_SIZE = int(os.getenv("EMBEDDING_BACKFILL_CHUNK_SIZE", "1000"))
+
+# Index type per model type, e.g. 'hnsw' for articles and 'ivf' for the larger
+# job history; see similarity.index_store.INDEX_TYPES. Story centroids default
+# to HNSW, so placing an article in a story does not scan every open story
+INDEX_TYPES_BY_MODEL = {
+    'article': os.getenv("FAISS_ARTICLE_INDEX_TYPE") or FAISS_INDEX_TYPE,
+    'job': os.getenv("FAISS_JOB_INDEX_TYPE") or FAISS_INDEX_TYPE,
+    'story': os.getenv("FAISS_STORY_INDEX_TYPE") or "hnsw",
+}
+
+
+_model = None
+_model_name = None
+_model_lock = threading.Lock()
+
+# Embedding dimension per model name, see embedding_dimension()
+_dimensions = {}
 
-# Cache keys
-FAISS_INDEX_CACHE_KEY = "faiss_index"
-FAISS_ARTICLE_IDS_CACHE_KEY = "faiss_article_ids"
+
+def load_encoder(backend=None, model_file=None, model_name=None):
+    """
+    Load a sentence encoder on the given inference backend.
+    
+    Every backend returns a SentenceTransformer, so encode(),
+    encode_multi_process() and the other callers work unchanged.
+    
+    Args:
+        backend: 'torch', 'onnx' or 'openvino' (FAISS_ENCODER_BACKEND if None)
+        model_file: ONNX/OpenVINO file within the model repo (FAISS_ENCODER_FILE if None)
+        model_name: Embedding model, or None for the active one
+    
+    Returns:
+        SentenceTransformer: Encoder instance
+    """
+    from sentence_transformers import SentenceTransformer
+    
+    model_name = model_name or active_model()
+    backend = backend or FAISS_ENCODER_BACKEND
+    model_file = FAISS_ENCODER_FILE if model_file is None else model_file
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Invalid encoder backend: {backend}. Must be one of {', '.join(ENCODER_BACKENDS)}")
+    
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    
+    model_kwargs = {"file_name": model_file} if model_file else None
+    return SentenceTransformer(model_name, backend=backend, model_kwargs=model_kwargs)
+
+
+def get_model():
+    """
+    Return the sentence encoder, loading it on first use.
+    
+    Importing this module no longer loads the model, so processes that never
+    embed anything (web workers, short-lived commands) start fast. After a
+    model migration switches over, the new model is loaded on the next call.
+    
+    Returns:
+        SentenceTransformer: Shared encoder instance for this process
+    """
+    global _model, _model_name
+    
+    model_name = active_model()
+    if _model is None or _model_name != model_name:
+        with _model_lock:
+            if _model is None or _model_name != model_name:
+                print(f"Loading sentence encoder {model_name} ({FAISS_ENCODER_BACKEND})...")
+                _model = load_encoder(model_name=model_name)
+                _model_name = model_name
+    
+    return _model
+
+
+def prewarm(warmup=True, freeze=False):
+    """
+    Load the encoder ahead of the first request.
+    
+    For prefork servers (Celery, gunicorn --preload) call this in the parent
+    with warmup=False and freeze=True: the weights are then shared with every
+    forked child through copy-on-write. The warm-up forward pass is skipped in
+    that case because starting the intra-op thread pool before forking can
+    deadlock the children.
+    
+    Args:
+        warmup: Run one forward pass so the first real encode is not slowed down
+        freeze: Call gc.freeze() so the garbage collector never touches (and
+                copies) the pages holding the model in forked children
+    """
+    if get_client() is not None:
+        print("Similarity service configured; not loading the encoder in this process")
+        return
+    
+    encoder = get_model()
+    
+    if warmup:
+        encoder.encode("warm up", convert_to_tensor=False, normalize_embeddings=True)
+    
+    if freeze:
+        gc.freeze()
+
+
+def embedding_dimension():
+    """
+    Return the embedding dimension of the active model, loading the encoder only as a last resort.
+    
+    The dimension is read from the model's saved indexes, then from the
+    similarity service, so workers using the service never load the encoder
+    just to create an empty index.
+    
+    Returns:
+        int: Embedding dimension
+    """
+    model_name = active_model()
+    dimension = _dimensions.get(model_name) or stored_dimension(model_name)
+    
+    client = get_client()
+    if dimension is None and client is not None:
+        try:
+            health = client.health()
+            if health.get("model") == model_name:
+                dimension = health.get("dimension")
+        except (OSError, SimilarityServiceError) as e:
+            print(f"Similarity service unavailable, loading the encoder for its dimension: {str(e)}")
+    
+    if dimension is None:
+        dimension = get_model().get_sentence_embedding_dimension()
+    
+    _dimensions[model_name] = dimension
+    return dimension
+
+
+def article_text(article):
+    """Text used to embed an article: title, excerpt and content."""
+    return f"{article.title}\n\n{article.excerpt}\n\n{article.content}"
+
+
+def job_text(job):
+    """Text used to embed a job: role and description."""
+    return f"{job.role}\n\n{job.description}"
+
+
+def open_jobs_q(prefix=''):
+    """
+    Filter for jobs that are still open: not archived and not past their deadline.
+    
+    Only open jobs are kept in the job index, so job duplicates and similar
+    jobs are always found among current listings.
+    
+    Args:
+        prefix: Lookup path to the Job from the queried model (e.g. 'job__')
+    """
+    today = timezone.localdate()
+    return ~Q(**{f'{prefix}status': 'archived'}) & (
+        Q(**{f'{prefix}deadline__isnull': True}) | Q(**{f'{prefix}deadline__gte': today})
+    )
+
+
+def is_open_job(job):
+    """True if the job belongs in the job index (see open_jobs_q)."""
+    deadline = job.deadline
+    if isinstance(deadline, str):
+        # Freshly created jobs keep the scraped string until reloaded
+        deadline = parse_date(deadline)
+    return job.status != 'archived' and (deadline is None or deadline >= timezone.localdate())
+
+
+def encode_texts(texts, pool=None, use_cache=True, cache=None):
+    """
+    Encode many texts in batched forward passes.
+    
+    Embeddings are looked up in the content-hash embedding cache first, so a
+    text that was already encoded (e.g. by the duplicate check) is not
+    encoded again, and repeated texts within the call are encoded once.
+    
+    Args:
+        texts: List of strings
+        pool: Optional multi-process pool from get_model().start_multi_process_pool()
+        use_cache: Set to False for one-off bulk jobs that would only flush the cache
+        cache: EmbeddingCache to use instead of the shared document cache
+        
+    Returns:
+        numpy.ndarray: float32 matrix of normalized embeddings, one row per text
+    """
+    if not use_cache:
+        return _encode_uncached(texts, pool=pool)
+    
+    cache = cache or embedding_cache
+    model_name = active_model()
+    keys = [cache_key(text, model_name) for text in texts]
+    cached = cache.get_many(keys)
+    
+    # Encode each distinct missing text once
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cached and key not in missing:
+            missing[key] = text
+    
+    if missing:
+        encoded = _encode_uncached(list(missing.values()), pool=pool)
+        new_embeddings = {key: row.copy() for key, row in zip(missing.keys(), encoded)}
+        cache.set_many(new_embeddings)
+        cached.update(new_embeddings)
+    
+    return np.array([cached[key] for key in keys], dtype=np.float32)
+
+
+def encode_text(text):
+    """
+    Encode a single text, going through the embedding cache.
+    
+    Returns:
+        numpy.ndarray: Normalized embedding vector
+    """
+    return encode_texts([text])[0]
+
+
+def truncate_for_encoder(texts, max_words):
+    """
+    Cut texts to their first `max_words` words before tokenization.
+    
+    Every word is at least one token, so with max_words set to the model's
+    max_seq_length the encoder sees exactly the same tokens; the rest of a
+    long article body is simply never tokenized.
+    
+    Args:
+        texts: List of strings
+        max_words: Words to keep
+    
+    Returns:
+        list: Truncated texts
+    """
+    truncated = []
+    for text in texts:
+        words = text.split(None, max_words)
+        truncated.append(" ".join(words[:max_words]) if len(words) > max_words else text)
+    return truncated
+
+
+def _encode_uncached(texts, pool=None, encoder=None):
+    """Encode without the cache; `encoder` overrides the active model (e.g. for a model migration)."""
+    client = get_client()
+    if client is not None and pool is None and encoder is None:
+        try:
+            return client.encode(texts)
+        except (OSError, SimilarityServiceError) as e:
+            print(f"Similarity service unavailable, encoding locally: {str(e)}")
+    
+    encoder = encoder or get_model()
+    texts = truncate_for_encoder(texts, encoder.max_seq_length)
+    
+    if pool is not None:
+        return encoder.encode_multi_process(
+            texts, pool, batch_size=EMBEDDING_BATCH_SIZE, normalize_embeddings=True
+        ).astype(np.float32)
+    
+    return encoder.encode(
+        texts, batch_size=EMBEDDING_BATCH_SIZE, convert_to_tensor=False, normalize_embeddings=True
+    ).astype(np.float32)
 
 
 def encode_article(article):
@@ -46,30 +335,113 @@ def encode_article(article):
         numpy.ndarray: Embedding vector
     """
     # Combine title, excerpt, and content for better representation
-    text = f"{article.title}\n\n{article.excerpt}\n\n{article.content}"
-    embedding = model.encode(text, convert_to_tensor=False, normalize_embeddings=True)
+    text = article_text(article)
+    model_name = active_model()
+    embedding = encode_text(text)
     
     # Save embedding to database
     ArticleEmbedding.objects.update_or_create(
         article=article,
-        defaults={"embedding_vector": embedding.tobytes()}
+        model_name=model_name,
+        defaults=embedding_fields(embedding)
     )
     
     return embedding
 
 
-def decode_embedding(embedding_binary):
+def embedding_fields(embedding):
+    """
+    Model field values for storing an embedding in the configured EMBEDDING_STORAGE format.
+    
+    Returns:
+        dict: embedding_vector, embedding_format and dimension
+    """
+    data, storage = quantize_embedding(embedding)
+    return {"embedding_vector": data, "embedding_format": storage, "dimension": len(embedding)}
+
+
+def decode_embedding(embedding_binary, embedding_format='float32'):
     """
     Decode binary embedding back to numpy array.
     
     Args:
         embedding_binary: Binary embedding from database
+        embedding_format: Storage format recorded on the row
         
     Returns:
         numpy.ndarray: Decoded embedding vector
     """
-    embedding_array = np.frombuffer(embedding_binary, dtype=np.float32)
-    return embedding_array
+    return dequantize_embedding(embedding_binary, embedding_format)
+
+
+def load_embedding_matrix(embeddings_query, id_field):
+    """
+    Load embeddings into one contiguous float32 matrix.
+    
+    Rows are streamed with values_list (no model instances) and each chunk of
+    raw bytes is decoded with a single vectorized call per storage format
+    straight into a preallocated buffer, so peak memory stays close to the
+    matrix size.
+    
+    Args:
+        embeddings_query: ArticleEmbedding/JobEmbedding queryset
+        id_field: 'article_id' or 'job_id'
+        
+    Returns:
+        tuple: (numpy.ndarray of IDs, float32 matrix of shape (n, d))
+    """
+    rows = embeddings_query.order_by(id_field).values_list(id_field, 'embedding_vector', 'embedding_format')
+    total = rows.count()
+    
+    if total == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    
+    ids = np.empty(total, dtype=np.int64)
+    matrix = None
+    filled = 0
+    
+    chunk_ids, chunk_vectors, chunk_formats = [], [], []
+    
+    def flush():
+        nonlocal matrix, filled
+        # Rows are usually all in one format; mixed chunks occur while the setting is being changed
+        by_format = {}
+        for position, storage in enumerate(chunk_formats):
+            by_format.setdefault(storage, []).append(position)
+        
+        for storage, positions in by_format.items():
+            block = dequantize_embeddings(
+                b''.join(chunk_vectors[position] for position in positions), storage, len(positions)
+            )
+            if matrix is None:
+                matrix = np.empty((total, block.shape[1]), dtype=np.float32)
+            if len(by_format) == 1:
+                matrix[filled:filled + len(block)] = block
+            else:
+                matrix[filled + np.asarray(positions)] = block
+        
+        ids[filled:filled + len(chunk_ids)] = chunk_ids
+        filled += len(chunk_ids)
+        chunk_ids.clear()
+        chunk_vectors.clear()
+        chunk_formats.clear()
+    
+    # Slicing caps the read at the counted rows if inserts race with the load
+    for item_id, vector, storage in rows[:total].iterator(chunk_size=EMBEDDING_LOAD_CHUNK_SIZE):
+        chunk_ids.append(item_id)
+        chunk_vectors.append(vector)
+        chunk_formats.append(storage)
+        if len(chunk_ids) == EMBEDDING_LOAD_CHUNK_SIZE:
+            flush()
+    
+    if chunk_ids:
+        flush()
+    
+    if matrix is None:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    
+    # Rows deleted during the load leave the tail unfilled
+    return ids[:filled], matrix[:filled]
 
 
 def encode_job(job):
@@ -83,161 +455,220 @@ def encode_job(job):
         numpy.ndarray: Embedding vector
     """
     # Combine role and description for better representation
-    text = f"{job.role}\n\n{job.description}"
-    embedding = model.encode(text, convert_to_tensor=False, normalize_embeddings=True)
+    text = job_text(job)
+    model_name = active_model()
+    embedding = encode_text(text)
     
     # Save embedding to database
     JobEmbedding.objects.update_or_create(
         job=job,
-        defaults={"embedding_vector": embedding.tobytes()}
+        model_name=model_name,
+        defaults=embedding_fields(embedding)
     )
     
     return embedding
 
 
-def build_faiss_index(lookback_days=None, model_type='article'):
+def build_faiss_index(lookback_days=None, model_type='article', day=None, model_name=None):
     """
     Build FAISS index from articles or jobs with embeddings in the database.
     
     Args:
         lookback_days: Number of days to look back. 
                       If None, includes all items.
-                      If specified, only includes items from the last N days.
+                      If specified, only includes items from the last N days
+                      and the index is not saved.
         model_type: 'article' or 'job'
+        day: If specified, builds and saves the daily shard for this date.
+        model_name: Embedding model whose vectors are indexed, or None for the
+                    active one (a migration builds the next model's indexes)
     
     Returns:
-        tuple: (faiss.Index, list of IDs)
+        faiss.IndexIDMap2: Index keyed by Article/Job primary key, or None if empty
     """
-    print(f"Building FAISS index for {model_type}s from database...")
+    model_name = model_name or active_model()
     
-    # Get embeddings based on model type
     if model_type == 'article':
-        embeddings_query = ArticleEmbedding.objects.select_related('article')
-        
-        if lookback_days is not None:
-            cutoff_date = timezone.now() - timedelta(days=lookback_days)
-            embeddings_query = embeddings_query.filter(article__created_at__gte=cutoff_date)
-            print(f"Filtering articles from last {lookback_days} days (since {cutoff_date.date()})")
-        
-        embeddings_data = embeddings_query.all()
-        
-        if not embeddings_data.exists():
-            print("No article embeddings found in database")
-            return None, []
-        
-        embeddings = []
-        item_ids = []
-        
-        for emb_obj in embeddings_data:
-            embedding = decode_embedding(emb_obj.embedding_vector)
-            embeddings.append(embedding)
-            item_ids.append(emb_obj.article.id)
-    
+        embeddings_query = ArticleEmbedding.objects.filter(model_name=model_name)
+        created_field = 'article__created_at'
+        id_field = 'article_id'
     elif model_type == 'job':
-        embeddings_query = JobEmbedding.objects.select_related('job')
-        
-        if lookback_days is not None:
-            cutoff_date = timezone.now() - timedelta(days=lookback_days)
-            embeddings_query = embeddings_query.filter(job__created_at__gte=cutoff_date)
-            print(f"Filtering jobs from last {lookback_days} days (since {cutoff_date.date()})")
-        
-        embeddings_data = embeddings_query.all()
-        
-        if not embeddings_data.exists():
-            print("No job embeddings found in database")
-            return None, []
-        
-        embeddings = []
-        item_ids = []
-        
-        for emb_obj in embeddings_data:
-            embedding = decode_embedding(emb_obj.embedding_vector)
-            embeddings.append(embedding)
-            item_ids.append(emb_obj.job.id)
-    
+        # Closed jobs are evicted from the job index, so never build them back in
+        embeddings_query = JobEmbedding.objects.filter(open_jobs_q('job__'), model_name=model_name)
+        created_field = 'job__created_at'
+        id_field = 'job_id'
     else:
         raise ValueError(f"Invalid model_type: {model_type}. Must be 'article' or 'job'")
     
-    # Convert to numpy array
-    embeddings_array = np.array(embeddings).astype('float32')
+    store = None
+    if day is not None:
+        store = get_store(shard_name(model_type, day), model_name)
+        embeddings_query = embeddings_query.filter(**{f'{created_field}__date': day})
+        print(f"Building FAISS {model_type} shard for {day} from database...")
+    elif lookback_days is not None:
+        cutoff_date = timezone.now() - timedelta(days=lookback_days)
+        embeddings_query = embeddings_query.filter(**{f'{created_field}__gte': cutoff_date})
+        print(f"Building FAISS index for {model_type}s from last {lookback_days} days (since {cutoff_date.date()})")
+    else:
+        store = get_store(model_type, model_name)
+        print(f"Building FAISS index for {model_type}s from database...")
     
-    # Create FAISS index (using Inner Product for cosine similarity with normalized vectors)
-    dimension = embeddings_array.shape[1]
-    index = faiss.IndexFlatIP(dimension)
+    # Delta segments written before the query are covered by the rows read below
+    absorbed_segments = store.segment_names() if store is not None else None
+    
+    item_ids, embeddings_array = load_embedding_matrix(embeddings_query, id_field)
     
-    # Normalize vectors for cosine similarity
+    if len(item_ids) == 0:
+        print(f"No {model_type} embeddings found in database")
+        if store is None or model_name != active_model():
+            # The dimension of a model that is not loaded yet is unknown
+            return None
+        # Save an empty index so empty stores and quiet days are not rebuilt on every query
+        index = new_index(embedding_dimension())
+        store.save(index, absorbed_segments=absorbed_segments)
+        return index
+    
+    # Normalize vectors for cosine similarity (in place, no copy)
     faiss.normalize_L2(embeddings_array)
     
+    # Create FAISS index (Inner Product for cosine similarity, keyed by primary key),
+    # training the quantizer on the vectors themselves for compressed index types
+    dimension = embeddings_array.shape[1]
+    index = new_index(dimension, INDEX_TYPES_BY_MODEL[model_type], training_vectors=embeddings_array)
+    
     # Add vectors to index
-    index.add(embeddings_array)
+    index.add_with_ids(embeddings_array, item_ids)
     
-    print(f"FAISS index built with {len(item_ids)} {model_type}s")
+    print(f"FAISS {index_type_of(index)} index built with {len(item_ids)} {model_type}s")
     
-    # Cache the index
-    _cache_faiss_index(index, item_ids, model_type=model_type)
+    # Persist full indexes and shards to the on-disk store
+    if store is not None:
+        store.save(index, absorbed_segments=absorbed_segments)
     
-    return index, item_ids
+    return index
 
 
-def _cache_faiss_index(index, item_ids, model_type='article'):
+def get_index(model_type='article', day=None, build=True):
     """
-    Save FAISS index and item IDs to cache.
+    Return the on-disk store for a full index or daily shard, building it from the database if missing.
     
     Args:
-        index: FAISS index
-        item_ids: List of item IDs (article or job IDs)
         model_type: 'article' or 'job'
+        day: Date of the daily shard, or None for the full index
+        build: If False, a missing index is not built here but queued for a
+               Celery worker, and the empty store is returned (for web requests)
+    
+    Returns:
+        IndexStore: Per-process store singleton
     """
-    # Serialize index
-    serialized_index = faiss.serialize_index(index)
+    store = get_store(model_type if day is None else shard_name(model_type, day))
     
-    # Use different cache keys for articles and jobs
-    index_key = f"faiss_index_{model_type}"
-    ids_key = f"faiss_{model_type}_ids"
+    if store.is_empty():
+        if build:
+            build_faiss_index(lookback_days=None, model_type=model_type, day=day)
+        else:
+            queue_index_build(store, model_type, day)
     
-    cache.set(index_key, serialized_index, timeout=None)
-    cache.set(ids_key, item_ids, timeout=None)
+    return store
+
+
+def queue_index_build(store, model_type, day=None):
+    """Ask a Celery worker to build a missing index, at most once per INDEX_BUILD_REQUEUE_SECONDS."""
+    if not cache.add(f"faiss-build-queued:{store.directory}:{store.name}", True, INDEX_BUILD_REQUEUE_SECONDS):
+        return
     
-    print(f"FAISS {model_type} index cached successfully")
+    # Imported here: the tasks module imports this one
+    from similarity.tasks import build_missing_faiss_index
+    try:
+        # Fail fast if the broker is down rather than hold up the request
+        build_missing_faiss_index.apply_async(args=(model_type, day.isoformat() if day else None), retry=False)
+        print(f"Queued a build of the missing FAISS {store.name} index")
+    except Exception as e:
+        print(f"Could not queue a build of the missing FAISS {store.name} index: {str(e)}")
 
 
-def load_faiss_index(lookback_days=None, model_type='article'):
+def search_faiss_index(query_embeddings, k, lookback_days=None, model_type='article', build_missing=True):
     """
-    Load FAISS index from cache or rebuild if not available.
+    Search the FAISS index for the nearest neighbours of one or more embeddings.
     
     Args:
+        query_embeddings: float32 array of shape (n, d), already normalized
+        k: Number of neighbours per query
         lookback_days: Number of days to look back.
-                      If None, includes all items.
+                      If None, searches the full index. Otherwise only the
+                      daily shards from the cutoff date onwards are searched.
         model_type: 'article' or 'job'
+        build_missing: If False, missing indexes are queued for a build
+                       instead of built here, and searched as empty (see get_index)
     
     Returns:
-        tuple: (faiss.Index, list of IDs)
+        tuple: (similarities, item IDs), each of shape (n, k); missing
+               neighbours have an ID of -1
     """
-    # If lookback_days is specified, always rebuild (can't cache filtered indexes reliably)
-    if lookback_days is not None:
-        print(f"Building {model_type} index with {lookback_days}-day lookback (no cache for filtered queries)")
-        return build_faiss_index(lookback_days=lookback_days, model_type=model_type)
+    client = get_client()
+    if client is not None:
+        try:
+            return client.search(query_embeddings, k, lookback_days=lookback_days, model_type=model_type)
+        except (OSError, SimilarityServiceError) as e:
+            print(f"Similarity service unavailable, searching locally: {str(e)}")
+    
+    if lookback_days is None:
+        return get_index(model_type, build=build_missing).search(query_embeddings, k)
     
-    # Try to load from cache (full index only)
-    index_key = f"faiss_index_{model_type}"
-    ids_key = f"faiss_{model_type}_ids"
+    # Shards are per calendar day, so the oldest one may include a few extra hours
+    today = timezone.localdate()
+    cutoff_day = timezone.localdate(timezone.now() - timedelta(days=lookback_days))
+    days = [cutoff_day + timedelta(days=offset) for offset in range((today - cutoff_day).days + 1)]
+    
+    stores = [get_index(model_type, day=day, build=build_missing) for day in days]
+    return search_stores(stores, query_embeddings, k)
+
+
+def _add_to_index(model_type, item, embedding):
+    """Upsert an embedding into the full index and the item's daily shard."""
+    client = get_client()
+    if client is not None:
+        try:
+            return client.add(model_type, item.id, item.created_at, embedding)
+        except (OSError, SimilarityServiceError) as e:
+            # Segments written here are picked up by the service from the shared index directory
+            print(f"Similarity service unavailable, writing index segment locally: {str(e)}")
+    
+    embedding_array = np.array([embedding]).astype('float32')
+    faiss.normalize_L2(embedding_array)
+    
+    for day in (None, timezone.localdate(item.created_at)):
+        store = get_index(model_type, day=day)
+        # Append a delta segment; compaction merges it into the base later
+        store.add(embedding_array, [item.id])
+
+
+def _remove_from_index(model_type, item_id, created_at=None):
+    """Record a deletion in the full index and the item's daily shard (or every shard if unknown)."""
+    client = get_client()
+    if client is not None:
+        try:
+            return client.remove(model_type, item_id, created_at=created_at)
+        except (OSError, SimilarityServiceError) as e:
+            print(f"Similarity service unavailable, writing index segment locally: {str(e)}")
     
-    cached_index = cache.get(index_key)
-    cached_item_ids = cache.get(ids_key)
+    get_store(model_type).remove([item_id])
     
-    if cached_index and cached_item_ids:
-        print(f"Loaded FAISS {model_type} index from cache with {len(cached_item_ids)} items")
-        index = faiss.deserialize_index(cached_index)
-        return index, cached_item_ids
+    if created_at is not None:
+        shard_names = [shard_name(model_type, timezone.localdate(created_at))]
+    else:
+        shard_names = [name for _, name in list_shards(model_type)]
     
-    # Rebuild if not in cache
-    print(f"FAISS {model_type} index not in cache, rebuilding...")
-    return build_faiss_index(lookback_days=None, model_type=model_type)
+    for name in shard_names:
+        get_store(name).remove([item_id])
 
 
 def add_article_to_index(article):
     """
-    Add a single article to the FAISS index.
+    Add a single article to the FAISS index, or update it if already indexed.
+    
+    The new vector replaces any previous one for the same article ID, so this
+    is also the way to refresh an article after it has been edited.
     
     Args:
         article: Article instance
@@ -249,29 +680,45 @@ def add_article_to_index(article):
         # Encode the article
         embedding = encode_article(article)
         
-        # Load existing index (full index, not filtered)
-        index, article_ids = load_faiss_index(lookback_days=None)
+        _add_to_index('article', article, embedding)
         
-        if index is None:
-            # Create new index if none exists
-            index, article_ids = build_faiss_index(lookback_days=None)
+        print(f"Added article {article.id} to FAISS index")
+        return True
         
-        # Add new embedding to index
-        embedding_array = np.array([embedding]).astype('float32')
-        faiss.normalize_L2(embedding_array)
-        index.add(embedding_array)
+    except Exception as e:
+        print(f"Error adding article to index: {str(e)}")
+        return False
+
+
+def add_job_to_index(job):
+    """
+    Add a single job to the FAISS index, or update it if already indexed.
+    
+    Archived jobs and jobs past their deadline are removed from the index
+    instead, so saving a closed job evicts it straight away.
+    
+    Args:
+        job: Job instance
+        
+    Returns:
+        bool: Success status
+    """
+    try:
+        # Encode the job
+        embedding = encode_job(job)
         
-        # Update article IDs list
-        article_ids.append(article.id)
+        if not is_open_job(job):
+            _remove_from_index('job', job.id, created_at=job.created_at)
+            print(f"Job {job.id} is closed, removed from FAISS index")
+            return True
         
-        # Update cache
-        _cache_faiss_index(index, article_ids)
+        _add_to_index('job', job, embedding)
         
-        print(f"Added article {article.id} to FAISS index")
+        print(f"Added job {job.id} to FAISS index")
         return True
         
     except Exception as e:
-        print(f"Error adding article to index: {str(e)}")
+        print(f"Error adding job to index: {str(e)}")
         return False
 
 
@@ -298,36 +745,28 @@ def find_similar_articles(article, top_k=5, threshold=None, lookback_days=None):
     elif lookback_days == 0 or lookback_days is False:
         lookback_days = None  # Search all articles
     
-    # Load FAISS index with optional date filtering
-    index, article_ids = load_faiss_index(lookback_days=lookback_days)
-    
-    if index is None or index.ntotal == 0:
-        print("No articles in FAISS index")
-        return []
-    
     # Get embedding for query article
     if isinstance(article, str):
         # If article is a string, encode it directly
-        query_embedding = model.encode(article, convert_to_tensor=False, normalize_embeddings=True)
+        query_embedding = encode_text(article)
     else:
         # If article is an Article instance
-        text = f"{article.title}\n\n{article.excerpt}\n\n{article.content}"
-        query_embedding = model.encode(text, convert_to_tensor=False, normalize_embeddings=True)
+        query_embedding = encode_text(article_text(article))
     
     # Reshape for FAISS
     query_embedding = np.array([query_embedding]).astype('float32')
     faiss.normalize_L2(query_embedding)
     
-    # Search for similar articles
-    distances, indices = index.search(query_embedding, k=min(top_k + 1, index.ntotal))
+    # Search for similar articles with optional date filtering
+    distances, article_ids = search_faiss_index(query_embedding, k=top_k + 1, lookback_days=lookback_days)
     
     # Filter results by threshold and exclude the query article itself
     similar_articles = []
-    for idx, distance in zip(indices[0], distances[0]):
+    for article_id, distance in zip(article_ids[0], distances[0]):
         similarity_score = float(distance)  # Cosine similarity (0-1)
         
-        if similarity_score >= threshold:
-            article_id = article_ids[idx]
+        if article_id >= 0 and similarity_score >= threshold:
+            article_id = int(article_id)
             
             # Exclude the query article itself
             if not isinstance(article, str) and article_id == article.id:
@@ -346,8 +785,8 @@ def find_similar_jobs(job, top_k=5, threshold=None, lookback_days=None):
         job: Job instance or text string
         top_k: Number of similar jobs to return
         threshold: Similarity threshold (0-1), uses env variable if None
-        lookback_days: Number of days to look back. If None, uses default_lookback_days.
-                      Set to 0 or False to search all jobs.
+        lookback_days: Number of days to look back. If None (or 0/False), searches
+                      every open job in the job index.
         
     Returns:
         list: List of tuples (job_id, similarity_score)
@@ -355,47 +794,32 @@ def find_similar_jobs(job, top_k=5, threshold=None, lookback_days=None):
     if threshold is None:
         threshold = similarity_threshold
     
-    # Handle lookback_days logic
-    if lookback_days is None:
-        lookback_days = default_lookback_days
-    elif lookback_days == 0 or lookback_days is False:
-        lookback_days = None  # Search all jobs
-    
-    # Check if there are any job embeddings
-    if not JobEmbedding.objects.exists():
-        print("No job embeddings found in database")
-        return []
-    
-    # Load FAISS index with optional date filtering
-    index, job_ids = load_faiss_index(lookback_days=lookback_days, model_type='job')
-    
-    if index is None or index.ntotal == 0:
-        print("No jobs in FAISS index")
-        return []
+    # The job index only holds open jobs, so it is searched whole by default
+    if lookback_days == 0 or lookback_days is False:
+        lookback_days = None
     
     # Get embedding for query job
     if isinstance(job, str):
         # If job is a string, encode it directly
-        query_embedding = model.encode(job, convert_to_tensor=False, normalize_embeddings=True)
+        query_embedding = encode_text(job)
     else:
         # If job is a Job instance
-        text = f"{job.role}\n\n{job.description}"
-        query_embedding = model.encode(text, convert_to_tensor=False, normalize_embeddings=True)
+        query_embedding = encode_text(job_text(job))
     
     # Reshape for FAISS
     query_embedding = np.array([query_embedding]).astype('float32')
     faiss.normalize_L2(query_embedding)
     
-    # Search for similar jobs
-    distances, indices = index.search(query_embedding, k=min(top_k + 1, index.ntotal))
+    # Search for similar jobs with optional date filtering
+    distances, job_ids = search_faiss_index(query_embedding, k=top_k + 1, lookback_days=lookback_days, model_type='job')
     
     # Filter results by threshold and exclude the query job itself
     similar_jobs = []
-    for idx, distance in zip(indices[0], distances[0]):
+    for job_id, distance in zip(job_ids[0], distances[0]):
         similarity_score = float(distance)  # Cosine similarity (0-1)
         
-        if similarity_score >= threshold:
-            job_id = job_ids[idx]
+        if job_id >= 0 and similarity_score >= threshold:
+            job_id = int(job_id)
             
             # Exclude the query job itself
             if not isinstance(job, str) and job_id == job.id:
@@ -406,6 +830,53 @@ def find_similar_jobs(job, top_k=5, threshold=None, lookback_days=None):
     return similar_jobs[:top_k]
 
 
+def semantic_search(query, model_types=('article', 'job'), k=10, min_score=None):
+    """
+    Rank articles and/or jobs by semantic similarity to a search query.
+    
+    The query is encoded once (repeated queries are served from an LRU of
+    query embeddings) and every requested index is searched with it. Results
+    are ranked by relevance and may include unpublished items; callers filter
+    those out when hydrating, so over-fetch accordingly.
+    
+    Meant for web requests: a missing index is queued for a build on a Celery
+    worker and has no results until then, and the query is not encoded at all
+    if every requested index is missing.
+    
+    Args:
+        query: Search text
+        model_types: Indexes to search ('article', 'job')
+        k: Results per index
+        min_score: Drop results less similar than this (SEMANTIC_SEARCH_MIN_SCORE if None)
+        
+    Returns:
+        dict: {model_type: list of (item_id, similarity_score), best first}
+    """
+    if min_score is None:
+        min_score = SEMANTIC_SEARCH_MIN_SCORE
+    
+    results = {model_type: [] for model_type in model_types}
+    if get_client() is None:
+        # The similarity service builds its own indexes; locally, skip the missing ones
+        model_types = [model_type for model_type in model_types if not get_index(model_type, build=False).is_empty()]
+    if not model_types:
+        return results
+    
+    query_embedding = encode_texts([query], cache=query_embedding_cache)
+    faiss.normalize_L2(query_embedding)
+    
+    for model_type in model_types:
+        scores, item_ids = search_faiss_index(
+            query_embedding, k, lookback_days=None, model_type=model_type, build_missing=False
+        )
+        results[model_type] = [
+            (int(item_id), float(score))
+            for item_id, score in zip(item_ids[0], scores[0])
+            if item_id >= 0 and score >= min_score
+        ]
+    return results
+
+
 def check_duplicate(article_text=None, job_text=None, threshold=None, lookback_days=None, model_type='article'):
     """
     Check if an article or job text is a duplicate of existing items.
@@ -427,170 +898,328 @@ def check_duplicate(article_text=None, job_text=None, threshold=None, lookback_d
             'similar_item_title': str or None
         }
     """
+    if model_type not in ('article', 'job'):
+        raise ValueError(f"Invalid model_type: {model_type}. Must be 'article' or 'job'")
+    
+    text = article_text if model_type == 'article' else job_text
+    return check_duplicates_batch([text], threshold=threshold, lookback_days=lookback_days, model_type=model_type)[0]
+
+
+def candidate_text(value, model_type):
+    """Text to embed for a duplicate-check candidate given as a string or dict."""
+    if not isinstance(value, dict):
+        return value
+    if model_type == 'article':
+        return f"{value.get('title', '')}\n\n{value.get('excerpt', '')}\n\n{value.get('content', '')}"
+    return f"{value.get('role', '')}\n\n{value.get('description', '')}"
+
+
+def _duplicate_result(model_type, score=0.0, item_id=None, item=None, title=None, batch_duplicate_of=None):
+    is_duplicate = item_id is not None or batch_duplicate_of is not None
+    result = {
+        'is_duplicate': is_duplicate,
+        'similarity_score': score if is_duplicate else 0.0,
+        'similar_item_id': item_id,
+        'similar_item': item,
+        'similar_item_title': title,
+        'batch_duplicate_of': batch_duplicate_of,
+    }
+    if model_type == 'article':
+        result.update(similar_article_id=item_id, similar_article=item, similar_article_title=title)
+    else:
+        result.update(similar_job_id=item_id, similar_job=item, similar_job_role=title)
+    return result
+
+
+def check_duplicates_batch(texts, threshold=None, lookback_days=None, model_type='article'):
+    """
+    Check many candidate articles or jobs for duplicates in one pass.
+    
+    All candidates are encoded in one batch and searched with a single
+    multi-row FAISS query, and matched items are fetched with one in_bulk
+    query. Candidates are also compared with each other: a candidate that
+    matches an earlier, non-duplicate candidate in the same batch is reported
+    as a duplicate of it, just as if the batch had been saved one by one.
+    
+    Args:
+        texts: List of strings or dicts (title/excerpt/content for articles,
+               role/description for jobs)
+        threshold: Similarity threshold (0-1), uses env variable if None
+        lookback_days: Number of days to look back. If None, uses default_lookback_days
+                      for articles and every open job for jobs.
+                      Set to 0 or False to search all items.
+        model_type: 'article' or 'job'
+        
+    Returns:
+        list: One check_duplicate result dict per text, in order. Each also has
+              'batch_duplicate_of', the position of the earlier candidate it
+              duplicates (similar_item is None in that case), or None.
+    """
     if threshold is None:
         threshold = similarity_threshold
     
-    if model_type == 'article':
-        # Handle dict input for articles
-        if isinstance(article_text, dict):
-            article_text = f"{article_text.get('title', '')}\n\n{article_text.get('excerpt', '')}\n\n{article_text.get('content', '')}"
-        
-        if not article_text:
-            return {
-                'is_duplicate': False,
-                'similarity_score': 0.0,
-                'similar_item_id': None,
-                'similar_item': None,
-                'similar_item_title': None
-            }
-        
-        similar_articles = find_similar_articles(article_text, top_k=1, threshold=threshold, lookback_days=lookback_days)
-        
-        if similar_articles:
-            article_id, similarity_score = similar_articles[0]
-            similar_article = Article.objects.get(id=article_id)
-            
-            return {
-                'is_duplicate': True,
-                'similarity_score': similarity_score,
-                'similar_item_id': article_id,
-                'similar_article_id': article_id,
-                'similar_item': similar_article,
-                'similar_article': similar_article,
-                'similar_item_title': similar_article.title,
-                'similar_article_title': similar_article.title
-            }
-        
-        return {
-            'is_duplicate': False,
-            'similarity_score': 0.0,
-            'similar_item_id': None,
-            'similar_article_id': None,
-            'similar_item': None,
-            'similar_article': None,
-            'similar_item_title': None,
-            'similar_article_title': None
-        }
+    if lookback_days is None and model_type == 'article':
+        lookback_days = default_lookback_days
+    elif lookback_days == 0 or lookback_days is False:
+        lookback_days = None  # Search all items (for jobs: every open job)
     
+    if model_type == 'article':
+        item_model, embedding_model, title_field = Article, ArticleEmbedding, 'title'
     elif model_type == 'job':
-        # Handle dict or string input for jobs
-        if isinstance(job_text, dict):
-            job_text = f"{job_text.get('role', '')}\n\n{job_text.get('description', '')}"
-        
-        if not job_text:
-            return {
-                'is_duplicate': False,
-                'similarity_score': 0.0,
-                'similar_item_id': None,
-                'similar_item': None,
-                'similar_item_title': None
-            }
-        
-        # Check if there are any jobs to compare against
-        if not Job.objects.exists():
-            print("No existing jobs to check for duplicates")
-            return {
-                'is_duplicate': False,
-                'similarity_score': 0.0,
-                'similar_item_id': None,
-                'similar_job_id': None,
-                'similar_item': None,
-                'similar_job': None,
-                'similar_item_title': None,
-                'similar_job_role': None
-            }
-        
-        similar_jobs = find_similar_jobs(job_text, top_k=1, threshold=threshold, lookback_days=lookback_days)
-        
-        if similar_jobs:
-            job_id, similarity_score = similar_jobs[0]
-            similar_job = Job.objects.get(id=job_id)
-            
-            return {
-                'is_duplicate': True,
-                'similarity_score': similarity_score,
-                'similar_item_id': job_id,
-                'similar_job_id': job_id,
-                'similar_item': similar_job,
-                'similar_job': similar_job,
-                'similar_item_title': similar_job.role,
-                'similar_job_role': similar_job.role
-            }
-        
-        return {
-            'is_duplicate': False,
-            'similarity_score': 0.0,
-            'similar_item_id': None,
-            'similar_job_id': None,
-            'similar_item': None,
-            'similar_job': None,
-            'similar_item_title': None,
-            'similar_job_role': None
-        }
-    
+        item_model, embedding_model, title_field = Job, JobEmbedding, 'role'
     else:
         raise ValueError(f"Invalid model_type: {model_type}. Must be 'article' or 'job'")
+    
+    candidates = [candidate_text(value, model_type) for value in texts]
+    positions = [position for position, text in enumerate(candidates) if text]
+    results = [_duplicate_result(model_type) for _ in candidates]
+    
+    if not positions:
+        return results
+    
+    queries = encode_texts([candidates[position] for position in positions])
+    faiss.normalize_L2(queries)
+    
+    scores, item_ids = search_faiss_index(queries, k=1, lookback_days=lookback_days, model_type=model_type)
+    scores, item_ids = scores[:, 0], item_ids[:, 0]
+    
+    matched = (item_ids >= 0) & (scores >= threshold)
+    items = item_model.objects.in_bulk([int(item_id) for item_id in item_ids[matched]])
+    
+    # Pairwise similarities within the batch
+    batch_scores = queries @ queries.T
+    kept = []
+    
+    for row, position in enumerate(positions):
+        item = items.get(int(item_ids[row])) if matched[row] else None
+        if item is not None:
+            results[position] = _duplicate_result(
+                model_type, float(scores[row]), item.id, item, getattr(item, title_field)
+            )
+            continue
+        
+        # Only candidates that would have been saved can be duplicated
+        if kept:
+            best = kept[int(np.argmax(batch_scores[row, kept]))]
+            if batch_scores[row, best] >= threshold:
+                original = texts[positions[best]]
+                title = original.get(title_field) if isinstance(original, dict) else None
+                results[position] = _duplicate_result(
+                    model_type, float(batch_scores[row, best]), title=title, batch_duplicate_of=positions[best]
+                )
+                continue
+        
+        kept.append(row)
+    
+    return results
 
 
-def rebuild_index():
+def check_duplicates_or_fallback(texts, threshold=None, lookback_days=None, model_type='article'):
+    """
+    check_duplicates_batch that never raises, for callers that must save what they have.
+    
+    If the batch check fails, every text is checked on its own (without the
+    within-batch comparison); a text whose own check also fails is reported as
+    not a duplicate, so it gets saved rather than lost.
+    
+    Returns:
+        list: One check_duplicate result dict per text, in order
+    """
+    try:
+        return check_duplicates_batch(texts, threshold=threshold, lookback_days=lookback_days, model_type=model_type)
+    except Exception as e:
+        print(f"Batch duplicate check failed, checking {len(texts)} {model_type}s one by one: {str(e)}")
+    
+    results = []
+    for text in texts:
+        try:
+            results.extend(check_duplicates_batch([text], threshold=threshold, lookback_days=lookback_days,
+                                                  model_type=model_type))
+        except Exception as e:
+            print(f"Duplicate check failed, treating {model_type} as new: {str(e)}")
+            results.append(_duplicate_result(model_type))
+    return results
+
+
+def rebuild_index(model_type='article', model_name=None):
     """
     Rebuild the entire FAISS index from scratch.
     
+    Args:
+        model_type: 'article' or 'job'
+        model_name: Embedding model, or None for the active one
+    
     Returns:
-        tuple: (faiss.Index, list of article IDs)
+        faiss.IndexIDMap2: Index keyed by Article/Job primary key
     """
-    print("Rebuilding FAISS index from scratch...")
+    print(f"Rebuilding FAISS {model_type} index from scratch...")
     
-    # Clear cache
-    cache.delete(FAISS_INDEX_CACHE_KEY)
-    cache.delete(FAISS_ARTICLE_IDS_CACHE_KEY)
+    # Daily shards are rebuilt lazily by the next lookback query
+    for _, name in list_shards(model_type, model_name):
+        get_store(name, model_name).delete()
     
-    # Rebuild with all articles
-    return build_faiss_index(lookback_days=None)
+    # Rebuild with all items; saving publishes a new generation
+    return build_faiss_index(lookback_days=None, model_type=model_type, model_name=model_name)
 
 
-def encode_all_articles():
+def backfill_embeddings(model_type='article', reembed=False, processes=None, model_name=None):
     """
-    Encode all articles that don't have embeddings yet.
+    Encode and store embeddings in large batches.
+    
+    Items are streamed from the database in chunks of EMBEDDING_BACKFILL_CHUNK_SIZE.
+    Each chunk is encoded with batched forward passes (optionally spread over a
+    multi-process pool) and written with a single bulk upsert, then the index is
+    rebuilt once at the end.
     
+    Args:
+        model_type: 'article' or 'job'
+        reembed: If True, re-encode every item; otherwise only items without an
+                 embedding from this model are encoded.
+        processes: Number of encoder worker processes. None or 1 encodes in
+                   this process; 0 uses one worker per CPU core.
+        model_name: Embedding model to encode with, or None for the active one.
+                    Another model's rows and index are written next to the
+                    active ones without affecting them (see model_migration).
+        
     Returns:
-        int: Number of articles encoded
+        int: Number of items encoded
     """
-    # Get articles without embeddings
-    articles_without_embeddings = Article.objects.exclude(
-        id__in=ArticleEmbedding.objects.values_list('article_id', flat=True)
-    )
+    if model_type == 'article':
+        item_model, embedding_model, relation = Article, ArticleEmbedding, 'article'
+        text_fields, to_text = ('title', 'excerpt', 'content'), article_text
+    elif model_type == 'job':
+        item_model, embedding_model, relation = Job, JobEmbedding, 'job'
+        text_fields, to_text = ('role', 'description'), job_text
+    else:
+        raise ValueError(f"Invalid model_type: {model_type}. Must be 'article' or 'job'")
     
-    count = 0
-    total = articles_without_embeddings.count()
+    model_name = model_name or active_model()
     
+    items = item_model.objects.only('id', *text_fields).order_by('id')
+    if not reembed:
+        items = items.exclude(**{f'{embedding_model._meta.model_name}__model_name': model_name})
+    
+    total = items.count()
     if total == 0:
-        print("All articles already have embeddings")
+        print(f"All {model_type}s already have {model_name} embeddings")
         return 0
     
-    print(f"Encoding {total} articles...")
+    encoder = get_model() if model_name == active_model() else load_encoder(model_name=model_name)
     
-    for article in articles_without_embeddings:
-        try:
-            encode_article(article)
-            count += 1
-            if count % 10 == 0:
-                print(f"Encoded {count}/{total} articles")
-        except Exception as e:
-            print(f"Error encoding article {article.id}: {str(e)}")
+    pool = None
+    if processes is not None and processes != 1:
+        pool = encoder.start_multi_process_pool(['cpu'] * (processes or os.cpu_count()))
     
-    print(f"Finished encoding {count} articles")
+    print(f"Encoding {total} {model_type}s with {model_name}...")
     
-    # Rebuild index with new embeddings
-    rebuild_index()
+    count = 0
+    last_id = 0
+    try:
+        while True:
+            # Keyset pagination keeps each chunk query cheap and stable while rows are written
+            chunk = list(items.filter(id__gt=last_id)[:EMBEDDING_BACKFILL_CHUNK_SIZE])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            
+            try:
+                embeddings = _encode_uncached([to_text(item) for item in chunk], pool=pool, encoder=encoder)
+                embedding_model.objects.bulk_create(
+                    [
+                        embedding_model(**{relation: item}, model_name=model_name, **embedding_fields(embedding))
+                        for item, embedding in zip(chunk, embeddings)
+                    ],
+                    update_conflicts=True,
+                    unique_fields=[relation, 'model_name'],
+                    update_fields=['embedding_vector', 'embedding_format', 'dimension'],
+                )
+                count += len(chunk)
+                print(f"Encoded {count}/{total} {model_type}s")
+            except Exception as e:
+                print(f"Error encoding {model_type}s {chunk[0].id}-{last_id}: {str(e)}")
+    finally:
+        if pool is not None:
+            encoder.stop_multi_process_pool(pool)
+    
+    print(f"Finished encoding {count} {model_type}s")
+    
+    # Rebuild index once with all new embeddings
+    rebuild_index(model_type=model_type, model_name=model_name)
     
     return count
 
 
+def encode_all_articles(reembed=False, processes=None):
+    """
+    Encode all articles that don't have embeddings yet.
+    
+    Args:
+        reembed: If True, re-encode every article
+        processes: Number of encoder worker processes (see backfill_embeddings)
+    
+    Returns:
+        int: Number of articles encoded
+    """
+    return backfill_embeddings('article', reembed=reembed, processes=processes)
+
+
+def encode_all_jobs(reembed=False, processes=None):
+    """
+    Encode all jobs that don't have embeddings yet.
+    
+    Args:
+        reembed: If True, re-encode every job
+        processes: Number of encoder worker processes (see backfill_embeddings)
+    
+    Returns:
+        int: Number of jobs encoded
+    """
+    return backfill_embeddings('job', reembed=reembed, processes=processes)
+
+
+def evict_closed_jobs():
+    """
+    Remove archived jobs, jobs past their deadline and deleted jobs from the job index.
+    
+    Only IDs currently in the index are checked, so the sweep stays cheap as
+    closed jobs accumulate in the database. Each store gets a single delete
+    segment; daily shards that were already dropped are not recreated.
+    
+    Returns:
+        int: Number of jobs evicted
+    """
+    store = get_index('job')
+    indexed_ids = store.ids().tolist()
+    if not indexed_ids:
+        return 0
+    
+    open_ids = set(Job.objects.filter(open_jobs_q(), id__in=indexed_ids).values_list('id', flat=True))
+    closed_ids = [job_id for job_id in indexed_ids if job_id not in open_ids]
+    if not closed_ids:
+        return 0
+    
+    store.remove(closed_ids)
+    
+    # Deleted jobs have no creation date; their shards age out with the retention sweep
+    by_shard = {}
+    for job_id, created_at in Job.objects.filter(id__in=closed_ids).values_list('id', 'created_at'):
+        by_shard.setdefault(shard_name('job', timezone.localdate(created_at)), []).append(job_id)
+    
+    existing = set(list_stores())
+    for name, job_ids in by_shard.items():
+        if name in existing:
+            get_store(name).remove(job_ids)
+    
+    print(f"Evicted {len(closed_ids)} closed jobs from FAISS index")
+    return len(closed_ids)
+
+
 def remove_article_from_index(article_id):
     """
     Remove an article from the FAISS index.
-    Note: FAISS doesn't support efficient deletion, so this rebuilds the index.
+    
+    The deletion is recorded as a delta segment that hides the article from
+    searches immediately; compaction applies it to the base with remove_ids.
     
     Args:
         article_id: ID of article to remove
@@ -599,11 +1228,13 @@ def remove_article_from_index(article_id):
         bool: Success status
     """
     try:
+        created_at = Article.objects.filter(id=article_id).values_list('created_at', flat=True).first()
+        
         # Delete the embedding
         ArticleEmbedding.objects.filter(article_id=article_id).delete()
         
-        # Rebuild index
-        rebuild_index()
+        # Record the deletion against the full index and the article's shard
+        _remove_from_index('article', article_id, created_at=created_at)
         
         print(f"Removed article {article_id} from index")
         return True
@@ -620,23 +1251,130 @@ def get_index_stats():
     Returns:
         dict: Index statistics
     """
-    index, article_ids = load_faiss_index()
+    store = get_store('article')
+    snapshot = store.snapshot()
+    job_store = get_store('job')
     
     total_articles = Article.objects.count()
-    indexed_articles = len(article_ids) if article_ids else 0
-    articles_with_embeddings = ArticleEmbedding.objects.count()
+    indexed_articles = store.ntotal()
+    articles_with_embeddings = ArticleEmbedding.objects.filter(model_name=active_model()).count()
     
     return {
         'total_articles': total_articles,
         'indexed_articles': indexed_articles,
         'articles_with_embeddings': articles_with_embeddings,
         'unindexed_articles': total_articles - indexed_articles,
-        'index_dimension': index.d if index else 0,
+        'index_dimension': snapshot.base.d if snapshot.base is not None else 0,
+        'index_generation': snapshot.generation,
+        'pending_segments': len(snapshot.segments),
+        'index_type': index_type_of(snapshot.base) if snapshot.base is not None else None,
+        'model': active_model(),
+        'embedding_storage': EMBEDDING_STORAGE,
+        'indexed_open_jobs': job_store.ntotal(),
         'similarity_threshold': similarity_threshold
     }
 
 
 
+# (storage format, index type) pairs compared against the float32 flat baseline
+QUANTIZATION_CONFIGS = [
+    ('float16', 'flat'),
+    ('int8', 'flat'),
+    ('float32', 'fp16'),
+    ('float32', 'sq8'),
+    ('float32', 'pq'),
+    ('int8', 'sq8'),
+]
+
+
+def compare_quantization(model_type='article', sample_size=1000, threshold=None, configs=None):
+    """
+    Report duplicate-detection precision of compressed storage/index types relative to float32.
+    
+    Every stored embedding is round-tripped through each storage format and
+    indexed with each index type. A sample of the embeddings is then run as
+    duplicate checks (nearest other item, excluding itself) against both the
+    exact float32 flat index and the compressed one; the float32 decisions are
+    treated as ground truth.
+    
+    Args:
+        model_type: 'article' or 'job'
+        sample_size: Number of items used as queries
+        threshold: Similarity threshold, defaults to SIMILARITY_THRESHOLD
+        configs: (storage, index_type) pairs, defaults to QUANTIZATION_CONFIGS
+        
+    Returns:
+        list: One dict per config with precision, recall, top-1 agreement, the
+              mean absolute score error and bytes per vector in the DB and index
+    """
+    if threshold is None:
+        threshold = similarity_threshold
+    
+    if model_type == 'article':
+        embeddings_query, id_field = ArticleEmbedding.objects.filter(model_name=active_model()), 'article_id'
+    elif model_type == 'job':
+        embeddings_query, id_field = JobEmbedding.objects.filter(model_name=active_model()), 'job_id'
+    else:
+        raise ValueError(f"Invalid model_type: {model_type}. Must be 'article' or 'job'")
+    
+    item_ids, matrix = load_embedding_matrix(embeddings_query, id_field)
+    if len(item_ids) < 2:
+        print(f"Not enough {model_type} embeddings to compare")
+        return []
+    
+    faiss.normalize_L2(matrix)
+    dimension = matrix.shape[1]
+    
+    sample = np.random.default_rng(0).choice(len(item_ids), min(sample_size, len(item_ids)), replace=False)
+    queries, query_ids = matrix[sample], item_ids[sample]
+    
+    def nearest_other(index):
+        # Top-2 so the query item itself can be skipped
+        scores, ids = index.search(queries, 2)
+        self_first = ids[:, 0] == query_ids
+        rows = np.arange(len(queries))
+        return ids[rows, self_first.astype(int)], scores[rows, self_first.astype(int)]
+    
+    baseline = new_index(dimension)
+    baseline.add_with_ids(matrix, item_ids)
+    baseline_ids, baseline_scores = nearest_other(baseline)
+    baseline_duplicates = baseline_scores >= threshold
+    
+    results = []
+    for storage, index_type in configs or QUANTIZATION_CONFIGS:
+        stored = np.ascontiguousarray(roundtrip(matrix, storage))
+        faiss.normalize_L2(stored)
+        index = new_index(dimension, index_type, training_vectors=stored)
+        index.add_with_ids(stored, item_ids)
+        
+        ids, scores = nearest_other(index)
+        duplicates = scores >= threshold
+        true_positives = int(np.count_nonzero(duplicates & baseline_duplicates & (ids == baseline_ids)))
+        
+        result = {
+            'storage': storage,
+            'index_type': index_type_of(index),
+            'precision': true_positives / max(int(duplicates.sum()), 1),
+            'recall': true_positives / max(int(baseline_duplicates.sum()), 1),
+            'top1_agreement': float(np.mean(ids == baseline_ids)),
+            'mean_score_error': float(np.mean(np.abs(scores - baseline_scores))),
+            'db_bytes_per_vector': bytes_per_vector(dimension, storage),
+            'index_bytes_per_vector': index.index.sa_code_size(),
+        }
+        results.append(result)
+    
+    print(f"Duplicate detection vs float32 ({len(queries)} {model_type}s, threshold {threshold}, "
+          f"{int(baseline_duplicates.sum())} baseline duplicates, {4 * dimension} bytes per float32 vector):")
+    for result in results:
+        print(f"  {result['storage']:>7} / {result['index_type']:<4}  "
+              f"precision {result['precision']:.3f}  recall {result['recall']:.3f}  "
+              f"top-1 {result['top1_agreement']:.3f}  score error {result['mean_score_error']:.4f}  "
+              f"db {result['db_bytes_per_vector']} B  index {result['index_bytes_per_vector']} B")
+    
+    return results
+
+
+
 if __name__=='__main__':
     # Example usage: encode all articles and build index
     # encode_all_articles()
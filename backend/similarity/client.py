@@ -0,0 +1,139 @@
+"""
+Client for the similarity sidecar service (similarity/service.py).
+
+When SIMILARITY_SERVICE_URL is set, similarity.checker sends encoding and index
+searches to the service instead of loading the encoder and mapping the indexes
+in every process. The URL is either a Unix socket ('unix:///run/sentinel/similarity.sock')
+or HTTP ('http://127.0.0.1:8765').
+"""
+import base64
+import http.client
+import json
+import os
+import socket
+from urllib.parse import urlparse
+
+import numpy as np
+
+
+SIMILARITY_SERVICE_URL = os.getenv("SIMILARITY_SERVICE_URL", "")
+SIMILARITY_SERVICE_TIMEOUT = float(os.getenv("SIMILARITY_SERVICE_TIMEOUT", "30"))
+
+
+class SimilarityServiceError(Exception):
+    """The similarity service returned an error response."""
+
+
+def pack_array(array, dtype=np.float32):
+    """Encode a numpy array for a JSON payload."""
+    array = np.ascontiguousarray(array, dtype=dtype)
+    return {
+        "dtype": np.dtype(dtype).name,
+        "shape": list(array.shape),
+        "data": base64.b64encode(array.tobytes()).decode("ascii"),
+    }
+
+
+def unpack_array(payload):
+    """Decode an array packed with pack_array."""
+    data = base64.b64decode(payload["data"])
+    return np.frombuffer(data, dtype=payload["dtype"]).reshape(payload["shape"]).copy()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket."""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class SimilarityClient:
+    """Thin RPC client; every method maps to one service endpoint."""
+
+    def __init__(self, url=None, timeout=SIMILARITY_SERVICE_TIMEOUT):
+        self.url = urlparse(url or SIMILARITY_SERVICE_URL)
+        self.timeout = timeout
+
+    def _connection(self):
+        if self.url.scheme == "unix":
+            return UnixHTTPConnection(self.url.path, timeout=self.timeout)
+        return http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=self.timeout)
+
+    def _call(self, endpoint, payload=None):
+        body = json.dumps(payload or {})
+        connection = self._connection()
+        try:
+            connection.request("POST", f"/{endpoint}", body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            data = json.loads(response.read() or b"{}")
+        finally:
+            connection.close()
+
+        if response.status != 200:
+            raise SimilarityServiceError(f"{endpoint} failed ({response.status}): {data.get('error', '')}")
+        return data
+
+    def health(self):
+        """Return the service status (loaded model, open indexes)."""
+        return self._call("health")
+
+    def encode(self, texts):
+        """
+        Encode texts with the service's encoder.
+
+        Returns:
+            numpy.ndarray: float32 matrix of normalized embeddings
+        """
+        return unpack_array(self._call("encode", {"texts": list(texts)})["embeddings"])
+
+    def search(self, query_embeddings, k, lookback_days=None, model_type="article"):
+        """
+        Search the service's indexes (see checker.search_faiss_index).
+
+        Returns:
+            tuple: (similarities, item IDs), each of shape (n, k)
+        """
+        data = self._call("search", {
+            "embeddings": pack_array(query_embeddings),
+            "k": k,
+            "lookback_days": lookback_days,
+            "model_type": model_type,
+        })
+        return unpack_array(data["scores"]), unpack_array(data["ids"])
+
+    def add(self, model_type, item_id, created_at, embedding):
+        """Upsert an item's embedding into the full index and its daily shard."""
+        self._call("add", {
+            "model_type": model_type,
+            "id": item_id,
+            "created_at": created_at.isoformat(),
+            "embedding": pack_array(embedding),
+        })
+
+    def remove(self, model_type, item_id, created_at=None):
+        """Delete an item from the full index and its daily shard (every shard if created_at is None)."""
+        self._call("remove", {
+            "model_type": model_type,
+            "id": item_id,
+            "created_at": created_at.isoformat() if created_at is not None else None,
+        })
+
+
+_client = None
+
+
+def get_client():
+    """Return the shared client, or None when no service is configured."""
+    global _client
+    if not SIMILARITY_SERVICE_URL:
+        return None
+    if _client is None:
+        _client = SimilarityClient()
+    return _client
@@ -0,0 +1,110 @@
+"""
+Content-hash embedding cache.
+
+Embeddings are keyed by a hash of the encoder name and the whitespace-normalized
+text, so the same document is only encoded once no matter how many code paths
+(duplicate check, persistence, similarity search) ask for it. Entries live in a
+per-process LRU and, optionally, in the Django cache so they survive restarts
+and are shared between workers.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.core.cache import cache
+
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+EMBEDDING_CACHE_PERSIST = os.getenv("EMBEDDING_CACHE_PERSIST", "false").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_TIMEOUT = int(os.getenv("EMBEDDING_CACHE_TIMEOUT", str(60 * 60 * 24)))
+
+# Search queries get their own LRU so bulk article encoding never evicts popular queries
+SEARCH_QUERY_CACHE_SIZE = int(os.getenv("SEARCH_QUERY_CACHE_SIZE", "4096"))
+
+CACHE_KEY_PREFIX = "embedding"
+
+
+def normalize_text(text):
+    """Collapse runs of whitespace so formatting differences don't miss the cache."""
+    return " ".join(text.split())
+
+
+def cache_key(text, model_name):
+    """Cache key for a text embedded with a given encoder."""
+    digest = hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+    return f"{CACHE_KEY_PREFIX}:{digest}"
+
+
+class EmbeddingCache:
+    """In-process LRU of embeddings with an optional Django cache behind it."""
+
+    def __init__(self, max_entries=EMBEDDING_CACHE_SIZE, persist=EMBEDDING_CACHE_PERSIST, timeout=EMBEDDING_CACHE_TIMEOUT):
+        self.max_entries = max_entries
+        self.persist = persist
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        """
+        Look up embeddings by key.
+
+        Returns:
+            dict: {key: numpy.ndarray} for every key found
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                embedding = self._entries.get(key)
+                if embedding is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = embedding
+
+        missing = [key for key in keys if key not in found]
+        if missing and self.persist:
+            for key, value in cache.get_many(missing).items():
+                embedding = np.frombuffer(value, dtype=np.float32)
+                found[key] = embedding
+                self._remember(key, embedding)
+
+        self.hits += len(found)
+        self.misses += len(set(keys)) - len(found)
+        return found
+
+    def set_many(self, embeddings):
+        """
+        Store embeddings.
+
+        Args:
+            embeddings: {key: numpy.ndarray}
+        """
+        for key, embedding in embeddings.items():
+            self._remember(key, embedding)
+
+        if self.persist and embeddings:
+            cache.set_many(
+                {key: np.asarray(embedding, dtype=np.float32).tobytes() for key, embedding in embeddings.items()},
+                timeout=self.timeout,
+            )
+
+    def _remember(self, key, embedding):
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+embedding_cache = EmbeddingCache()
+
+query_embedding_cache = EmbeddingCache(max_entries=SEARCH_QUERY_CACHE_SIZE)
@@ -0,0 +1,107 @@
+"""
+Parity and throughput check for the sentence encoder backends.
+
+Encodes a sample of stored articles with the reference PyTorch encoder on the
+full untruncated text (how embeddings were produced before), then with the
+candidate backend through the same pre-truncation encode path uses. Reports
+the cosine similarity between the two vectors of each text and texts/second
+for both, and exits non-zero if any text falls below --min-cosine, so it can
+gate switching FAISS_ENCODER_BACKEND on an ingest box.
+
+Usage:
+    python similarity/encoder_benchmark.py
+    python similarity/encoder_benchmark.py --backend onnx --file onnx/model_qint8_avx512_vnni.onnx --sample 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import django
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from articles.models import Article
+from similarity import checker
+from similarity.active_model import active_model
+
+
+def sample_texts(sample_size):
+    """Newest article texts; long bodies are what truncation and int8 affect most."""
+    articles = Article.objects.order_by('-created_at').only('title', 'excerpt', 'content')[:sample_size]
+    return [checker.article_text(article) for article in articles]
+
+
+def timed_encode(encoder, texts, batch_size):
+    """Return (embeddings, texts per second)."""
+    # One small batch first so lazy initialization is not timed
+    encoder.encode(texts[:batch_size], batch_size=batch_size, normalize_embeddings=True)
+    start = time.perf_counter()
+    embeddings = encoder.encode(texts, batch_size=batch_size, convert_to_tensor=False, normalize_embeddings=True)
+    return np.asarray(embeddings, dtype=np.float32), len(texts) / (time.perf_counter() - start)
+
+
+def compare_encoders(reference, candidate, texts, batch_size):
+    """
+    Encode texts with the reference on the full text and the candidate on the pre-truncated text.
+
+    Returns:
+        tuple: (cosine similarity per text, reference texts/second, candidate texts/second)
+    """
+    expected, reference_rate = timed_encode(reference, texts, batch_size)
+    truncated = checker.truncate_for_encoder(texts, candidate.max_seq_length)
+    found, candidate_rate = timed_encode(candidate, truncated, batch_size)
+    return np.einsum("ij,ij->i", expected, found), reference_rate, candidate_rate
+
+
+def run(backend, model_file, sample_size, batch_size):
+    """
+    Compare a backend against the PyTorch reference.
+
+    Returns:
+        dict: Cosine similarity summary and throughput of both encoders
+    """
+    texts = sample_texts(sample_size)
+    if not texts:
+        raise SystemExit("No articles to benchmark with")
+    print(f"Encoding {len(texts)} articles with {active_model()}")
+
+    reference = checker.load_encoder("torch")
+    candidate = checker.load_encoder(backend, model_file)
+    cosines, reference_rate, candidate_rate = compare_encoders(reference, candidate, texts, batch_size)
+    print(f"  torch (full text)     {reference_rate:8.1f} texts/s")
+    label = f"{backend} {os.path.basename(model_file) if model_file else ''}".strip()
+    print(f"  {label:<21} {candidate_rate:8.1f} texts/s  ({candidate_rate / reference_rate:.2f}x)")
+
+    result = {
+        "texts": len(texts),
+        "min_cosine": float(cosines.min()),
+        "p1_cosine": float(np.percentile(cosines, 1)),
+        "mean_cosine": float(cosines.mean()),
+        "reference_rate": reference_rate,
+        "candidate_rate": candidate_rate,
+    }
+    print(f"  cosine vs reference   min {result['min_cosine']:.4f}  p1 {result['p1_cosine']:.4f}  "
+          f"mean {result['mean_cosine']:.4f}")
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default=checker.FAISS_ENCODER_BACKEND, choices=checker.ENCODER_BACKENDS)
+    parser.add_argument("--file", default=checker.FAISS_ENCODER_FILE, help="model file within the model repo")
+    parser.add_argument("--sample", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=checker.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    result = run(args.backend, args.file, args.sample, args.batch_size)
+    if result["min_cosine"] < args.min_cosine:
+        print(f"FAIL: some embeddings differ from the reference (cosine < {args.min_cosine})")
+        sys.exit(1)
+    print("OK")
@@ -0,0 +1,341 @@
+"""
+Offline duplicate-detection evaluation.
+
+Runs labelled pairs of texts through the same encode -> index -> nearest
+neighbour -> threshold decision as check_duplicate, for every combination of
+storage format, index type and similarity threshold, and reports precision,
+recall and F1 against the labels together with encode and search throughput.
+Use it before changing SIMILARITY_THRESHOLD, SIMILARITY_LOOKBACK_DAYS,
+EMBEDDING_STORAGE, FAISS_*_INDEX_TYPE or SIMHASH_MAX_DISTANCE: a faster
+setting is only safe if its recall matches the exact float32 flat baseline.
+
+Pairs file (JSON lines), one labelled pair per line:
+
+    {"a": "...", "b": "...", "duplicate": true, "days_apart": 1}
+
+`a` is checked against an index holding every `b` (plus the optional --corpus
+distractors, which must not contain other copies of the pairs' stories); a
+pair is predicted duplicate when the nearest indexed text scores at least the
+threshold. `a`/`b` may be strings or title/excerpt/content dicts.
+`days_apart` (optional) is used to report how many duplicates each lookback
+window would miss, and `a_source`/`b_source` (optional, scraped page text)
+are used for the SimHash prefilter instead of `a`/`b`.
+
+Nothing is read from the database or the network: the model must already be
+in the local Hugging Face cache (or FAISS_MODEL/--model be a local path).
+similarity/fixtures/dedupe_pairs.jsonl is a small example; a real labelled
+export gives meaningful numbers.
+
+Usage:
+    python similarity/evaluate.py
+    python similarity/evaluate.py --pairs labelled.jsonl --corpus articles.jsonl --configs float32/flat float32/hnsw int8/sq8
+    python similarity/evaluate.py --pairs labelled.jsonl --min-recall 0.95 --json results.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Never download a model during an evaluation run
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+import faiss
+import numpy as np
+import django
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from similarity import checker, lexical
+from similarity.active_model import active_model
+from similarity.benchmark import time_queries
+from similarity.encoder_benchmark import timed_encode
+from similarity.index_store import INDEX_TYPES, index_type_of, new_index
+from similarity.quantization import EMBEDDING_STORAGE, STORAGE_FORMATS, roundtrip
+
+
+DEFAULT_PAIRS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "dedupe_pairs.jsonl")
+
+DEFAULT_THRESHOLDS = [0.70, 0.75, 0.80, 0.825, 0.85, 0.875, 0.90, 0.95]
+
+DEFAULT_LOOKBACK_DAYS = [1, 2, 3, 5, 7]
+
+SIMHASH_DISTANCES = range(0, 13)
+
+# Exact float32 search, listed first as the reference for the faster configs
+BASELINE_CONFIG = ('float32', 'flat')
+
+
+def load_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_pairs(path):
+    """Labelled pairs with `a`/`b` converted to the text the encoder sees."""
+    pairs = []
+    for line_number, pair in enumerate(load_jsonl(path), start=1):
+        if not {"a", "b", "duplicate"} <= pair.keys():
+            raise SystemExit(f"{path}:{line_number}: a pair needs 'a', 'b' and 'duplicate'")
+        pairs.append({
+            **pair,
+            "a": checker.candidate_text(pair["a"], 'article'),
+            "b": checker.candidate_text(pair["b"], 'article'),
+        })
+    return pairs
+
+
+def load_corpus(path):
+    """Distractor texts: JSON strings or title/excerpt/content dicts, one per line."""
+    if not path:
+        return []
+    return [checker.candidate_text(item, 'article') for item in load_jsonl(path)]
+
+
+def parse_config(value):
+    storage, _, index_type = value.partition("/")
+    if storage not in STORAGE_FORMATS or index_type not in INDEX_TYPES:
+        raise argparse.ArgumentTypeError(
+            f"{value}: expected STORAGE/INDEX_TYPE with storage in {', '.join(STORAGE_FORMATS)} "
+            f"and index type in {', '.join(INDEX_TYPES)}"
+        )
+    return storage, index_type
+
+
+def default_configs():
+    configs = [BASELINE_CONFIG, ('float32', 'hnsw'), ('float32', 'ivf')] + checker.QUANTIZATION_CONFIGS
+    production = (EMBEDDING_STORAGE, checker.INDEX_TYPES_BY_MODEL['article'])
+    if production not in configs:
+        configs.append(production)
+    return configs
+
+
+def scores_by_threshold(labels, flagged_scores, thresholds):
+    """
+    Precision/recall/F1 of the duplicate decision at each threshold.
+
+    Args:
+        labels: bool array, True for duplicate pairs
+        flagged_scores: Score of each `a`'s nearest indexed text
+        thresholds: Thresholds to evaluate
+
+    Returns:
+        list: One dict per threshold
+    """
+    rows = []
+    for threshold in thresholds:
+        predicted = flagged_scores >= threshold
+        true_positives = int(np.count_nonzero(predicted & labels))
+        precision = true_positives / max(int(predicted.sum()), 1)
+        recall = true_positives / max(int(labels.sum()), 1)
+        rows.append({
+            'threshold': threshold,
+            'precision': precision,
+            'recall': recall,
+            'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            'false_duplicates': int(np.count_nonzero(predicted & ~labels)),
+            'missed_duplicates': int(np.count_nonzero(~predicted & labels)),
+        })
+    return rows
+
+
+def evaluate_config(storage, index_type, vectors, indexed_ids, query_vectors, query_ids, labels, thresholds):
+    """
+    Build one storage/index configuration and run every pair's duplicate check against it.
+
+    Returns:
+        dict: Actual index type (small corpora fall back to flat), build time,
+              search throughput, index bytes per vector and per-threshold scores
+    """
+    dimension = vectors.shape[1]
+    stored = np.ascontiguousarray(roundtrip(vectors, storage))
+    faiss.normalize_L2(stored)
+
+    start = time.perf_counter()
+    index = new_index(dimension, index_type, training_vectors=stored)
+    index.add_with_ids(stored, indexed_ids)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # Top-2 so a query text that is also indexed does not match itself
+    start = time.perf_counter()
+    scores, ids = index.search(query_vectors, 2)
+    batch_seconds = time.perf_counter() - start
+    self_first = ids[:, 0] == query_ids
+    rows = np.arange(len(query_ids))
+    nearest_scores = scores[rows, self_first.astype(int)]
+    nearest_scores[ids[rows, self_first.astype(int)] < 0] = -1.0
+
+    latencies = time_queries(index, query_vectors, 2)
+    return {
+        'storage': storage,
+        'index_type': index_type_of(index),
+        'requested_index_type': index_type,
+        'build_ms': build_ms,
+        'search_qps': len(query_ids) / max(batch_seconds, 1e-9),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        # Serialized size includes HNSW graphs and IVF lists, unlike the code size
+        'bytes_per_vector': faiss.serialize_index(index).size / max(index.ntotal, 1),
+        'thresholds': scores_by_threshold(labels, nearest_scores, thresholds),
+    }
+
+
+def evaluate_simhash(pairs, max_distances):
+    """
+    Precision/recall of the SimHash prefilter alone at each Hamming distance.
+
+    Pairs with a text under lexical.MIN_WORDS are never flagged, as in the pipeline.
+    """
+    labels = np.array([bool(pair['duplicate']) for pair in pairs])
+    distances = np.full(len(pairs), 65)
+    for row, pair in enumerate(pairs):
+        a = lexical.simhash(pair.get('a_source') or pair['a'])
+        b = lexical.simhash(pair.get('b_source') or pair['b'])
+        if a is not None and b is not None:
+            distances[row] = bin(a ^ b).count("1")
+
+    results = []
+    for max_distance in max_distances:
+        predicted = distances <= max_distance
+        true_positives = int(np.count_nonzero(predicted & labels))
+        results.append({
+            'max_distance': max_distance,
+            'precision': true_positives / max(int(predicted.sum()), 1),
+            'recall': true_positives / max(int(labels.sum()), 1),
+            'false_duplicates': int(np.count_nonzero(predicted & ~labels)),
+        })
+    return results
+
+
+def lookback_coverage(pairs, lookback_days):
+    """Fraction of labelled duplicates a lookback window can still find (needs `days_apart`)."""
+    days = [pair['days_apart'] for pair in pairs if pair['duplicate'] and pair.get('days_apart') is not None]
+    if not days:
+        return []
+    days = np.array(days)
+    return [{'lookback_days': window, 'coverage': float(np.mean(days <= window))} for window in lookback_days]
+
+
+def run(pairs_path, corpus_path=None, configs=None, thresholds=None, lookback_days=None,
+        model_name=None, backend=None, model_file=None, batch_size=checker.EMBEDDING_BATCH_SIZE):
+    """
+    Evaluate duplicate detection on a labelled pairs file.
+
+    Returns:
+        dict: Encoder throughput, one result per config, SimHash and lookback results
+    """
+    pairs = load_pairs(pairs_path)
+    if not pairs:
+        raise SystemExit(f"No pairs in {pairs_path}")
+    corpus = load_corpus(corpus_path)
+    thresholds = sorted(set(thresholds or DEFAULT_THRESHOLDS) | {checker.similarity_threshold})
+    labels = np.array([bool(pair['duplicate']) for pair in pairs])
+
+    # Each distinct text is encoded once and gets one ID
+    text_ids = {}
+    for text in [pair['a'] for pair in pairs] + [pair['b'] for pair in pairs] + corpus:
+        text_ids.setdefault(text, len(text_ids))
+    texts = list(text_ids)
+
+    model_name = model_name or active_model()
+    encoder = checker.load_encoder(backend, model_file, model_name=model_name)
+    truncated = checker.truncate_for_encoder(texts, encoder.max_seq_length)
+    embeddings, encode_rate = timed_encode(encoder, truncated, batch_size)
+    print(f"{len(pairs)} pairs ({int(labels.sum())} duplicates), {len(corpus)} corpus texts, "
+          f"{len(texts)} distinct texts encoded with {model_name} at {encode_rate:.1f} texts/s")
+
+    indexed_ids = np.array(sorted({text_ids[pair['b']] for pair in pairs} | {text_ids[text] for text in corpus}),
+                           dtype=np.int64)
+    query_ids = np.array([text_ids[pair['a']] for pair in pairs], dtype=np.int64)
+    vectors = np.ascontiguousarray(embeddings[indexed_ids])
+    query_vectors = np.ascontiguousarray(embeddings[query_ids])
+
+    results = []
+    for storage, index_type in configs or default_configs():
+        result = evaluate_config(storage, index_type, vectors, indexed_ids, query_vectors, query_ids, labels, thresholds)
+        results.append(result)
+
+        fallback = "" if result['index_type'] == index_type else f" (fell back from {index_type})"
+        print(f"\n{storage:>7} / {result['index_type']:<4}{fallback}  build {result['build_ms']:.1f} ms  "
+              f"{result['search_qps']:.0f} queries/s  p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms  "
+              f"{result['bytes_per_vector']:.0f} B/vector")
+        for row in result['thresholds']:
+            marker = "*" if row['threshold'] == checker.similarity_threshold else " "
+            print(f"  {marker}{row['threshold']:.3f}  precision {row['precision']:.3f}  recall {row['recall']:.3f}  "
+                  f"f1 {row['f1']:.3f}  false duplicates {row['false_duplicates']}  missed {row['missed_duplicates']}")
+
+    simhash = evaluate_simhash(pairs, SIMHASH_DISTANCES)
+    print("\nSimHash prefilter (source text):")
+    for row in simhash:
+        marker = "*" if row['max_distance'] == lexical.SIMHASH_MAX_DISTANCE else " "
+        print(f"  {marker}distance <= {row['max_distance']}  precision {row['precision']:.3f}  "
+              f"recall {row['recall']:.3f}  false duplicates {row['false_duplicates']}")
+
+    coverage = lookback_coverage(pairs, lookback_days or DEFAULT_LOOKBACK_DAYS)
+    if coverage:
+        print("\nDuplicates within the lookback window:")
+        for row in coverage:
+            marker = "*" if row['lookback_days'] == checker.default_lookback_days else " "
+            print(f"  {marker}{row['lookback_days']:>2} days  {row['coverage']:.3f}")
+
+    return {
+        'model': model_name,
+        'pairs': len(pairs),
+        'duplicates': int(labels.sum()),
+        'corpus': len(corpus),
+        'encode_rate': encode_rate,
+        'configs': results,
+        'simhash': simhash,
+        'lookback': coverage,
+    }
+
+
+def production_recall(result):
+    """Recall of the configured storage, article index type and threshold, if it was evaluated."""
+    production = (EMBEDDING_STORAGE, checker.INDEX_TYPES_BY_MODEL['article'])
+    for config in result['configs']:
+        if (config['storage'], config['requested_index_type']) == production:
+            for row in config['thresholds']:
+                if row['threshold'] == checker.similarity_threshold:
+                    return row['recall']
+    return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", default=DEFAULT_PAIRS, help="labelled pairs (JSON lines)")
+    parser.add_argument("--corpus", help="distractor texts indexed alongside the pairs (JSON lines)")
+    parser.add_argument("--configs", nargs="+", type=parse_config, metavar="STORAGE/INDEX_TYPE",
+                        help="e.g. float32/flat int8/sq8 float32/hnsw; defaults to all quantization and ANN configs")
+    parser.add_argument("--thresholds", nargs="+", type=float)
+    parser.add_argument("--lookback-days", nargs="+", type=int)
+    parser.add_argument("--model", help="embedding model name or local path; defaults to the active model")
+    parser.add_argument("--backend", default=checker.FAISS_ENCODER_BACKEND, choices=checker.ENCODER_BACKENDS)
+    parser.add_argument("--file", default=checker.FAISS_ENCODER_FILE, help="model file within the model repo")
+    parser.add_argument("--batch-size", type=int, default=checker.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--min-recall", type=float,
+                        help="exit non-zero if the configured storage/index type/threshold recall is lower")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    result = run(args.pairs, args.corpus, args.configs, args.thresholds, args.lookback_days,
+                 args.model, args.backend, args.file, args.batch_size)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.min_recall is not None:
+        recall = production_recall(result)
+        if recall is None:
+            print("FAIL: the configured storage/index type was not evaluated")
+            sys.exit(1)
+        if recall < args.min_recall:
+            print(f"FAIL: recall {recall:.3f} at SIMILARITY_THRESHOLD={checker.similarity_threshold} "
+                  f"is below {args.min_recall}")
+            sys.exit(1)
+        print(f"OK: recall {recall:.3f}")
@@ -0,0 +1,848 @@
+"""
+On-disk FAISS index store.
+
+Each named index (e.g. 'article', 'job') is laid out LSM-style:
+
+* an immutable base index, written as a versioned index file with a small
+  JSON manifest recording the current generation;
+* small append-only delta segments, one file per batch of upserts or deletes,
+  which writers can create concurrently without coordination.
+
+Every index is an IndexIDMap2 keyed by the primary key of the Article/Job, so
+search results carry model IDs directly. Upserts and deletes recorded in delta
+segments shadow the corresponding base entries until a periodic compaction
+applies them with remove_ids/add_with_ids and writes a new base. Processes keep
+the opened store as a singleton and only reload the parts that changed on disk.
+
+Base files are opened with IO_FLAG_MMAP_IFC, which maps the stored vectors
+instead of copying them onto the heap, so every gunicorn/celery process on a
+host shares one copy through the page cache.
+
+The store directory is the only channel between writers and readers: a
+process only sees vectors that were written to the FAISS_INDEX_DIR it reads.
+Deployments spanning several hosts must put FAISS_INDEX_DIR on a volume shared
+by all of them (with working flock); a host-local directory would only be
+built once from the database and then miss every item indexed on other hosts.
+
+Besides the full index per model type, items are also written to daily shards
+('article-20250101', ...) so lookback queries only search the most recent days.
+
+Each embedding model has its own directory of namespaces (see
+similarity.active_model), so a new model's indexes can be built while the
+current ones keep serving.
+
+Base indexes can be built as compressed scalar-quantized or product-quantized
+indexes, or as approximate HNSW/IVF indexes (FAISS_INDEX_TYPE); delta segments
+are always replayed into an exact flat index since they are small.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+import faiss
+import numpy as np
+from django.utils import timezone
+
+from similarity.active_model import FAISS_INDEX_DIR, model_directory
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+
+# Number of older generations kept on disk for processes that still have them mapped
+KEEP_GENERATIONS = 2
+
+SEGMENT_SUFFIX = ".seg.npz"
+
+# Daily shards older than this are dropped by the retention sweep
+SHARD_RETENTION_DAYS = int(os.getenv("SIMILARITY_SHARD_RETENTION_DAYS", "30"))
+
+# Base index type: 'flat' (exact float32), compressed 'fp16', 'sq8' or 'pq',
+# or approximate 'hnsw' / 'ivf'
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+
+INDEX_TYPES = ("flat", "fp16", "sq8", "pq", "hnsw", "ivf")
+
+# HNSW graph degree and build/search beam widths; higher is better recall but slower
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+
+# IVF inverted lists (0 uses ~4 * sqrt(n)) and lists probed per query
+FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+
+# Product quantizer sub-vectors (bytes per vector); 0 uses dimension / 4
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "0"))
+PQ_NBITS = 8
+
+# Vectors sampled to train quantized indexes; with fewer than the minimum
+# the quantizer ranges / codebooks are poor (FAISS wants ~39 per PQ centroid)
+MAX_TRAINING_VECTORS = 65536
+MIN_TRAINING_VECTORS = {"sq8": 256, "pq": 39 * 2 ** PQ_NBITS, "ivf": 39 * 16}
+
+# HNSW graphs cannot drop nodes, and IVF lists do not renumber on removal the
+# way IndexIDMap2 expects, so updates and deletes refill these on compaction
+REBUILT_ON_COMPACTION = ("hnsw", "ivf")
+
+SHARD_NAME_RE = re.compile(r"^(?P<model_type>\w+)-(?P<day>\d{8})$")
+
+
+# Immutable view of the store; swapped atomically when something changes on disk
+Snapshot = namedtuple(
+    "Snapshot", ["key", "generation", "base", "segments", "delta", "shadowed", "base_selector"]
+)
+
+EMPTY_IDS = np.empty(0, dtype=np.int64)
+
+EMPTY_SNAPSHOT = Snapshot(None, None, None, (), None, EMPTY_IDS, None)
+
+
+def new_index(dimension, index_type="flat", training_vectors=None):
+    """
+    Create an empty ID-mapped inner-product index.
+
+    Quantized and IVF index types are trained on `training_vectors`. With too few
+    vectors to train on (small daily shards, an empty database) the exact flat
+    index is used instead, which is also the cheapest at that size.
+
+    Args:
+        dimension: Vector dimension
+        index_type: One of INDEX_TYPES
+        training_vectors: float32 array of shape (n, dimension), already normalized
+
+    Returns:
+        faiss.IndexIDMap2: Trained, empty index
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Invalid FAISS index type: {index_type}. Must be one of {', '.join(INDEX_TYPES)}")
+
+    available = 0 if training_vectors is None else len(training_vectors)
+    if index_type == "sq8" and available < MIN_TRAINING_VECTORS["sq8"]:
+        index_type = "flat"
+    if index_type == "pq" and available < MIN_TRAINING_VECTORS["pq"]:
+        # Fall back to the next most compact type that can be trained
+        index_type = "sq8" if available >= MIN_TRAINING_VECTORS["sq8"] else "flat"
+    if index_type == "ivf" and available < MIN_TRAINING_VECTORS["ivf"]:
+        index_type = "flat"
+
+    if index_type == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+    if index_type == "hnsw":
+        inner = faiss.IndexHNSWFlat(dimension, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+        inner.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+    elif index_type == "ivf":
+        nlist = FAISS_IVF_NLIST or int(4 * np.sqrt(available))
+        # Keep enough training points per centroid
+        nlist = max(1, min(nlist, min(available, MAX_TRAINING_VECTORS) // 39))
+        # The Python wrapper keeps the coarse quantizer alive with the IVF index
+        inner = faiss.IndexIVFFlat(faiss.IndexFlatIP(dimension), dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        inner.nprobe = min(FAISS_IVF_NPROBE, nlist)
+    elif index_type == "fp16":
+        inner = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "sq8":
+        inner = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    else:
+        m = FAISS_PQ_M or dimension // 4
+        if dimension % m:
+            raise ValueError(f"FAISS_PQ_M={m} must divide the embedding dimension {dimension}")
+        inner = faiss.IndexPQ(dimension, m, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+
+    if not inner.is_trained:
+        if available > MAX_TRAINING_VECTORS:
+            sample = np.random.default_rng(0).choice(available, MAX_TRAINING_VECTORS, replace=False)
+            training_vectors = training_vectors[np.sort(sample)]
+        inner.train(np.ascontiguousarray(training_vectors, dtype=np.float32))
+
+    return faiss.IndexIDMap2(inner)
+
+
+def index_type_of(index):
+    """Return the INDEX_TYPES name of an ID-mapped index."""
+    inner = faiss.downcast_index(index.index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(inner, faiss.IndexPQ):
+        return "pq"
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return "fp16" if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+
+def index_vectors(index):
+    """
+    Return the IDs and vectors stored in an ID-mapped index.
+
+    Vectors of quantized indexes are the decoded approximations. IVF indexes
+    get a direct map added, so pass a writable copy rather than a mapped base.
+
+    Returns:
+        tuple: (numpy.ndarray of IDs, float32 matrix of shape (n, d))
+    """
+    ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+    if not len(ids):
+        return ids, np.empty((0, index.d), dtype=np.float32)
+    inner = faiss.downcast_index(index.index)
+    if isinstance(inner, faiss.IndexIVF):
+        inner.make_direct_map()
+        vectors = inner.reconstruct_n(0, index.ntotal)
+        inner.make_direct_map(False)
+        return ids, vectors
+    return ids, inner.reconstruct_n(0, index.ntotal)
+
+
+def _shadow_selector(index, shadowed):
+    """
+    ID selector excluding shadowed IDs from a base index search.
+
+    Selectors are only read during a search, so one per snapshot is shared by
+    every thread. Returns None when nothing is shadowed, or when the index type
+    does not accept selectors (IndexPQ); shadowed IDs are then filtered after
+    the search.
+    """
+    if not len(shadowed) or index_type_of(index) == "pq":
+        return None
+
+    batch = faiss.IDSelectorBatch(shadowed)
+    selector = faiss.IDSelectorNot(batch)
+    # SWIG does not keep the wrapped batch alive on its own
+    selector.referenced_objects = [batch]
+    return selector
+
+
+def _search_params(index, selector):
+    """
+    Search parameters for a base index: the shadow selector plus efSearch/nprobe.
+
+    Built for every search: IndexIDMap swaps params.sel in place while it
+    searches (without the GIL), so parameters shared between threads would be
+    corrupted.
+
+    Returns None when no parameters are needed.
+    """
+    index_type = index_type_of(index)
+    if index_type == "pq":
+        return None
+
+    referenced = []
+    kwargs = {}
+    if selector is not None:
+        kwargs["sel"] = selector
+        referenced = [selector]
+
+    if index_type == "hnsw":
+        params = faiss.SearchParametersHNSW(efSearch=FAISS_HNSW_EF_SEARCH, **kwargs)
+    elif index_type == "ivf":
+        nlist = faiss.downcast_index(index.index).nlist
+        params = faiss.SearchParametersIVF(nprobe=min(FAISS_IVF_NPROBE, nlist), **kwargs)
+    elif kwargs:
+        params = faiss.SearchParameters(**kwargs)
+    else:
+        return None
+
+    # SWIG does not keep the wrapped selectors alive on its own
+    params.referenced_objects = referenced
+    return params
+
+
+class IndexStore:
+    """Versioned base index plus append-only upsert/delete segments for a single namespace."""
+
+    def __init__(self, name, directory=None):
+        self.name = name
+        self.directory = directory or model_directory()
+        self._lock = threading.Lock()
+        self._snapshot = EMPTY_SNAPSHOT
+
+    # ------------------------------------------------------------------
+    # Paths
+    # ------------------------------------------------------------------
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, f"{self.name}.manifest.json")
+
+    def _index_path(self, generation):
+        return os.path.join(self.directory, f"{self.name}.{generation}.index")
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, segment)
+
+    # ------------------------------------------------------------------
+    # Manifest and segments
+    # ------------------------------------------------------------------
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self, manifest):
+        _atomic_write(self.manifest_path, lambda path: _dump_json(manifest, path))
+
+    def segment_names(self, manifest=None):
+        """Return the names of live delta segments, oldest first."""
+        if manifest is None:
+            manifest = self._read_manifest()
+        compacted = set(manifest.get("compacted_segments", [])) if manifest else set()
+
+        prefix = f"{self.name}."
+        try:
+            names = [
+                entry.name for entry in os.scandir(self.directory)
+                if entry.name.startswith(prefix) and entry.name.endswith(SEGMENT_SUFFIX)
+            ]
+        except FileNotFoundError:
+            return []
+
+        # Segment names start with a nanosecond timestamp, so sorting keeps insert order
+        return sorted(name for name in names if name not in compacted)
+
+    def _read_segment(self, segment):
+        with np.load(self._segment_path(segment)) as data:
+            return data["vectors"], data["ids"], data["deleted"]
+
+    @contextmanager
+    def _writer_lock(self):
+        """Serialize base writers across processes with an advisory file lock."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f"{self.name}.lock"), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def generation(self):
+        """Return the current base generation, or None if no base was saved yet."""
+        manifest = self._read_manifest()
+        return manifest["generation"] if manifest else None
+
+    def is_empty(self):
+        """True if neither a base index nor any delta segment exists."""
+        return self.generation() is None and not self.segment_names()
+
+    def snapshot(self):
+        """
+        Return the current Snapshot, reloading only what changed on disk.
+
+        The base is memory-mapped (see _read_base); live delta segments are replayed into
+        a small in-memory index plus the set of base IDs they shadow. Both are
+        cached until the manifest or the set of segment files changes.
+        """
+        manifest = self._read_manifest()
+        key = self._disk_key(manifest)
+        snapshot = self._snapshot
+        if key == snapshot.key:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if key != snapshot.key:
+                snapshot = self._reload(manifest, snapshot)
+                self._snapshot = snapshot
+        return snapshot
+
+    def _disk_key(self, manifest):
+        # Segment names are unique and manifests are replaced atomically, so this
+        # changes exactly when this namespace changes (unlike directory mtimes)
+        generation = manifest["generation"] if manifest else None
+        return generation, tuple(self.segment_names(manifest))
+
+    def _reload(self, manifest, previous):
+        base, generation = previous.base, previous.generation
+        if manifest is None:
+            base, generation = None, None
+        elif manifest["generation"] != generation:
+            manifest, base = self._open_base(manifest)
+            generation = manifest["generation"]
+            print(f"Opened FAISS {self.name} index generation {generation} with {base.ntotal} items")
+
+        segments = tuple(self.segment_names(manifest))
+        if segments[:len(previous.segments)] == previous.segments and previous.delta is not None:
+            # Only new segments were appended; replay them onto a copy of the delta
+            delta = faiss.clone_index(previous.delta)
+            shadowed = set(previous.shadowed.tolist())
+            new_segments = segments[len(previous.segments):]
+        else:
+            delta, shadowed = None, set()
+            new_segments = segments
+
+        delta = self._replay_segments(new_segments, delta, shadowed)
+        shadowed = np.fromiter(shadowed, dtype=np.int64)
+        selector = _shadow_selector(base, shadowed) if base is not None else None
+        return Snapshot((generation, segments), generation, base, segments, delta, shadowed, selector)
+
+    def _open_base(self, manifest):
+        """
+        Open the base generation named by a manifest.
+
+        A writer may publish newer generations and remove this one (see
+        _remove_old_generations) between reading the manifest and opening the
+        file; the newest manifest is then followed instead.
+
+        Returns:
+            tuple: (manifest of the opened generation, base index)
+        """
+        while True:
+            path = self._index_path(manifest["generation"])
+            try:
+                return manifest, _read_base(path)
+            except RuntimeError:
+                if os.path.exists(path):
+                    raise
+            latest = self._read_manifest()
+            if latest is None or latest["generation"] == manifest["generation"]:
+                raise FileNotFoundError(path)
+            manifest = latest
+
+    def _replay_segments(self, segments, delta, shadowed):
+        """Apply segments in order to the delta index, recording shadowed base IDs."""
+        for segment in segments:
+            try:
+                vectors, ids, deleted = self._read_segment(segment)
+            except FileNotFoundError:
+                # Compacted and removed between listing and reading
+                continue
+
+            changed = np.concatenate([ids, deleted])
+            if delta is None and len(ids):
+                delta = new_index(vectors.shape[1])
+            if delta is not None and len(changed):
+                delta.remove_ids(changed)
+            if len(ids):
+                delta.add_with_ids(vectors, ids)
+            shadowed.update(changed.tolist())
+
+        return delta
+
+    def _refill_segments(self, segments, index):
+        """Apply segments to an index that cannot remove_ids (see REBUILT_ON_COMPACTION)."""
+        shadowed = set()
+        delta = self._replay_segments(segments, None, shadowed)
+        shadowed = np.fromiter(shadowed, dtype=np.int64)
+
+        base_ids = faiss.vector_to_array(index.id_map)
+        if np.isin(base_ids, shadowed).any():
+            # Existing entries changed: empty the (still trained) index and refill it
+            ids, vectors = index_vectors(index)
+            keep = ~np.isin(ids, shadowed)
+            index.reset()
+            index.add_with_ids(vectors[keep], ids[keep])
+
+        # Pure inserts are simply added to the graph / inverted lists
+        if delta is not None and delta.ntotal:
+            ids, vectors = index_vectors(delta)
+            index.add_with_ids(vectors, ids)
+        return index
+
+    def ntotal(self):
+        """Number of live vectors across the base and the delta segments."""
+        snapshot = self.snapshot()
+        total = snapshot.delta.ntotal if snapshot.delta is not None else 0
+        if snapshot.base is not None:
+            base_ids = faiss.vector_to_array(snapshot.base.id_map)
+            total += int(np.count_nonzero(~np.isin(base_ids, snapshot.shadowed)))
+        return total
+
+    def ids(self):
+        """IDs of every live vector across the base and the delta segments."""
+        snapshot = self.snapshot()
+        ids = np.empty(0, dtype=np.int64)
+        if snapshot.base is not None:
+            base_ids = faiss.vector_to_array(snapshot.base.id_map)
+            ids = base_ids[~np.isin(base_ids, snapshot.shadowed)]
+        if snapshot.delta is not None and snapshot.delta.ntotal:
+            ids = np.concatenate([ids, faiss.vector_to_array(snapshot.delta.id_map)])
+        return ids
+
+    def search(self, queries, k):
+        """
+        Search the base index and the delta segments.
+
+        Base entries that were updated or deleted in a delta segment are
+        filtered out with an ID selector, so results always reflect the
+        latest write for each ID.
+
+        Args:
+            queries: float32 array of shape (nq, d), already normalized
+            k: Number of neighbours per query
+
+        Returns:
+            tuple: (similarities, ids), each of shape (nq, k); missing
+                   neighbours are padded with -inf and -1
+        """
+        snapshot = self.snapshot()
+        nq = queries.shape[0]
+
+        partial_scores, partial_ids = [], []
+        if snapshot.base is not None and snapshot.base.ntotal:
+            if snapshot.base_selector is None and len(snapshot.shadowed):
+                # No ID selector support: over-fetch and drop shadowed IDs afterwards
+                fetch = min(k + len(snapshot.shadowed), snapshot.base.ntotal)
+                distances, ids = snapshot.base.search(queries, fetch)
+                ids[np.isin(ids, snapshot.shadowed)] = -1
+            else:
+                distances, ids = snapshot.base.search(
+                    queries, min(k, snapshot.base.ntotal),
+                    params=_search_params(snapshot.base, snapshot.base_selector),
+                )
+            partial_scores.append(distances)
+            partial_ids.append(ids)
+        if snapshot.delta is not None and snapshot.delta.ntotal:
+            distances, ids = snapshot.delta.search(queries, min(k, snapshot.delta.ntotal))
+            partial_scores.append(distances)
+            partial_ids.append(ids)
+
+        # Base and delta never hold the same live ID, so a plain merge is enough
+        return _merge_results(partial_scores, partial_ids, nq, k)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def add(self, vectors, ids):
+        """
+        Insert or update vectors by ID.
+
+        The write is recorded as a new delta segment. Segments get unique names
+        and are renamed into place atomically, so concurrent writers never
+        overwrite each other and no lock is taken.
+
+        Args:
+            vectors: float32 array of shape (n, d), already normalized
+            ids: Sequence of n item IDs; existing entries with these IDs are replaced
+
+        Returns:
+            str: Name of the new segment
+        """
+        return self._write_segment(
+            vectors=np.ascontiguousarray(vectors, dtype=np.float32),
+            ids=np.asarray(ids, dtype=np.int64),
+            deleted=EMPTY_IDS,
+        )
+
+    def remove(self, ids):
+        """
+        Delete vectors by ID.
+
+        Args:
+            ids: Sequence of item IDs to remove
+
+        Returns:
+            str: Name of the new segment
+        """
+        return self._write_segment(
+            vectors=np.empty((0, 0), dtype=np.float32),
+            ids=EMPTY_IDS,
+            deleted=np.asarray(ids, dtype=np.int64),
+        )
+
+    def _write_segment(self, **arrays):
+        os.makedirs(self.directory, exist_ok=True)
+        segment = f"{self.name}.{time.time_ns():020d}-{uuid.uuid4().hex[:8]}{SEGMENT_SUFFIX}"
+        _atomic_write(self._segment_path(segment), lambda path: _save_npz(path, **arrays))
+        return segment
+
+    def save(self, index, absorbed_segments=None):
+        """
+        Write a new base generation and make it current.
+
+        Args:
+            index: ID-mapped FAISS index (see new_index)
+            absorbed_segments: Delta segments whose vectors are already part of
+                               this index. Defaults to every live segment.
+
+        Returns:
+            int: The new generation number
+        """
+        with self._writer_lock():
+            manifest = self._read_manifest()
+
+            # Finish cleaning up after an interrupted save or compaction, whose
+            # segments would otherwise be applied on top of a base that has them
+            if manifest:
+                self._remove_segments(manifest.get("compacted_segments", []))
+
+            if absorbed_segments is None:
+                absorbed_segments = self.segment_names(manifest)
+            generation = self._publish(manifest, index, absorbed_segments)
+        self._remove_segments(absorbed_segments)
+        return generation
+
+    def compact(self, min_segments=1):
+        """
+        Apply all live delta segments to the base and publish a new generation.
+
+        Args:
+            min_segments: Skip compaction when fewer segments are pending
+
+        Returns:
+            int: Number of segments merged
+        """
+        with self._writer_lock():
+            manifest = self._read_manifest()
+
+            # Finish cleaning up after a previous compaction that was interrupted
+            if manifest:
+                self._remove_segments(manifest.get("compacted_segments", []))
+
+            segments = self.segment_names(manifest)
+            if len(segments) < min_segments or not segments:
+                return 0
+
+            if manifest is None:
+                index = None
+            else:
+                # Read a private, writable copy; the mapped base is read-only
+                index = faiss.read_index(self._index_path(manifest["generation"]))
+
+            if index is not None and index_type_of(index) in REBUILT_ON_COMPACTION:
+                index = self._refill_segments(segments, index)
+            else:
+                index = self._replay_segments(segments, index, set())
+            if index is None:
+                # Only deletes were recorded and there is no base to apply them to
+                self._remove_segments(segments)
+                return len(segments)
+
+            self._publish(manifest, index, segments)
+
+        self._remove_segments(segments)
+        print(f"Compacted {len(segments)} {self.name} segments")
+        return len(segments)
+
+    def _publish(self, manifest, index, absorbed_segments):
+        generation = manifest["generation"] + 1 if manifest else 1
+
+        _atomic_write(self._index_path(generation), lambda path: faiss.write_index(index, path))
+        self._write_manifest({
+            "generation": generation,
+            "ntotal": int(index.ntotal),
+            "dimension": int(index.d),
+            "index_type": index_type_of(index),
+            "compacted_segments": list(absorbed_segments),
+        })
+
+        self._remove_old_generations(generation)
+        print(f"Saved FAISS {self.name} index generation {generation} with {index.ntotal} items")
+        return generation
+
+    def delete(self):
+        """Remove every file belonging to this namespace."""
+        with self._writer_lock():
+            prefix = f"{self.name}."
+            for entry in os.scandir(self.directory):
+                if entry.name.startswith(prefix) and not entry.name.endswith(".lock"):
+                    os.remove(entry.path)
+        print(f"Deleted FAISS {self.name} index")
+
+    def _remove_segments(self, segments):
+        for segment in segments:
+            try:
+                os.remove(self._segment_path(segment))
+            except FileNotFoundError:
+                pass
+
+    def _remove_old_generations(self, generation):
+        for old in range(generation - KEEP_GENERATIONS, 0, -1):
+            path = self._index_path(old)
+            if not os.path.exists(path):
+                break
+            # Unlinking is safe even if another process still has the file mapped
+            os.remove(path)
+
+
+def _merge_results(partial_scores, partial_ids, nq, k):
+    """Merge per-index (scores, ids) results into the overall top-k per query."""
+    scores = np.full((nq, k), -np.inf, dtype=np.float32)
+    ids = np.full((nq, k), -1, dtype=np.int64)
+    if not partial_scores:
+        return scores, ids
+
+    all_scores = np.hstack(partial_scores)
+    all_ids = np.hstack(partial_ids)
+    all_scores[all_ids < 0] = -np.inf
+    order = np.argsort(-all_scores, axis=1)[:, :k]
+    columns = order.shape[1]
+    scores[:, :columns] = np.take_along_axis(all_scores, order, axis=1)
+    ids[:, :columns] = np.take_along_axis(all_ids, order, axis=1)
+    return scores, ids
+
+
+def _read_base(path):
+    """
+    Open a base index read-only, mapping its codes from the file.
+
+    IO_FLAG_MMAP only maps inverted lists, so flat and scalar-quantized bases
+    would still be copied onto each process's heap; IO_FLAG_MMAP_IFC maps their
+    code arrays too. Index types it cannot map are read normally.
+    """
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC)
+    except RuntimeError as e:
+        if not os.path.exists(path):
+            raise
+        print(f"Could not map {path}, reading it into memory: {str(e)}")
+        return faiss.read_index(path)
+
+
+def _atomic_write(path, writer):
+    """Write a file via a temporary sibling and rename it into place."""
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        writer(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _dump_json(data, path):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def _save_npz(path, **arrays):
+    # np.savez appends '.npz' to bare paths, so write through a file handle
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(name, model_name=None):
+    """Return the per-process IndexStore singleton for a namespace of a model (the active one if None)."""
+    return _store_at(model_directory(model_name), name)
+
+
+def _store_at(directory, name):
+    store = _stores.get((directory, name))
+    if store is None:
+        with _stores_lock:
+            store = _stores.setdefault((directory, name), IndexStore(name, directory))
+    return store
+
+
+def search_stores(stores, queries, k):
+    """
+    Search several stores holding disjoint IDs (e.g. daily shards) and merge the top-k.
+
+    Returns:
+        tuple: (similarities, ids), each of shape (nq, k)
+    """
+    partial_scores, partial_ids = [], []
+    for store in stores:
+        scores, ids = store.search(queries, k)
+        partial_scores.append(scores)
+        partial_ids.append(ids)
+    return _merge_results(partial_scores, partial_ids, queries.shape[0], k)
+
+
+def list_stores(model_name=None):
+    """Return the names of every namespace of a model (the active one if None) with a manifest or segments on disk."""
+    return _list_namespaces(model_directory(model_name))
+
+
+def _list_namespaces(directory):
+    try:
+        return sorted({
+            entry.name.split(".", 1)[0] for entry in os.scandir(directory)
+            if entry.name.endswith((".manifest.json", SEGMENT_SUFFIX))
+        })
+    except FileNotFoundError:
+        return []
+
+
+def stored_dimension(model_name=None):
+    """Vector dimension recorded in any manifest of a model (the active one if None), or None."""
+    directory = model_directory(model_name)
+    for name in _list_namespaces(directory):
+        manifest = IndexStore(name, directory)._read_manifest()
+        if manifest:
+            return manifest["dimension"]
+    return None
+
+
+def _all_stores():
+    """Every store on disk, across the directories of all models."""
+    try:
+        directories = [entry.path for entry in os.scandir(FAISS_INDEX_DIR) if entry.is_dir()]
+    except FileNotFoundError:
+        return []
+
+    return [_store_at(directory, name) for directory in sorted(directories) for name in _list_namespaces(directory)]
+
+
+def shard_name(model_type, day):
+    """Namespace of the daily shard holding items created on `day`."""
+    return f"{model_type}-{day:%Y%m%d}"
+
+
+def list_shards(model_type, model_name=None):
+    """
+    Return the daily shards on disk for a model type.
+
+    Args:
+        model_type: 'article' or 'job'
+        model_name: Embedding model, or None for the active one
+
+    Returns:
+        list: (date, namespace) tuples, oldest first
+    """
+    shards = []
+    for name in list_stores(model_name):
+        match = SHARD_NAME_RE.match(name)
+        if match and match.group("model_type") == model_type:
+            shards.append((datetime.strptime(match.group("day"), "%Y%m%d").date(), name))
+    return sorted(shards)
+
+
+def drop_expired_shards(today=None, retention_days=SHARD_RETENTION_DAYS):
+    """
+    Delete daily shards older than the retention window, for every model.
+
+    Returns:
+        list: Paths of the deleted shards
+    """
+    today = today or timezone.localdate()
+    dropped = []
+    for store in _all_stores():
+        match = SHARD_NAME_RE.match(store.name)
+        if not match:
+            continue
+        day = datetime.strptime(match.group("day"), "%Y%m%d").date()
+        if (today - day).days > retention_days:
+            store.delete()
+            dropped.append(os.path.join(store.directory, store.name))
+    return dropped
+
+
+def compact_all(min_segments=1):
+    """
+    Compact every index namespace that has a manifest or segments on disk, for every model.
+
+    Returns:
+        dict: {namespace path: number of segments merged}
+    """
+    return {
+        os.path.join(os.path.basename(store.directory), store.name): store.compact(min_segments=min_segments)
+        for store in _all_stores()
+    }
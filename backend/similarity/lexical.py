@@ -0,0 +1,186 @@
+"""
+Lexical near-duplicate prefilter.
+
+Syndicated wire copy is republished by several outlets with only small edits
+(bylines, "Related News" blocks, a changed headline). A 64-bit SimHash of the
+scraped source text catches these before the article is sent for an LLM
+rewrite: near-identical texts have fingerprints that differ in only a few bits.
+
+Fingerprints are stored on the ScrapedArticle of every published page, and a
+sweep compares each candidate against the whole lookback window with one
+vectorized XOR/popcount, then against the candidates it has already rewritten
+but not yet published (find_near_duplicate).
+"""
+import hashlib
+import os
+import re
+from datetime import timedelta
+
+import numpy as np
+from bs4 import BeautifulSoup
+from django.utils import timezone
+
+from scraper.models import ScrapedArticle
+
+
+# Fingerprints differing in at most this many of 64 bits are duplicates
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", "3"))
+
+SIMHASH_LOOKBACK_DAYS = int(os.getenv("SIMHASH_LOOKBACK_DAYS", os.getenv("SIMILARITY_LOOKBACK_DAYS", "3")))
+
+# Words per shingle; 3 keeps common phrases from dominating short texts
+SHINGLE_SIZE = 3
+
+# Texts shorter than this (in words) are too short to fingerprint reliably
+MIN_WORDS = 50
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+BIT_WEIGHTS = np.array([1 << bit for bit in range(64)], dtype=np.uint64)
+
+
+def source_text(html):
+    """Visible text of a scraped article container."""
+    if not html:
+        return ""
+    return BeautifulSoup(html, "html.parser").get_text(" ")
+
+
+def simhash(text):
+    """
+    64-bit SimHash of a text over word shingles.
+
+    Args:
+        text: Plain text
+
+    Returns:
+        int: Unsigned fingerprint, or None if the text is too short
+    """
+    words = WORD_RE.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little") for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+    # Each shingle votes +1/-1 on every bit; the fingerprint keeps the majority
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(hashes)
+    return int((BIT_WEIGHTS[votes > 0]).sum())
+
+
+def to_signed(fingerprint):
+    """Store an unsigned 64-bit fingerprint in a signed BigIntegerField."""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def hamming_distances(fingerprint, fingerprints):
+    """
+    Bit differences between one fingerprint and many.
+
+    Args:
+        fingerprint: Unsigned fingerprint
+        fingerprints: numpy int64 array of stored (signed) fingerprints
+
+    Returns:
+        numpy.ndarray: Distance to each stored fingerprint
+    """
+    xor = fingerprints.view(np.uint64) ^ np.uint64(fingerprint)
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class PublishedFingerprints:
+    """
+    Fingerprints of the pages published in the lookback window.
+
+    Only pages that produced an Article are fingerprinted (see
+    store_fingerprint), so a page whose rewrite failed or that was dropped as a
+    duplicate can never make later copies of its story skip the rewrite.
+    The window is loaded with one query per sweep.
+    """
+
+    def __init__(self, lookback_days=None):
+        if lookback_days is None:
+            lookback_days = SIMHASH_LOOKBACK_DAYS
+
+        stored = list(
+            ScrapedArticle.objects.filter(
+                simhash__isnull=False,
+                articles__isnull=False,
+                scraped_at__gte=timezone.now() - timedelta(days=lookback_days),
+            ).values_list('id', 'simhash')
+        )
+        self.ids = np.array([row[0] for row in stored], dtype=np.int64)
+        self.fingerprints = np.array([row[1] for row in stored], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, scraped_article_id, fingerprint):
+        """Include a page published after the window was loaded (see store_fingerprint)."""
+        if fingerprint is None:
+            return
+        self.ids = np.append(self.ids, np.int64(scraped_article_id))
+        self.fingerprints = np.append(self.fingerprints, np.int64(to_signed(fingerprint)))
+
+    def find(self, fingerprint, max_distance=None):
+        """
+        Find a published page whose source text is a near-duplicate.
+
+        Args:
+            fingerprint: simhash() of the candidate's source text
+            max_distance: Largest Hamming distance counted as a duplicate (SIMHASH_MAX_DISTANCE if None)
+
+        Returns:
+            tuple: (ScrapedArticle, distance) of the closest match, or (None, None)
+        """
+        if fingerprint is None or not len(self):
+            return None, None
+        if max_distance is None:
+            max_distance = SIMHASH_MAX_DISTANCE
+
+        distances = hamming_distances(fingerprint, self.fingerprints)
+        best = int(np.argmin(distances))
+        if distances[best] > max_distance:
+            return None, None
+
+        return ScrapedArticle.objects.get(id=int(self.ids[best])), int(distances[best])
+
+
+def find_near_duplicate(fingerprint, candidates, max_distance=None):
+    """
+    Find a near-duplicate among candidates of the same sweep that are not published yet.
+
+    Args:
+        fingerprint: simhash() of the candidate's source text
+        candidates: dict of key -> simhash() of the candidates rewritten earlier in the sweep
+        max_distance: Largest Hamming distance counted as a duplicate (SIMHASH_MAX_DISTANCE if None)
+
+    Returns:
+        tuple: (key, distance) of the closest candidate, or (None, None)
+    """
+    candidates = {key: value for key, value in candidates.items() if value is not None}
+    if fingerprint is None or not candidates:
+        return None, None
+    if max_distance is None:
+        max_distance = SIMHASH_MAX_DISTANCE
+
+    keys = list(candidates)
+    distances = hamming_distances(fingerprint, np.array([to_signed(candidates[key]) for key in keys], dtype=np.int64))
+    best = int(np.argmin(distances))
+    if distances[best] > max_distance:
+        return None, None
+
+    return keys[best], int(distances[best])
+
+
+def store_fingerprint(scraped_article, fingerprint):
+    """Record the fingerprint of a page once it has been published as an Article."""
+    if fingerprint is None:
+        return
+    scraped_article.simhash = to_signed(fingerprint)
+    scraped_article.save(update_fields=['simhash'])
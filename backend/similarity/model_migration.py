@@ -0,0 +1,162 @@
+"""
+Zero-downtime embedding model migration.
+
+Changing FAISS_MODEL directly would leave the index full of vectors from the
+old model. Instead the new model is rolled out next to the old one:
+
+1. backfill - re-embed every article and job with the new model in batches,
+   storing the vectors as separate rows tagged with the model name, and build
+   the new model's indexes in their own directory. The old model keeps
+   serving throughout; run it again to catch up on items added meanwhile.
+2. switch   - catch up once more, then atomically point every process at the
+   new model (similarity.active_model). Encoders reload on their next call.
+   Items saved with the old model during the switch are re-embedded after it.
+3. cleanup  - once the new model is trusted, delete the old model's rows and
+   indexes. Until then, switching back to the old model is just another switch.
+
+Usage:
+    python similarity/model_migration.py status
+    python similarity/model_migration.py backfill sentence-transformers/all-mpnet-base-v2 --processes 0
+    python similarity/model_migration.py switch sentence-transformers/all-mpnet-base-v2
+    python similarity/model_migration.py cleanup
+"""
+import argparse
+import os
+import shutil
+import sys
+
+import django
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from django.db.models import Count
+
+from articles.models import Article
+from jobs.models import Job
+from similarity import checker
+from similarity.active_model import FAISS_INDEX_DIR, active_model, model_directory, set_active_model
+from similarity.index_store import get_store
+from similarity.models import ArticleEmbedding, JobEmbedding
+
+
+MODEL_TYPES = {
+    'article': (Article, ArticleEmbedding, 'articleembedding', checker.add_article_to_index),
+    'job': (Job, JobEmbedding, 'jobembedding', checker.add_job_to_index),
+}
+
+
+def migration_status():
+    """
+    Embedding coverage of every model found in the database.
+
+    Returns:
+        dict: {model_type: {'items': int, 'embeddings': {model_name: count}}}
+    """
+    status = {}
+    for model_type, (item_model, embedding_model, _, _) in MODEL_TYPES.items():
+        counts = embedding_model.objects.values('model_name').annotate(count=Count('id')).order_by('model_name')
+        status[model_type] = {
+            'items': item_model.objects.count(),
+            'embeddings': {row['model_name']: row['count'] for row in counts},
+        }
+    return status
+
+
+def backfill(model_name, processes=None):
+    """
+    Embed every item without a `model_name` row and rebuild that model's indexes.
+
+    Returns:
+        dict: {model_type: number of items encoded}
+    """
+    if model_name == active_model():
+        print(f"{model_name} is already the active model; backfilling it in place")
+    return {
+        model_type: checker.backfill_embeddings(model_type, processes=processes, model_name=model_name)
+        for model_type in MODEL_TYPES
+    }
+
+
+def switch(model_name, processes=None):
+    """
+    Make `model_name` the served embedding model.
+
+    Refuses to switch before its indexes have been built by backfill().
+
+    Returns:
+        int: Items saved with the old model during the switch and re-embedded afterwards
+    """
+    previous = active_model()
+    if model_name == previous:
+        print(f"{model_name} is already the active model")
+        return 0
+
+    for model_type, (item_model, _, _, _) in MODEL_TYPES.items():
+        if item_model.objects.exists() and get_store(model_type, model_name).generation() is None:
+            raise RuntimeError(f"No {model_type} index for {model_name}; run backfill first")
+
+    # Catch up on items added since the backfill while the old model still serves
+    backfill(model_name, processes=processes)
+
+    set_active_model(model_name)
+    print(f"Switched embedding model from {previous} to {model_name}")
+
+    # Items saved between the catch-up and the switch only have old-model vectors
+    stragglers = 0
+    for model_type, (item_model, _, relation, add_to_index) in MODEL_TYPES.items():
+        for item in item_model.objects.exclude(**{f'{relation}__model_name': model_name}):
+            add_to_index(item)
+            stragglers += 1
+    return stragglers
+
+
+def cleanup():
+    """
+    Delete embedding rows and index directories of every model but the active one.
+
+    Returns:
+        int: Number of embedding rows deleted
+    """
+    model_name = active_model()
+    deleted = 0
+    for _, embedding_model, _, _ in MODEL_TYPES.values():
+        deleted += embedding_model.objects.exclude(model_name=model_name).delete()[0]
+
+    active_directory = model_directory(model_name)
+    for entry in os.scandir(FAISS_INDEX_DIR):
+        if entry.is_dir() and entry.path != active_directory:
+            shutil.rmtree(entry.path)
+            print(f"Deleted FAISS indexes in {entry.path}")
+
+    print(f"Deleted {deleted} embeddings of inactive models")
+    return deleted
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status")
+    for command in ("backfill", "switch"):
+        subparser = subparsers.add_parser(command)
+        subparser.add_argument("model")
+        subparser.add_argument("--processes", type=int, default=None,
+                               help="encoder worker processes; 0 uses one per CPU core")
+    subparsers.add_parser("cleanup")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        print(f"Active model: {active_model()}")
+        for model_type, status in migration_status().items():
+            print(f"{model_type}s: {status['items']}")
+            for model_name, count in status['embeddings'].items():
+                print(f"  {model_name:<50} {count}")
+    elif args.command == "backfill":
+        print(backfill(args.model, processes=args.processes))
+    elif args.command == "switch":
+        print(f"Re-embedded {switch(args.model, processes=args.processes)} items saved during the switch")
+    else:
+        cleanup()
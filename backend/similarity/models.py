@@ -1,20 +1,99 @@
 from django.db import models
 from articles.models import Article
 from jobs.models import Job
+from scraper.models import ScrapedArticle
+from similarity.active_model import active_model
 
 # Create your models here.
 class ArticleEmbedding(models.Model):
-    article = models.OneToOneField(Article, on_delete=models.CASCADE, unique=True)
+    # One row per embedding model, so a new model can be backfilled next to the served one
+    article = models.ForeignKey(Article, on_delete=models.CASCADE)
+    model_name = models.CharField(max_length=200, default=active_model, db_index=True)
+    dimension = models.PositiveIntegerField(default=0)  # 0 for rows written before it was recorded
     embedding_vector = models.BinaryField()
+    # Serialization of embedding_vector, see similarity.quantization
+    embedding_format = models.CharField(max_length=8, default='float32')
     embedding_created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['article', 'model_name'], name='unique_article_embedding_model'),
+        ]
+
     def __str__(self):
         return f"Embedding for Article: {self.article.title}"
 
 class JobEmbedding(models.Model):
-    job = models.OneToOneField(Job, on_delete=models.CASCADE, unique=True)
+    job = models.ForeignKey(Job, on_delete=models.CASCADE)
+    model_name = models.CharField(max_length=200, default=active_model, db_index=True)
+    dimension = models.PositiveIntegerField(default=0)  # 0 for rows written before it was recorded
     embedding_vector = models.BinaryField()
+    # Serialization of embedding_vector, see similarity.quantization
+    embedding_format = models.CharField(max_length=8, default='float32')
     embedding_created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'model_name'], name='unique_job_embedding_model'),
+        ]
+
     def __str__(self):
-        return f"Embedding for Job: {self.job.role}"
\ No newline at end of file
+        return f"Embedding for Job: {self.job.role}"
+
+class RelatedArticle(models.Model):
+    """Precomputed semantic neighbours of a published article, served by the related-articles endpoint."""
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='related_articles')
+    related = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='related_from')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['article', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['article', 'rank'], name='unique_related_article_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.article_id} -> {self.related_id} ({self.score:.2f})"
+
+    @staticmethod
+    def cache_key(article_id):
+        """Cache key of the serialized related list, cleared whenever it is recomputed."""
+        return f"api:related:{article_id}"
+
+
+class StoryCluster(models.Model):
+    """A news story: every outlet's copy of it, grouped online by embedding similarity (see similarity.stories)."""
+    # First saved article of the story
+    article = models.ForeignKey(Article, on_delete=models.SET_NULL, null=True, blank=True, related_name='led_stories')
+    model_name = models.CharField(max_length=200, default=active_model)
+    # float32 mean of the member embeddings
+    centroid = models.BinaryField()
+    size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Story {self.id} ({self.size} sources)"
+
+
+class StorySource(models.Model):
+    """One outlet's copy of a story: a rewritten article or a skipped duplicate's scraped page."""
+    cluster = models.ForeignKey(StoryCluster, on_delete=models.CASCADE, related_name='sources')
+    scraped_article = models.OneToOneField(ScrapedArticle, on_delete=models.CASCADE, related_name='story_source')
+    article = models.ForeignKey(Article, on_delete=models.SET_NULL, null=True, blank=True, related_name='story_sources')
+    # Cosine similarity to the story when it joined; None for lexical (SimHash) duplicates
+    similarity = models.FloatField(null=True, blank=True)
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['added_at']
+
+    def __str__(self):
+        return f"{self.scraped_article.url} in story {self.cluster_id}"
+
+    @staticmethod
+    def cache_key(article_id):
+        """Cache key of an article's serialized coverage, cleared when its story grows."""
+        return f"api:coverage:{article_id}"
@@ -0,0 +1,103 @@
+"""
+Compact storage formats for embeddings.
+
+ArticleEmbedding/JobEmbedding rows record the format their vector was written
+in, so the setting can be changed at any time: new rows use the configured
+format and existing rows keep decoding correctly until they are re-embedded.
+
+* float32 - raw vector, 4 bytes per dimension (the original format)
+* float16 - half precision, 2 bytes per dimension
+* int8    - a float32 scale followed by symmetric int8 codes, 1 byte per dimension
+"""
+import os
+
+import numpy as np
+
+
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "float32")
+
+STORAGE_FORMATS = ("float32", "float16", "int8")
+
+# Bytes of the per-vector scale stored in front of int8 codes
+INT8_SCALE_BYTES = 4
+
+
+def _check_format(storage):
+    if storage not in STORAGE_FORMATS:
+        raise ValueError(f"Invalid embedding storage: {storage}. Must be one of {', '.join(STORAGE_FORMATS)}")
+
+
+def quantize_embedding(embedding, storage=None):
+    """
+    Serialize an embedding for the database.
+
+    Args:
+        embedding: 1-D float array
+        storage: Storage format, defaults to EMBEDDING_STORAGE
+
+    Returns:
+        tuple: (bytes, storage format)
+    """
+    storage = storage or EMBEDDING_STORAGE
+    _check_format(storage)
+    embedding = np.asarray(embedding, dtype=np.float32)
+
+    if storage == "float32":
+        return embedding.tobytes(), storage
+    if storage == "float16":
+        return embedding.astype(np.float16).tobytes(), storage
+
+    scale = np.float32(np.abs(embedding).max()) if embedding.size else np.float32(0)
+    if scale == 0:
+        codes = np.zeros(embedding.shape, dtype=np.int8)
+    else:
+        codes = np.round(embedding / scale * 127).astype(np.int8)
+    return scale.tobytes() + codes.tobytes(), storage
+
+
+def dequantize_embeddings(data, storage, count):
+    """
+    Decode `count` serialized embeddings concatenated in one bytes object.
+
+    Args:
+        data: bytes of `count` rows written by quantize_embedding with the same format
+        storage: Storage format of every row
+        count: Number of rows
+
+    Returns:
+        numpy.ndarray: float32 matrix of shape (count, d)
+    """
+    _check_format(storage)
+
+    if storage == "float32":
+        return np.frombuffer(data, dtype=np.float32).reshape(count, -1)
+    if storage == "float16":
+        return np.frombuffer(data, dtype=np.float16).reshape(count, -1).astype(np.float32)
+
+    rows = np.frombuffer(data, dtype=np.uint8).reshape(count, -1)
+    scales = rows[:, :INT8_SCALE_BYTES].copy().view(np.float32)
+    codes = rows[:, INT8_SCALE_BYTES:].view(np.int8)
+    return codes.astype(np.float32) * (scales / 127)
+
+
+def dequantize_embedding(data, storage="float32"):
+    """Decode a single serialized embedding to a float32 vector."""
+    return dequantize_embeddings(data, storage, 1)[0]
+
+
+def roundtrip(matrix, storage):
+    """Return `matrix` as it would read back after being stored in `storage` format."""
+    if storage == "float32":
+        return matrix
+    data = b"".join(quantize_embedding(row, storage)[0] for row in matrix)
+    return dequantize_embeddings(data, storage, len(matrix))
+
+
+def bytes_per_vector(dimension, storage):
+    """Database size of one embedding in the given format."""
+    _check_format(storage)
+    if storage == "float32":
+        return 4 * dimension
+    if storage == "float16":
+        return 2 * dimension
+    return INT8_SCALE_BYTES + dimension
@@ -0,0 +1,123 @@
+"""
+Precomputed related articles.
+
+The top-k semantic neighbours of every published article are stored in the
+RelatedArticle table, so the related-articles endpoint is a single indexed
+query instead of a vector search per page view. A nightly job recomputes the
+whole table and a frequent incremental job fills in new articles (and the
+lists of the articles they are now closest to).
+"""
+import os
+from datetime import timedelta
+
+import faiss
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from articles.models import Article
+from similarity.checker import load_embedding_matrix, search_faiss_index
+from similarity.active_model import active_model
+from similarity.models import ArticleEmbedding, RelatedArticle
+
+
+RELATED_ARTICLES_K = int(os.getenv("RELATED_ARTICLES_K", "10"))
+
+# Neighbours less similar than this are not worth showing
+RELATED_ARTICLES_MIN_SCORE = float(os.getenv("RELATED_ARTICLES_MIN_SCORE", "0.3"))
+
+# Articles searched per FAISS call and written per transaction
+QUERY_BATCH_SIZE = 1024
+
+
+def compute_related_articles(article_ids=None, k=RELATED_ARTICLES_K):
+    """
+    Compute and store the top-k related articles.
+    
+    Args:
+        article_ids: Articles to (re)compute, or None for every published article
+        k: Neighbours kept per article
+        
+    Returns:
+        int: Number of articles whose related list was written
+    """
+    embeddings = ArticleEmbedding.objects.filter(article__status='published', model_name=active_model())
+    if article_ids is not None:
+        embeddings = embeddings.filter(article_id__in=list(article_ids))
+    
+    query_ids, queries = load_embedding_matrix(embeddings, 'article_id')
+    if len(query_ids) == 0:
+        return 0
+    faiss.normalize_L2(queries)
+    
+    # The index also holds drafts and archived articles, which are filtered out below
+    published_ids = np.fromiter(
+        Article.objects.filter(status='published').values_list('id', flat=True), dtype=np.int64
+    )
+    
+    # Over-fetch to make up for the query itself and unpublished neighbours
+    fetch = 2 * k + 1
+    updated = 0
+    
+    for start in range(0, len(query_ids), QUERY_BATCH_SIZE):
+        batch_ids = query_ids[start:start + QUERY_BATCH_SIZE]
+        scores, ids = search_faiss_index(queries[start:start + QUERY_BATCH_SIZE], fetch, lookback_days=None)
+        
+        keep = (
+            (ids >= 0)
+            & (ids != batch_ids[:, None])
+            & np.isin(ids, published_ids)
+            & (scores >= RELATED_ARTICLES_MIN_SCORE)
+        )
+        
+        rows = []
+        for row, article_id in enumerate(batch_ids):
+            neighbours = ids[row][keep[row]][:k]
+            neighbour_scores = scores[row][keep[row]][:k]
+            rows.extend(
+                RelatedArticle(article_id=int(article_id), related_id=int(related_id), score=float(score), rank=rank)
+                for rank, (related_id, score) in enumerate(zip(neighbours, neighbour_scores))
+            )
+        
+        with transaction.atomic():
+            RelatedArticle.objects.filter(article_id__in=batch_ids.tolist()).delete()
+            RelatedArticle.objects.bulk_create(rows)
+        
+        cache.delete_many([RelatedArticle.cache_key(article_id) for article_id in batch_ids.tolist()])
+        updated += len(batch_ids)
+    
+    print(f"Computed related articles for {updated} articles")
+    return updated
+
+
+def update_related_articles(hours=24, k=RELATED_ARTICLES_K):
+    """
+    Incrementally compute related articles for recently published articles.
+    
+    Articles from the last `hours` without a related list get one, and the
+    lists of their neighbours are recomputed so the new articles show up there
+    too without waiting for the nightly run.
+    
+    Returns:
+        int: Number of articles whose related list was written
+    """
+    new_ids = list(
+        Article.objects.filter(
+            status='published',
+            created_at__gte=timezone.now() - timedelta(hours=hours),
+            related_articles__isnull=True,
+        ).values_list('id', flat=True)
+    )
+    if not new_ids:
+        return 0
+    
+    updated = compute_related_articles(new_ids, k=k)
+    
+    affected = set(
+        RelatedArticle.objects.filter(article_id__in=new_ids).values_list('related_id', flat=True)
+    ) - set(new_ids)
+    if affected:
+        updated += compute_related_articles(affected, k=k)
+    
+    return updated
@@ -0,0 +1,272 @@
+"""
+Similarity sidecar service.
+
+A long-lived process that owns the sentence encoder and the FAISS indexes so
+the rewriter, the job pipeline and every Celery worker don't each load their
+own copy. Workers reach it through similarity.client when
+SIMILARITY_SERVICE_URL is set; the existing check_duplicate /
+find_similar_articles functions are unchanged for callers.
+
+Concurrent encode requests are coalesced into a single forward pass. Every
+request runs on its own thread; searches share the stores' immutable snapshots
+and build their FAISS search parameters per call, so /search needs no lock.
+
+Endpoints (POST, JSON):
+    /health  - model and index status
+    /encode  - {"texts": [...]} -> {"embeddings": packed float32 matrix}
+    /search  - {"embeddings", "k", "lookback_days", "model_type"} -> {"scores", "ids"}
+    /add     - {"model_type", "id", "created_at", "embedding"}
+    /remove  - {"model_type", "id", "created_at"}
+
+Usage:
+    python similarity/service.py --bind unix:///run/sentinel/similarity.sock
+    python similarity/service.py --bind http://127.0.0.1:8765
+"""
+import argparse
+import json
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+import django
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+# This process does the work itself; an empty value also stops load_dotenv from
+# pointing it back at its own socket
+os.environ["SIMILARITY_SERVICE_URL"] = ""
+
+django.setup()
+
+from similarity import checker
+from similarity.active_model import active_model
+from similarity.client import pack_array, unpack_array
+from similarity.index_store import list_stores
+
+
+# Longest time an encode request waits for others to join its batch
+SIMILARITY_SERVICE_MAX_WAIT_MS = float(os.getenv("SIMILARITY_SERVICE_MAX_WAIT_MS", "5"))
+
+# Most texts encoded in one coalesced forward pass
+SIMILARITY_SERVICE_MAX_BATCH = int(os.getenv("SIMILARITY_SERVICE_MAX_BATCH", "256"))
+
+# Pending connections; every worker may connect at once during a sweep
+SIMILARITY_SERVICE_BACKLOG = 128
+
+# The service has no authentication: anyone who can connect to the socket can
+# add or remove index entries, so it lives in a directory only this user (and
+# group) can enter, never in a world-writable one such as /tmp
+RUNTIME_DIR = os.path.join(os.environ["XDG_RUNTIME_DIR"], "sentinel") if os.getenv("XDG_RUNTIME_DIR") else "/run/sentinel"
+SIMILARITY_SERVICE_BIND = os.getenv("SIMILARITY_SERVICE_BIND") or f"unix://{os.path.join(RUNTIME_DIR, 'similarity.sock')}"
+
+
+class EncodeBatcher:
+    """Coalesce concurrent encode requests into single batched encoder calls."""
+
+    def __init__(self, max_batch=SIMILARITY_SERVICE_MAX_BATCH, max_wait=SIMILARITY_SERVICE_MAX_WAIT_MS / 1000):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="encode-batcher", daemon=True)
+        self._thread.start()
+
+    def encode(self, texts):
+        """Encode texts, possibly together with other concurrent requests."""
+        future = Future()
+        self._queue.put((list(texts), future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                pending.append(request)
+                size += len(request[0])
+
+            texts = [text for request_texts, _ in pending for text in request_texts]
+            try:
+                embeddings = checker.encode_texts(texts)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.requests += len(pending)
+            offset = 0
+            for request_texts, future in pending:
+                future.set_result(embeddings[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+
+
+class SimilarityHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        endpoint = self.path.strip("/")
+        handler = getattr(self.server.service, f"handle_{endpoint}", None)
+        if handler is None:
+            return self._respond(404, {"error": f"Unknown endpoint: {endpoint}"})
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            return self._respond(200, handler(payload))
+        except (KeyError, ValueError) as e:
+            return self._respond(400, {"error": str(e)})
+        except Exception as e:
+            traceback.print_exc()
+            return self._respond(500, {"error": str(e)})
+
+    def _respond(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Request logging would dominate the output at dedupe volumes
+        pass
+
+
+class SimilarityService:
+    """Endpoint implementations, backed by similarity.checker in this process."""
+
+    def __init__(self):
+        self.batcher = EncodeBatcher()
+        self.started_at = time.time()
+
+    def handle_health(self, payload):
+        return {
+            "model": active_model(),
+            "model_loaded": checker._model is not None,
+            "dimension": checker.embedding_dimension(),
+            "indexes": list_stores(),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "encode_requests": self.batcher.requests,
+            "encode_batches": self.batcher.batches,
+        }
+
+    def handle_encode(self, payload):
+        return {"embeddings": pack_array(self.batcher.encode(payload["texts"]))}
+
+    def handle_search(self, payload):
+        scores, ids = checker.search_faiss_index(
+            unpack_array(payload["embeddings"]),
+            int(payload["k"]),
+            lookback_days=payload.get("lookback_days"),
+            model_type=payload.get("model_type", "article"),
+        )
+        return {"scores": pack_array(scores), "ids": pack_array(ids, dtype="int64")}
+
+    def handle_add(self, payload):
+        # _add_to_index only needs the item's ID and creation time
+        item = SimpleNamespace(id=int(payload["id"]), created_at=datetime.fromisoformat(payload["created_at"]))
+        checker._add_to_index(payload["model_type"], item, unpack_array(payload["embedding"]))
+        return {"ok": True}
+
+    def handle_remove(self, payload):
+        created_at = payload.get("created_at")
+        checker._remove_from_index(
+            payload["model_type"],
+            int(payload["id"]),
+            created_at=datetime.fromisoformat(created_at) if created_at else None,
+        )
+        return {"ok": True}
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = SIMILARITY_SERVICE_BACKLOG
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ("unix", 0)
+
+
+def check_socket_directory(directory):
+    """
+    Refuse to serve from a directory other users can write to or that belongs to someone else.
+
+    Raises:
+        PermissionError: If the directory is not private to this user
+    """
+    stat = os.stat(directory)
+    if stat.st_mode & 0o002:
+        raise PermissionError(f"{directory} is writable by every user; bind the similarity socket in a private directory")
+    if stat.st_uid not in (os.getuid(), 0):
+        raise PermissionError(f"{directory} belongs to another user; bind the similarity socket in a private directory")
+
+
+def make_server(bind):
+    """Create the HTTP server for a 'unix:///path' or 'http://host:port' address."""
+    url = urlparse(bind)
+    if url.scheme == "unix":
+        directory = os.path.dirname(url.path) or "."
+        os.makedirs(directory, mode=0o750, exist_ok=True)
+        check_socket_directory(directory)
+        if os.path.exists(url.path):
+            os.remove(url.path)
+        # Only this user and its group (the web and Celery workers) may connect
+        umask = os.umask(0o117)
+        try:
+            server = ThreadingUnixHTTPServer(url.path, SimilarityHandler)
+        finally:
+            os.umask(umask)
+    elif url.scheme == "http":
+        server = ThreadingHTTPServer((url.hostname, url.port or 8765), SimilarityHandler, bind_and_activate=False)
+        server.request_queue_size = SIMILARITY_SERVICE_BACKLOG
+        server.server_bind()
+        server.server_activate()
+    else:
+        raise ValueError(f"Unsupported bind address: {bind}. Use unix:///path or http://host:port")
+
+    server.service = SimilarityService()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bind", default=SIMILARITY_SERVICE_BIND)
+    args = parser.parse_args()
+
+    # Load the model and open the indexes before accepting requests
+    checker.prewarm()
+    for model_type in ('article', 'job'):
+        checker.get_index(model_type).snapshot()
+
+    server = make_server(args.bind)
+    print(f"Similarity service listening on {args.bind}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
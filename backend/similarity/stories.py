@@ -0,0 +1,267 @@
+"""
+Online story clustering.
+
+Every outlet's copy of a news story (the article we rewrote and each duplicate
+the rewriter skipped) is attached to a StoryCluster as it arrives. A story is
+represented by the mean of its members' embeddings, and the centroids of
+recently active stories are kept in their own FAISS index ('story'). Placing a
+new copy is therefore a single nearest-centroid search (logarithmic in the
+number of stories with the default FAISS_STORY_INDEX_TYPE=hnsw) instead of a
+comparison with every article.
+
+Every join upserts the story's centroid as a new delta segment. An HNSW graph
+cannot remove entries, so compacting upserts resets the index and re-adds every
+open story's centroid: its cost grows with the number of open stories, not
+with the number of joins. compact_story_index is scheduled every few minutes
+but only compacts once STORY_COMPACT_MIN_SEGMENTS segments are pending (the
+half-hourly compact_faiss_indexes sweep merges any remainder); until then
+searches scan the pending centroids exactly, which is cheap for a few dozen
+segments.
+
+A story stops growing after STORY_CLUSTER_WINDOW_DAYS without a new source and
+is evicted from the centroid index by a daily sweep; its sources stay in the
+database for the coverage endpoint.
+"""
+import os
+from datetime import timedelta
+
+import faiss
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from similarity.active_model import active_model
+from similarity.checker import INDEX_TYPES_BY_MODEL, article_text, candidate_text, embedding_dimension, encode_text
+from similarity.index_store import get_store, new_index
+from similarity.models import StoryCluster, StorySource
+
+
+# Cosine similarity to a story's centroid needed to join it; below the duplicate
+# threshold because follow-up reports of the same event differ more than copies
+STORY_CLUSTER_THRESHOLD = float(os.getenv("STORY_CLUSTER_THRESHOLD", "0.75"))
+
+# Stories without a new source for this long are closed
+STORY_CLUSTER_WINDOW_DAYS = int(os.getenv("STORY_CLUSTER_WINDOW_DAYS", "3"))
+
+# Pending centroid upserts that trigger a compaction of the story index
+STORY_COMPACT_MIN_SEGMENTS = int(os.getenv("STORY_COMPACT_MIN_SEGMENTS", "20"))
+
+# Nearest centroids considered, since the nearest story may already be closed
+STORY_CANDIDATES = 5
+
+STORY_INDEX = 'story'
+
+
+def _cutoff():
+    return timezone.now() - timedelta(days=STORY_CLUSTER_WINDOW_DAYS)
+
+
+def _normalized(vector):
+    vector = np.array([vector], dtype=np.float32)
+    faiss.normalize_L2(vector)
+    return vector
+
+
+def get_story_index():
+    """
+    Return the store of story centroids, building it from open stories if missing.
+
+    Returns:
+        IndexStore: Per-process store singleton, keyed by StoryCluster ID
+    """
+    store = get_store(STORY_INDEX)
+    if not store.is_empty():
+        return store
+
+    absorbed_segments = store.segment_names()
+    clusters = list(
+        StoryCluster.objects.filter(model_name=active_model(), updated_at__gte=_cutoff()).values_list('id', 'centroid')
+    )
+
+    if clusters:
+        ids = np.array([cluster_id for cluster_id, _ in clusters], dtype=np.int64)
+        centroids = np.vstack([np.frombuffer(bytes(centroid), dtype=np.float32) for _, centroid in clusters])
+        faiss.normalize_L2(centroids)
+        index = new_index(centroids.shape[1], INDEX_TYPES_BY_MODEL['story'], training_vectors=centroids)
+        index.add_with_ids(centroids, ids)
+    else:
+        index = new_index(embedding_dimension(), INDEX_TYPES_BY_MODEL['story'])
+
+    print(f"Building FAISS story index with {len(clusters)} open stories")
+    store.save(index, absorbed_segments=absorbed_segments)
+    return store
+
+
+def compact_story_index(min_segments=None):
+    """
+    Merge the centroid upserts of recent joins into the story index.
+
+    Args:
+        min_segments: Skip compaction with fewer pending segments (STORY_COMPACT_MIN_SEGMENTS if None)
+
+    Returns:
+        int: Number of segments merged
+    """
+    if min_segments is None:
+        min_segments = STORY_COMPACT_MIN_SEGMENTS
+    return get_store(STORY_INDEX).compact(min_segments=min_segments)
+
+
+def find_story(embedding):
+    """
+    Find the open story closest to a normalized embedding.
+
+    Returns:
+        tuple: (StoryCluster, similarity), or (None, None) if no open story is close enough
+    """
+    scores, cluster_ids = get_story_index().search(embedding, STORY_CANDIDATES)
+    candidates = [
+        (int(cluster_id), float(score))
+        for cluster_id, score in zip(cluster_ids[0], scores[0])
+        if cluster_id >= 0 and score >= STORY_CLUSTER_THRESHOLD
+    ]
+    if not candidates:
+        return None, None
+
+    open_clusters = StoryCluster.objects.filter(updated_at__gte=_cutoff()).in_bulk(
+        [cluster_id for cluster_id, _ in candidates]
+    )
+    for cluster_id, score in candidates:
+        if cluster_id in open_clusters:
+            return open_clusters[cluster_id], score
+    return None, None
+
+
+def _start_story(scraped_article, article, embedding):
+    with transaction.atomic():
+        cluster = StoryCluster.objects.create(article=article, centroid=embedding.tobytes(), size=1)
+        source = StorySource.objects.create(
+            cluster=cluster, scraped_article=scraped_article, article=article, similarity=1.0
+        )
+    get_story_index().add(_normalized(embedding), [cluster.id])
+    cache.delete(StorySource.cache_key(article.id))
+    return source
+
+
+def _join_story(cluster, scraped_article, article, embedding, similarity):
+    with transaction.atomic():
+        cluster = StoryCluster.objects.select_for_update().get(id=cluster.id)
+        centroid = np.frombuffer(bytes(cluster.centroid), dtype=np.float32)
+        if embedding is not None:
+            # Running mean of the member embeddings
+            centroid = centroid + (embedding - centroid) / (cluster.size + 1)
+            cluster.centroid = centroid.astype(np.float32).tobytes()
+        cluster.size += 1
+        cluster.save()
+        source = StorySource.objects.create(
+            cluster=cluster, scraped_article=scraped_article, article=article, similarity=similarity
+        )
+
+    if embedding is not None:
+        # Upsert: the new centroid replaces the story's previous one
+        get_story_index().add(_normalized(centroid), [cluster.id])
+
+    article_ids = cluster.sources.exclude(article=None).values_list('article_id', flat=True)
+    cache.delete_many([StorySource.cache_key(article_id) for article_id in article_ids])
+    return source
+
+
+def add_article_to_story(article):
+    """
+    Place a newly saved article in its story, starting a new story if none is close enough.
+
+    Args:
+        article: Article rewritten from a scraped page (original_from)
+
+    Returns:
+        StorySource: The article's membership, or None if it has no source page
+                     or clustering failed
+    """
+    if article.original_from_id is None:
+        return None
+
+    try:
+        existing = StorySource.objects.select_related('cluster').filter(
+            scraped_article_id=article.original_from_id
+        ).first()
+        if existing is not None:
+            if existing.article_id is None:
+                existing.article = article
+                existing.save(update_fields=['article'])
+            return existing
+
+        # Already encoded (and cached) by add_article_to_index
+        embedding = _normalized(encode_text(article_text(article)))
+        cluster, similarity = find_story(embedding)
+        if cluster is None:
+            return _start_story(article.original_from, article, embedding[0])
+        return _join_story(cluster, article.original_from, article, embedding[0], similarity)
+
+    except Exception as e:
+        print(f"Error adding article {article.id} to a story: {str(e)}")
+        return None
+
+
+def add_duplicate_to_story(scraped_article, duplicate_of, text=None):
+    """
+    Record a skipped duplicate as another source of the story it copies.
+
+    The duplicate joins the story of the article it duplicates directly; no
+    search is needed.
+
+    Args:
+        scraped_article: ScrapedArticle of the skipped page
+        duplicate_of: Article the page duplicates
+        text: Rewritten duplicate as checked by check_duplicates_batch (string or
+              title/excerpt/content dict; moves the story centroid), or None
+              for lexical duplicates that were never rewritten
+
+    Returns:
+        StorySource: The duplicate's membership, or None if `duplicate_of` has no
+                     story or clustering failed
+    """
+    try:
+        existing = StorySource.objects.filter(scraped_article=scraped_article).first()
+        if existing is not None:
+            return existing
+
+        # Articles saved before story clustering get their story on first use
+        original = add_article_to_story(duplicate_of)
+        if original is None:
+            return None
+
+        embedding, similarity = None, None
+        if text:
+            embedding = _normalized(encode_text(candidate_text(text, 'article')))
+            centroid = _normalized(np.frombuffer(bytes(original.cluster.centroid), dtype=np.float32))
+            similarity = float(embedding[0] @ centroid[0])
+            embedding = embedding[0]
+
+        return _join_story(original.cluster, scraped_article, None, embedding, similarity)
+
+    except Exception as e:
+        print(f"Error adding duplicate {scraped_article.url} to a story: {str(e)}")
+        return None
+
+
+def evict_closed_stories():
+    """
+    Remove stories without a new source for STORY_CLUSTER_WINDOW_DAYS from the centroid index.
+
+    Returns:
+        int: Number of stories evicted
+    """
+    store = get_story_index()
+    indexed_ids = store.ids().tolist()
+    if not indexed_ids:
+        return 0
+
+    open_ids = set(
+        StoryCluster.objects.filter(id__in=indexed_ids, updated_at__gte=_cutoff()).values_list('id', flat=True)
+    )
+    closed_ids = [cluster_id for cluster_id in indexed_ids if cluster_id not in open_ids]
+    if closed_ids:
+        store.remove(closed_ids)
+        print(f"Evicted {len(closed_ids)} closed stories from FAISS story index")
+    return len(closed_ids)
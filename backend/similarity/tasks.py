@@ -0,0 +1,137 @@
+"""
+Celery tasks for FAISS index maintenance
+"""
+from celery import shared_task
+import logging
+from datetime import date
+
+from . import checker, related, stories
+from .index_store import compact_all, drop_expired_shards
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def compact_faiss_indexes(min_segments=1):
+    """
+    Merge pending delta segments into new base indexes
+    Should run every 30 minutes
+    
+    Args:
+        min_segments: Skip namespaces with fewer pending segments
+    """
+    try:
+        merged = compact_all(min_segments=min_segments)
+        logger.info(f"Compacted FAISS indexes: {merged}")
+        
+    except Exception as e:
+        logger.error(f"Error compacting FAISS indexes: {str(e)}")
+
+
+@shared_task
+def build_missing_faiss_index(model_type='article', day=None):
+    """
+    Build a full index or daily shard that a web request found missing
+    Queued by checker.queue_index_build; does nothing if it was built meanwhile
+    
+    Args:
+        model_type: 'article' or 'job'
+        day: ISO date of the daily shard, or None for the full index
+    """
+    try:
+        store = checker.get_index(model_type, day=date.fromisoformat(day) if day else None)
+        logger.info(f"FAISS {store.name} index ready with {store.ntotal()} items")
+        
+    except Exception as e:
+        logger.error(f"Error building the FAISS {model_type} index: {str(e)}")
+
+
+@shared_task
+def drop_expired_faiss_shards():
+    """
+    Delete daily FAISS shards older than SIMILARITY_SHARD_RETENTION_DAYS
+    Should run daily
+    """
+    try:
+        dropped = drop_expired_shards()
+        logger.info(f"Dropped {len(dropped)} expired FAISS shards")
+        
+    except Exception as e:
+        logger.error(f"Error dropping expired FAISS shards: {str(e)}")
+
+
+@shared_task
+def evict_closed_jobs():
+    """
+    Remove archived and expired jobs from the job index
+    Should run daily, just after midnight
+    """
+    try:
+        evicted = checker.evict_closed_jobs()
+        logger.info(f"Evicted {evicted} closed jobs from the FAISS job index")
+        
+    except Exception as e:
+        logger.error(f"Error evicting closed jobs: {str(e)}")
+
+
+@shared_task
+def compact_story_index(min_segments=None):
+    """
+    Merge pending story centroid upserts into a new base index
+    Should run every 5 minutes, since every story join writes a segment;
+    only compacts once STORY_COMPACT_MIN_SEGMENTS are pending
+    
+    Args:
+        min_segments: Skip compaction with fewer pending segments (STORY_COMPACT_MIN_SEGMENTS if None)
+    """
+    try:
+        merged = stories.compact_story_index(min_segments=min_segments)
+        logger.info(f"Compacted {merged} FAISS story segments")
+        
+    except Exception as e:
+        logger.error(f"Error compacting the FAISS story index: {str(e)}")
+
+
+@shared_task
+def evict_closed_stories():
+    """
+    Remove stories without new sources from the story centroid index
+    Should run daily
+    """
+    try:
+        evicted = stories.evict_closed_stories()
+        logger.info(f"Evicted {evicted} closed stories from the FAISS story index")
+        
+    except Exception as e:
+        logger.error(f"Error evicting closed stories: {str(e)}")
+
+
+@shared_task
+def refresh_related_articles():
+    """
+    Recompute the related articles of every published article
+    Should run daily
+    """
+    try:
+        updated = related.compute_related_articles()
+        logger.info(f"Refreshed related articles for {updated} articles")
+        
+    except Exception as e:
+        logger.error(f"Error refreshing related articles: {str(e)}")
+
+
+@shared_task
+def update_related_articles(hours=24):
+    """
+    Compute related articles for newly published articles
+    Should run every 15 minutes
+    
+    Args:
+        hours: How far back to look for articles without related articles
+    """
+    try:
+        updated = related.update_related_articles(hours=hours)
+        logger.info(f"Updated related articles for {updated} articles")
+        
+    except Exception as e:
+        logger.error(f"Error updating related articles: {str(e)}")
@@ -1,3 +1,547 @@
-from django.test import TestCase
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import faiss
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from articles.models import Article
+from scraper.models import NewsSource, ScrapedArticle
+from similarity import checker, index_store, lexical, stories
+from similarity.models import StoryCluster
+from similarity.index_store import IndexStore, new_index
+
+
+DIMENSION = 16
+
+
+def random_vectors(n, seed=0):
+    vectors = np.random.default_rng(seed).random((n, DIMENSION), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def add_from_process(directory, start, count):
+    # Runs in a child process with its own IndexStore, like another worker would
+    store = IndexStore('article', directory)
+    for item_id in range(start, start + count):
+        store.add(random_vectors(1, seed=item_id), [item_id])
+
+
+class IndexStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def assert_finds_all(self, store, ids):
+        vectors = np.vstack([random_vectors(1, seed=item_id) for item_id in ids])
+        _, found = store.search(vectors, 1)
+        self.assertEqual(found[:, 0].tolist(), list(ids))
+
+    def test_concurrent_adds_from_two_stores_are_all_kept(self):
+        first, second = IndexStore('article', self.directory), IndexStore('article', self.directory)
+
+        def add(store, start):
+            for item_id in range(start, start + 50):
+                store.add(random_vectors(1, seed=item_id), [item_id])
+
+        threads = [threading.Thread(target=add, args=(first, 0)), threading.Thread(target=add, args=(second, 50))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(first.ntotal(), 100)
+        self.assertEqual(sorted(second.ids().tolist()), list(range(100)))
+        self.assert_finds_all(first, range(100))
+
+    def test_concurrent_adds_from_two_processes_are_all_kept(self):
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=add_from_process, args=(self.directory, start, 30))
+            for start in (0, 30)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+        store = IndexStore('article', self.directory)
+        self.assertEqual(sorted(store.ids().tolist()), list(range(60)))
+
+    def test_compaction_keeps_older_generation_readable(self):
+        writer, reader = IndexStore('article', self.directory), IndexStore('article', self.directory)
+        writer.add(random_vectors(1, seed=0), [0])
+        writer.compact()
+        old = reader.snapshot()
+
+        # Enough compactions that the reader's generation is unlinked from disk
+        for item_id in range(1, index_store.KEEP_GENERATIONS + 3):
+            writer.add(random_vectors(1, seed=item_id), [item_id])
+            writer.compact()
+        self.assertFalse(os.path.exists(writer._index_path(old.generation)))
+
+        # The old snapshot still searches its own (mapped) generation
+        _, found = old.base.search(random_vectors(1, seed=0), 1)
+        self.assertEqual(found[0, 0], 0)
+
+        self.assertEqual(reader.snapshot().generation, writer.generation())
+        self.assert_finds_all(reader, range(index_store.KEEP_GENERATIONS + 3))
+
+    def test_compaction_leaves_later_segments_live(self):
+        store = IndexStore('article', self.directory)
+        store.add(random_vectors(1, seed=0), [0])
+        store.compact()
+        store.add(random_vectors(1, seed=1), [1])
+        store.remove([0])
+
+        self.assertEqual(store.ids().tolist(), [1])
+        store.compact()
+        self.assertEqual(store.ids().tolist(), [1])
+        self.assertEqual(store.segment_names(), [])
+
+    def test_reader_follows_manifest_when_its_generation_is_removed(self):
+        writer, reader = IndexStore('article', self.directory), IndexStore('article', self.directory)
+        writer.add(random_vectors(1, seed=0), [0])
+        writer.compact()
+        read_base = index_store._read_base
+
+        def publish_then_read(path):
+            # Newer generations are published and this one is removed between
+            # the reader loading the manifest and opening the index file
+            if not publish_then_read.done:
+                publish_then_read.done = True
+                for item_id in range(1, index_store.KEEP_GENERATIONS + 2):
+                    writer.add(random_vectors(1, seed=item_id), [item_id])
+                    writer.compact()
+            return read_base(path)
+
+        publish_then_read.done = False
+        with mock.patch.object(index_store, '_read_base', side_effect=publish_then_read):
+            snapshot = reader.snapshot()
+
+        self.assertEqual(snapshot.generation, writer.generation())
+        self.assert_finds_all(reader, range(index_store.KEEP_GENERATIONS + 2))
+
+    def test_save_removes_segments_left_by_an_interrupted_save(self):
+        store = IndexStore('article', self.directory)
+        store.add(random_vectors(1, seed=0), [0])
+        absorbed = store.segment_names()
+
+        index = new_index(DIMENSION)
+        index.add_with_ids(random_vectors(1, seed=0), np.array([0]))
+        with mock.patch.object(store, '_remove_segments'):
+            # Crash between publishing the base and removing the absorbed segments
+            store.save(index)
+        self.assertEqual(store.ids().tolist(), [0])
+
+        # A newer base in which item 0 was updated
+        index = new_index(DIMENSION)
+        index.add_with_ids(np.vstack([random_vectors(1, seed=2), random_vectors(1, seed=1)]), np.array([0, 1]))
+        store.save(index, absorbed_segments=[])
+
+        self.assertEqual(store.segment_names(), [])
+        self.assertFalse(any(os.path.exists(store._segment_path(segment)) for segment in absorbed))
+        self.assert_finds_all(store, [1])
+        _, found = store.search(random_vectors(1, seed=2), 1)
+        self.assertEqual(found[0, 0], 0)
+
+    def test_writes_to_another_namespace_do_not_reload(self):
+        store, other = IndexStore('article', self.directory), IndexStore('job', self.directory)
+        store.add(random_vectors(1, seed=0), [0])
+        snapshot = store.snapshot()
+
+        other.add(random_vectors(1, seed=1), [1])
+        other.compact()
+        self.assertIs(store.snapshot(), snapshot)
+
+    def test_concurrent_searches_with_shadowed_ids(self):
+        # Regression: search parameters were shared between threads and FAISS
+        # rewrites them in place during a search, which crashed the process
+        store = IndexStore('article', self.directory)
+        vectors = np.random.default_rng(0).random((10000, 64), dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        store.add(vectors, np.arange(10000))
+        store.compact()
+        store.remove(np.arange(0, 10000, 2))
+
+        errors = []
+
+        def search():
+            try:
+                for _ in range(30):
+                    _, ids = store.search(vectors[:16], 10)
+                    if (ids % 2 == 0).any():
+                        errors.append("removed ID returned")
+            except Exception as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=search) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class SimilarityServiceTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        patcher = mock.patch.object(index_store, 'model_directory', return_value=self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_concurrent_searches_through_threaded_server(self):
+        from similarity.client import SimilarityClient
+        from similarity.service import make_server
+
+        store = index_store.get_store('article')
+        vectors = np.random.default_rng(0).random((5000, 64), dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        store.add(vectors, np.arange(5000))
+        store.compact()
+        store.remove(np.arange(0, 5000, 2))
+
+        socket_path = os.path.join(self.directory, 'run', 'similarity.sock')
+        server = make_server(f"unix://{socket_path}")
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        client = SimilarityClient(url=f"unix://{socket_path}")
+        errors = []
+
+        def search():
+            try:
+                for _ in range(20):
+                    _, ids = client.search(vectors[:8], 5)
+                    if (ids % 2 == 0).any():
+                        errors.append("removed ID returned")
+            except Exception as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=search) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+def no_index_matches(queries, k, **kwargs):
+    return np.zeros((len(queries), k), dtype=np.float32), np.full((len(queries), k), -1, dtype=np.int64)
+
+
+class CheckDuplicatesBatchTests(TestCase):
+
+    def setUp(self):
+        # One random direction per story; candidates of the same story encode identically
+        self.stories = {name: random_vectors(1, seed=seed)[0] for seed, name in enumerate(('alpha', 'beta', 'gamma'))}
+        patcher = mock.patch.object(
+            checker, 'encode_texts',
+            side_effect=lambda texts, **kwargs: np.vstack([self.stories[text.split()[0]] for text in texts]),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def candidate(self, story):
+        return {'title': f"{story} title", 'excerpt': '', 'content': ''}
+
+    def test_duplicates_within_the_batch(self):
+        with mock.patch.object(checker, 'search_faiss_index', side_effect=no_index_matches):
+            results = checker.check_duplicates_batch(
+                [self.candidate('alpha'), self.candidate('beta'), self.candidate('alpha'), self.candidate('alpha')],
+                threshold=0.85,
+            )
+
+        self.assertEqual([result['is_duplicate'] for result in results], [False, False, True, True])
+        # Every copy points at the first candidate that would have been saved
+        self.assertEqual([result['batch_duplicate_of'] for result in results], [None, None, 0, 0])
+        self.assertIsNone(results[2]['similar_article'])
+        self.assertEqual(results[2]['similar_article_title'], 'alpha title')
+        self.assertAlmostEqual(results[2]['similarity_score'], 1.0, places=5)
+
+    def test_duplicates_of_indexed_items(self):
+        article = Article.objects.create(title='Indexed alpha', excerpt='', content='')
+
+        def search(queries, k, **kwargs):
+            scores, ids = no_index_matches(queries, k)
+            scores[0, 0], ids[0, 0] = 0.95, article.id
+            scores[1, 0], ids[1, 0] = 0.5, article.id
+            return scores, ids
+
+        with mock.patch.object(checker, 'search_faiss_index', side_effect=search):
+            results = checker.check_duplicates_batch(
+                [self.candidate('alpha'), self.candidate('beta'), self.candidate('alpha')], threshold=0.85,
+            )
+
+        self.assertTrue(results[0]['is_duplicate'])
+        self.assertEqual(results[0]['similar_article'], article)
+        self.assertEqual(results[0]['similar_article_title'], 'Indexed alpha')
+        self.assertIsNone(results[0]['batch_duplicate_of'])
+        # Below the threshold
+        self.assertFalse(results[1]['is_duplicate'])
+        # A duplicate of an indexed item is not saved, so later copies are not batch duplicates of it
+        self.assertFalse(results[2]['is_duplicate'])
+
+    def test_fallback_checks_one_by_one_and_keeps_failures(self):
+        article = Article.objects.create(title='Indexed alpha', excerpt='', content='')
+
+        def search(queries, k, **kwargs):
+            if len(queries) > 1:
+                raise RuntimeError("index unavailable")
+            if np.allclose(queries[0], self.stories['beta']):
+                raise RuntimeError("shard unreadable")
+            scores, ids = no_index_matches(queries, k)
+            scores[0, 0], ids[0, 0] = 0.95, article.id
+            return scores, ids
+
+        with mock.patch.object(checker, 'search_faiss_index', side_effect=search):
+            results = checker.check_duplicates_or_fallback(
+                [self.candidate('alpha'), self.candidate('beta')], threshold=0.85,
+            )
+
+        self.assertTrue(results[0]['is_duplicate'])
+        self.assertEqual(results[0]['similar_article'], article)
+        # Its own check failed too, so it is treated as new rather than lost
+        self.assertFalse(results[1]['is_duplicate'])
+        self.assertIsNone(results[1]['batch_duplicate_of'])
+
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+class SimHashTests(TestCase):
+
+    def setUp(self):
+        self.source = NewsSource.objects.create(name='Wire', base_url='https://wire.example/')
+
+    def publish(self, url, fingerprint):
+        scraped_article = ScrapedArticle.objects.create(source=self.source, url=url)
+        Article.objects.create(title=url, excerpt='', content='', original_from=scraped_article)
+        lexical.store_fingerprint(scraped_article, fingerprint)
+        return scraped_article
+
+    def test_texts_below_min_words_are_not_fingerprinted(self):
+        self.assertIsNone(lexical.simhash(words('w', lexical.MIN_WORDS - 1)))
+        self.assertIsNotNone(lexical.simhash(words('w', lexical.MIN_WORDS)))
+
+    def test_small_edits_keep_fingerprints_close(self):
+        text = words('w', 400)
+        edited = text.replace('w200 ', 'changed ', 1)
+        self.assertLessEqual(
+            lexical.hamming_distances(lexical.simhash(text), np.array([lexical.to_signed(lexical.simhash(edited))]))[0],
+            lexical.SIMHASH_MAX_DISTANCE,
+        )
+        self.assertGreater(
+            lexical.hamming_distances(lexical.simhash(text), np.array([lexical.to_signed(lexical.simhash(words('x', 400)))]))[0],
+            lexical.SIMHASH_MAX_DISTANCE,
+        )
+
+    def test_fingerprints_with_the_top_bit_set_round_trip_through_the_database(self):
+        fingerprint = (1 << 63) | 0x0123456789abcdef
+        scraped_article = self.publish('https://wire.example/1', fingerprint)
+
+        scraped_article.refresh_from_db()
+        self.assertLess(scraped_article.simhash, 0)
+        self.assertEqual(scraped_article.simhash & ((1 << 64) - 1), fingerprint)
+        self.assertEqual(lexical.PublishedFingerprints().find(fingerprint), (scraped_article, 0))
+
+    def test_find_respects_the_hamming_threshold(self):
+        fingerprint = (1 << 63) | 0x0123456789abcdef
+        scraped_article = self.publish('https://wire.example/1', fingerprint)
+        published = lexical.PublishedFingerprints()
+
+        # Flip the lowest bits one by one
+        within = fingerprint ^ ((1 << lexical.SIMHASH_MAX_DISTANCE) - 1)
+        beyond = fingerprint ^ ((1 << (lexical.SIMHASH_MAX_DISTANCE + 1)) - 1)
+        self.assertEqual(published.find(within), (scraped_article, lexical.SIMHASH_MAX_DISTANCE))
+        self.assertEqual(published.find(beyond), (None, None))
+        self.assertEqual(published.find(beyond, max_distance=lexical.SIMHASH_MAX_DISTANCE + 1)[0], scraped_article)
+        self.assertEqual(published.find(None), (None, None))
+
+    def test_unpublished_pages_are_not_matched(self):
+        fingerprint = 0x0123456789abcdef
+        scraped_article = ScrapedArticle.objects.create(source=self.source, url='https://wire.example/1')
+        lexical.store_fingerprint(scraped_article, fingerprint)
+        published = lexical.PublishedFingerprints()
+        self.assertEqual(published.find(fingerprint), (None, None))
+
+        # Published later in the same sweep
+        published.add(scraped_article.id, fingerprint)
+        self.assertEqual(published.find(fingerprint), (scraped_article, 0))
+
+    def test_find_near_duplicate_among_sweep_candidates(self):
+        fingerprint = (1 << 63) | 0x0123456789abcdef
+        candidates = {'https://wire.example/1': fingerprint, 'https://wire.example/2': None}
+
+        self.assertEqual(lexical.find_near_duplicate(fingerprint ^ 0b11, candidates), ('https://wire.example/1', 2))
+        self.assertEqual(lexical.find_near_duplicate(fingerprint ^ 0xff, candidates), (None, None))
+        self.assertEqual(lexical.find_near_duplicate(fingerprint, {}), (None, None))
+
+
+def unit_vector(*components):
+    vector = np.zeros(DIMENSION, dtype=np.float32)
+    vector[:len(components)] = components
+    return vector / np.linalg.norm(vector)
+
+
+class StoryClusteringTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.source = NewsSource.objects.create(name='Wire', base_url='https://wire.example/')
+        # Texts are embedded as the vector registered for their first word
+        self.embeddings = {}
+        for patcher in (
+            mock.patch.object(index_store, 'model_directory', return_value=directory),
+            mock.patch.object(stories, 'embedding_dimension', return_value=DIMENSION),
+            mock.patch.object(stories, 'encode_text', side_effect=lambda text: self.embeddings[text.split()[0]]),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def article(self, name, embedding):
+        self.embeddings[name] = embedding
+        scraped_article = ScrapedArticle.objects.create(source=self.source, url=f'https://wire.example/{name}')
+        return Article.objects.create(title=name, excerpt='', content='', original_from=scraped_article)
+
+    def test_articles_join_a_story_only_above_the_threshold(self):
+        first = stories.add_article_to_story(self.article('first', unit_vector(1)))
+
+        # Cosine similarity just above and just below STORY_CLUSTER_THRESHOLD
+        above, below = stories.STORY_CLUSTER_THRESHOLD + 0.05, stories.STORY_CLUSTER_THRESHOLD - 0.05
+        close = stories.add_article_to_story(self.article('close', unit_vector(above, np.sqrt(1 - above ** 2))))
+        far = stories.add_article_to_story(self.article('far', unit_vector(below, 0, np.sqrt(1 - below ** 2))))
+
+        self.assertEqual(close.cluster_id, first.cluster_id)
+        self.assertAlmostEqual(close.similarity, above, places=5)
+        self.assertNotEqual(far.cluster_id, first.cluster_id)
+        self.assertEqual(StoryCluster.objects.get(id=first.cluster_id).size, 2)
+
+    def test_centroid_is_the_running_mean_of_its_sources(self):
+        article = self.article('first', unit_vector(1))
+        source = stories.add_article_to_story(article)
+
+        for position, name in enumerate(('second', 'third'), 2):
+            self.embeddings[name] = unit_vector(*([0] * (position - 1) + [1]))
+            scraped_article = ScrapedArticle.objects.create(source=self.source, url=f'https://wire.example/{name}')
+            stories.add_duplicate_to_story(scraped_article, article, text=name)
+
+        # Lexical duplicates are counted but do not move the centroid
+        scraped_article = ScrapedArticle.objects.create(source=self.source, url='https://wire.example/lexical')
+        stories.add_duplicate_to_story(scraped_article, article)
+
+        cluster = StoryCluster.objects.get(id=source.cluster_id)
+        self.assertEqual(cluster.size, 4)
+        np.testing.assert_allclose(
+            np.frombuffer(bytes(cluster.centroid), dtype=np.float32), unit_vector(1, 1, 1) / np.sqrt(3), atol=1e-6
+        )
+
+    def test_stale_stories_are_closed(self):
+        stale = stories.add_article_to_story(self.article('first', unit_vector(1)))
+        StoryCluster.objects.filter(id=stale.cluster_id).update(
+            updated_at=timezone.now() - timedelta(days=stories.STORY_CLUSTER_WINDOW_DAYS + 1)
+        )
+
+        # The same story no longer accepts sources once its window has passed
+        follow_up = stories.add_article_to_story(self.article('follow-up', unit_vector(1)))
+        self.assertNotEqual(follow_up.cluster_id, stale.cluster_id)
+
+        self.assertEqual(stories.evict_closed_stories(), 1)
+        self.assertEqual(stories.get_story_index().ids().tolist(), [follow_up.cluster_id])
+
+    def test_story_index_is_compacted_above_the_segment_threshold(self):
+        article = self.article('first', unit_vector(1))
+        stories.add_article_to_story(article)
+        self.embeddings['copy'] = unit_vector(1, 1)
+        scraped_article = ScrapedArticle.objects.create(source=self.source, url='https://wire.example/copy')
+        stories.add_duplicate_to_story(scraped_article, article, text='copy')
+
+        pending = len(stories.get_story_index().segment_names())
+        self.assertEqual(stories.compact_story_index(min_segments=pending + 1), 0)
+        self.assertEqual(stories.compact_story_index(min_segments=pending), pending)
+        self.assertEqual(stories.get_story_index().segment_names(), [])
+
+
+class SemanticSearchTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(index_store, 'model_directory', return_value=self.directory),
+            mock.patch.object(checker, 'get_client', return_value=None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_missing_indexes_are_queued_not_built_on_the_request(self):
+        from similarity import tasks
+
+        with mock.patch.object(checker, 'build_faiss_index') as build, \
+                mock.patch.object(checker, 'encode_texts') as encode, \
+                mock.patch.object(tasks.build_missing_faiss_index, 'apply_async') as queue:
+            results = checker.semantic_search('budget')
+
+        self.assertEqual(results, {'article': [], 'job': []})
+        build.assert_not_called()
+        encode.assert_not_called()
+        self.assertEqual(sorted(call.kwargs['args'] for call in queue.call_args_list), [('article', None), ('job', None)])
+
+    def test_built_index_is_searched(self):
+        vectors = random_vectors(3)
+        index_store.get_store('article').add(vectors, [10, 11, 12])
+
+        with mock.patch.object(checker, 'build_faiss_index') as build, \
+                mock.patch.object(checker, 'encode_texts', return_value=vectors[1:2].copy()), \
+                mock.patch.object(checker, 'queue_index_build') as queue:
+            results = checker.semantic_search('budget', model_types=('article',), k=1)
+
+        build.assert_not_called()
+        queue.assert_not_called()
+        [(item_id, score)] = results['article']
+        self.assertEqual(item_id, 11)
+        self.assertAlmostEqual(score, 1.0, places=5)
+
+
+PARITY_TEXTS = [
+    "The Central Bank raised its benchmark interest rate by 50 basis points to curb inflation.",
+    "Super Falcons name squad for next month's international friendlies in Lagos.",
+    "Applications are open for the graduate trainee programme; the deadline is 30 November.",
+    "Flooding displaced thousands of residents after the river burst its banks overnight.",
+    # An article body longer than the encoder's max_seq_length, so truncation is exercised
+    " ".join(["Lawmakers debated the revised budget, which raises spending on roads, schools and hospitals "
+              "while cutting allocations for new official vehicles and foreign travel."] * 20),
+]
+
+
+@skipUnless(importlib.util.find_spec("sentence_transformers"), "sentence_transformers is not installed")
+class EncoderParityTests(SimpleTestCase):
+    """The configured FAISS_ENCODER_BACKEND must embed like the PyTorch reference (see encoder_benchmark)."""
+
+    def test_configured_backend_matches_torch_reference(self):
+        from similarity import encoder_benchmark
+
+        try:
+            reference = checker.load_encoder("torch")
+            candidate = checker.load_encoder()
+        except (ImportError, OSError) as e:
+            self.skipTest(f"Encoder could not be loaded: {str(e)}")
+
+        cosines, _, _ = encoder_benchmark.compare_encoders(reference, candidate, PARITY_TEXTS, batch_size=8)
+        self.assertEqual(len(cosines), len(PARITY_TEXTS))
+        self.assertGreaterEqual(float(cosines.min()), 0.99)